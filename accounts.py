@@ -0,0 +1,219 @@
+import os
+
+import db
+import metrics
+
+# Users and developer requests share one database, so approving a request
+# (promote + delete) or deleting an account is a single transaction.
+ACCOUNTS_DB = 'users.db'
+
+# Developer requests lived in their own file before; merged in once
+LEGACY_REQUESTS_DB = 'developer_requests.db'
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        account_type TEXT NOT NULL DEFAULT 'user',
+        created_at TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS developer_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        email TEXT NOT NULL,
+        reason TEXT NOT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+'''
+# One pending request per user (a repeated request is dropped at insert), and
+# the admin queue is read oldest first, a page at a time, by (created_at, id).
+# Created after older databases have had their duplicates removed.
+REQUEST_INDEXES = '''
+    DROP INDEX IF EXISTS idx_developer_requests_user_id;
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_developer_requests_user ON developer_requests (user_id);
+    CREATE INDEX IF NOT EXISTS idx_developer_requests_created ON developer_requests (created_at, id);
+'''
+# Stored in PRAGMA user_version once setup is complete; bump when SCHEMA or REQUEST_INDEXES change
+SCHEMA_VERSION = 2
+
+_pool = db.ConnectionPool(ACCOUNTS_DB)
+
+def transaction(immediate=False):
+    return _pool.transaction(immediate)
+
+def pool_stats():
+    return dict(_pool.stats)
+
+# ---------------- Setup & Migration ----------------
+def configure(accounts_db, legacy_requests_db):
+    """Use other data files (see create_app); drops pooled connections."""
+    global ACCOUNTS_DB, LEGACY_REQUESTS_DB, _pool
+    if accounts_db != ACCOUNTS_DB:
+        _pool.close_all()
+        _pool = db.ConnectionPool(accounts_db)
+    ACCOUNTS_DB, LEGACY_REQUESTS_DB = accounts_db, legacy_requests_db
+
+def close_connections():
+    _pool.close_all()
+
+def init_accounts():
+    """Create the schema and merge developer_requests.db; one PRAGMA read when already done."""
+    with transaction() as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        _drop_duplicate_requests(conn)
+        conn.executescript(REQUEST_INDEXES)
+    merge_legacy_requests()
+    with transaction() as conn:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def _drop_duplicate_requests(conn):
+    """Keep only each user's first request, so the unique index can be built."""
+    conn.execute('DELETE FROM developer_requests WHERE id NOT IN '
+                 '(SELECT min(id) FROM developer_requests GROUP BY user_id)')
+
+def merge_legacy_requests(path=None):
+    """Copy developer_requests.db into the accounts database exactly once.
+
+    The old file is left in place as a backup, and requests from users who
+    already have one are skipped. Returns True if rows were merged.
+    """
+    path = path or LEGACY_REQUESTS_DB
+    if not os.path.exists(path):
+        return False
+    with _pool.connection() as conn:
+        # ATTACH cannot run inside a transaction
+        conn.execute('ATTACH DATABASE ? AS legacy', (path,))
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                if conn.execute("SELECT 1 FROM meta WHERE key='requests_merged'").fetchone():
+                    return False
+                has_table = conn.execute(
+                    "SELECT 1 FROM legacy.sqlite_master WHERE name='developer_requests'").fetchone()
+                if has_table:
+                    conn.execute('INSERT OR IGNORE INTO developer_requests (id, user_id, email, reason, created_at) '
+                                 'SELECT id, user_id, email, reason, created_at FROM legacy.developer_requests')
+                conn.execute("INSERT INTO meta (key, value) VALUES ('requests_merged', '1')")
+                return True
+        finally:
+            conn.execute('DETACH DATABASE legacy')
+
+# ---------------- Users ----------------
+@metrics.timed('sqlite_write')
+def create_user(name, email, password_hash, created_at):
+    """Insert a regular user; returns the new id, or None if the email is taken."""
+    with transaction() as conn:
+        cur = conn.execute(
+            "INSERT INTO users (name, email, password, account_type, created_at) VALUES (?, ?, ?, 'user', ?) "
+            "ON CONFLICT (email) DO NOTHING",
+            (name, email, password_hash, created_at))
+        return cur.lastrowid if cur.rowcount else None
+
+@metrics.timed('sqlite_read')
+def find_user_by_email(email):
+    with transaction() as conn:
+        return conn.execute('SELECT id, name, email, password, account_type, created_at FROM users WHERE email=?',
+                            (email,)).fetchone()
+
+@metrics.timed('sqlite_read')
+def get_user(user_id):
+    with transaction() as conn:
+        return conn.execute('SELECT id, name, email FROM users WHERE id=?', (user_id,)).fetchone()
+
+@metrics.timed('sqlite_write')
+def update_user(user_id, name, email, password_hash=None):
+    with transaction() as conn:
+        if password_hash:
+            conn.execute('UPDATE users SET name=?, email=?, password=? WHERE id=?',
+                         (name, email, password_hash, user_id))
+        else:
+            conn.execute('UPDATE users SET name=?, email=? WHERE id=?', (name, email, user_id))
+
+@metrics.timed('sqlite_write')
+def update_password(user_id, password_hash):
+    with transaction() as conn:
+        conn.execute('UPDATE users SET password=? WHERE id=?', (password_hash, user_id))
+
+@metrics.timed('sqlite_write')
+def delete_account(user_id):
+    """Remove a user together with their pending developer requests."""
+    with transaction() as conn:
+        conn.execute('DELETE FROM developer_requests WHERE user_id=?', (user_id,))
+        return conn.execute('DELETE FROM users WHERE id=?', (user_id,)).rowcount > 0
+
+# ---------------- Developer Requests ----------------
+# Most ids per bulk call (see app.py), well under SQLite's bound-parameter limit
+MAX_BULK_REQUESTS = 500
+
+@metrics.timed('sqlite_write')
+def create_developer_request(user_id, email, reason):
+    """Queue a request; False if the user already has one pending."""
+    with transaction() as conn:
+        return conn.execute('INSERT INTO developer_requests (user_id, email, reason) VALUES (?, ?, ?) '
+                            'ON CONFLICT (user_id) DO NOTHING',
+                            (user_id, email, reason)).rowcount > 0
+
+@metrics.timed('sqlite_read')
+def list_developer_requests(limit, after=None):
+    """One page of pending requests, oldest first.
+
+    `after` is the (created_at, id) of the last request on the previous page.
+    """
+    sql = 'SELECT id, user_id, email, reason, created_at FROM developer_requests'
+    params = []
+    if after:
+        sql += ' WHERE (created_at, id) > (?, ?)'
+        params += list(after)
+    sql += ' ORDER BY created_at, id LIMIT ?'
+    params.append(limit)
+    with transaction() as conn:
+        return conn.execute(sql, params).fetchall()
+
+@metrics.timed('sqlite_read')
+def count_developer_requests():
+    with transaction() as conn:
+        return conn.execute('SELECT COUNT(*) FROM developer_requests').fetchone()[0]
+
+@metrics.timed('sqlite_write')
+def approve_requests(request_ids):
+    """Promote the requesting users to developer and drop their requests, all or nothing.
+
+    Admins keep their role. Returns the number of requests approved; ids
+    that are already gone are ignored.
+    """
+    request_ids = list(request_ids)
+    if not request_ids:
+        return 0
+    marks = ','.join('?' * len(request_ids))
+    with transaction(immediate=True) as conn:
+        conn.execute(f"UPDATE users SET account_type='developer' WHERE account_type != 'admin' AND id IN "
+                     f"(SELECT user_id FROM developer_requests WHERE id IN ({marks}))", request_ids)
+        return conn.execute(f'DELETE FROM developer_requests WHERE id IN ({marks})', request_ids).rowcount
+
+@metrics.timed('sqlite_write')
+def reject_requests(request_ids):
+    """Drop the given requests in one transaction; returns how many existed."""
+    request_ids = list(request_ids)
+    if not request_ids:
+        return 0
+    with transaction() as conn:
+        return conn.execute(f'DELETE FROM developer_requests WHERE id IN ({",".join("?" * len(request_ids))})',
+                            request_ids).rowcount
+
+def approve_request(request_id):
+    """Promote the requesting user to developer and drop the request; False if it is gone."""
+    return approve_requests([request_id]) > 0
+
+def reject_request(request_id):
+    return reject_requests([request_id]) > 0
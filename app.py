@@ -1,116 +1,422 @@
 import os
 import json
-import sqlite3
+import mimetypes
+import gzip
+import zlib
+import base64
+import threading
+from bisect import bisect_right
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Blueprint, current_app, g, request, jsonify, render_template, redirect, url_for, flash, session, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from chatbot_logic import get_chatbot_reply
-
-# ---------------- Flask Setup ----------------
-app = Flask(__name__, static_folder='static', template_folder='templates')
-app.secret_key = 'your-secret-key'  # Replace with a strong key
+import storage
+import snapshot
+import accounts
+import passwords
+import ratelimit
+import metrics
+import images
+import jobs
+import assets
+from trending import board as trending_board
+from events import hub as event_hub
+
+try:
+    import brotli
+except ImportError:  # optional: without it responses are gzip-compressed only
+    brotli = None
 
 # ---------------- Config ----------------
-app.config['UPLOAD_FOLDER'] = os.path.join(app.static_folder, 'uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-IDEAS_FILE = 'ideas.json'
-REPORTS_FILE = 'reports.json'
-DB_FILE = 'users.db'
-REQUESTS_DB = 'developer_requests.db'
+IMAGE_MAX_AGE = 365 * 24 * 3600  # content-hashed images never change
+ASSET_MAX_AGE = IMAGE_MAX_AGE    # so are the built CSS/JS bundles
+
+# Defaults; overridden by SPARKHUB_<KEY> environment variables, then by create_app(config)
+DEFAULT_CONFIG = {
+    'SECRET_KEY': 'your-secret-key',  # Replace with a strong key
+
+    # Data files; relative paths are resolved against DATA_DIR
+    'DATA_DIR': '.',
+    'IDEAS_DB': storage.IDEAS_DB,
+    'IDEAS_FILE': storage.IDEAS_FILE,
+    'REPORTS_FILE': storage.REPORTS_FILE,
+    'USERS_DB': accounts.ACCOUNTS_DB,
+    'LEGACY_REQUESTS_DB': accounts.LEGACY_REQUESTS_DB,
+    'UPLOAD_FOLDER': None,  # defaults to static/uploads
+    'ASSETS_FOLDER': None,  # built bundles (assets.py); defaults to static/dist
+    'SNAPSHOT_FOLDER': None,  # memory-mapped idea cache (snapshot.py); None keeps it in dicts
+
+    # Response compression (see compress_response)
+    'COMPRESS_MIN_SIZE': 1024,  # bytes; smaller bodies are sent as-is
+    'COMPRESS_GZIP_LEVEL': 6,
+    'COMPRESS_BR_QUALITY': 4,
+    'COMPRESS_MIMETYPES': {'application/json', 'text/html', 'text/css',
+                           'text/javascript', 'application/javascript'},
+
+    # Password hashing (see passwords.py); over the queue limit login/signup answer 503
+    'PASSWORD_HASH_METHOD': passwords.HASH_METHOD,
+    'PASSWORD_HASH_WORKERS': passwords.POOL_WORKERS,
+    'PASSWORD_HASH_QUEUE': passwords.MAX_QUEUE,
+    'PASSWORD_HASH_TIMEOUT': passwords.TIMEOUT,
+    'OVERLOAD_RETRY_AFTER': 2,  # seconds, sent with 503s
+
+    # Per-client token buckets for votes, reports and the chatbot (see ratelimit.py),
+    # and the number of write requests that may run at once before more are shed
+    'RATE_LIMITS': ratelimit.LIMITS,  # {rule: (burst, per second)}
+    'RATE_LIMIT_FILE': None,  # shared by all workers when set; None limits each process alone
+    'MAX_CONCURRENT_WRITES': ratelimit.MAX_WRITES,
+    'WRITE_QUEUE_TIMEOUT': ratelimit.WRITE_TIMEOUT,  # seconds a write waits for a slot
+
+    # Open /api/events streams allowed per process; each one holds a request thread
+    # on a threaded server (gunicorn.conf.py sets it). None is no limit
+    'EVENT_STREAM_LIMIT': None,
+
+    # GET /metrics is for admins, or scrapers sending 'Authorization: Bearer <token>'
+    'METRICS_TOKEN': None,
+
+    # Slow-request profiler: dump stacks of requests slower than this many seconds
+    'PROFILE_SLOW_REQUESTS': None,
+    'PROFILE_DIR': 'profiles',
+}
+DATA_PATHS = ('IDEAS_DB', 'IDEAS_FILE', 'REPORTS_FILE', 'USERS_DB', 'LEGACY_REQUESTS_DB', 'PROFILE_DIR')
+
+bp = Blueprint('main', __name__)
+
+class JSONProvider(DefaultJSONProvider):
+    """Also serializes the snapshot-backed ideas of the idea cache."""
+    @staticmethod
+    def default(o):
+        if isinstance(o, snapshot.IdeaView):
+            return o.to_dict()
+        if isinstance(o, snapshot.VoteSet):
+            return list(o)
+        return DefaultJSONProvider.default(o)
+
+# ---------------- App Factory ----------------
+def create_app(config=None):
+    """Build the SparkHub app.
+
+    Creating the app does no database work; the schema is set up and the
+    legacy files imported by init_data(), on the first request or up front
+    (wsgi.py does it once in the gunicorn master before workers fork).
+    The stores are module-level, so one process serves one data set.
+    """
+    app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.json = JSONProvider(app)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_prefixed_env('SPARKHUB')
+    app.config.update(config or {})
+
+    for key in DATA_PATHS:
+        app.config[key] = os.path.join(app.config['DATA_DIR'], app.config[key])
+    for key in ('SNAPSHOT_FOLDER', 'RATE_LIMIT_FILE'):
+        if app.config[key]:
+            app.config[key] = os.path.join(app.config['DATA_DIR'], app.config[key])
+    app.config['UPLOAD_FOLDER'] = app.config['UPLOAD_FOLDER'] or os.path.join(app.static_folder, 'uploads')
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    jobs.configure(app.config['UPLOAD_FOLDER'])
+
+    # Bundle / fingerprint CSS, JS and images once per start (cheap when nothing changed)
+    app.config['ASSETS_FOLDER'] = app.config['ASSETS_FOLDER'] or os.path.join(app.static_folder, 'dist')
+    app.extensions['asset_manifest'] = assets.build(app.static_folder, app.config['ASSETS_FOLDER'])
+    app.add_template_global(asset_url)
+
+    storage.configure(app.config['IDEAS_DB'], app.config['IDEAS_FILE'], app.config['REPORTS_FILE'],
+                      app.config['SNAPSHOT_FOLDER'])
+    accounts.configure(app.config['USERS_DB'], app.config['LEGACY_REQUESTS_DB'])
+    passwords.configure(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_WORKERS'],
+                        app.config['PASSWORD_HASH_QUEUE'], app.config['PASSWORD_HASH_TIMEOUT'])
+    ratelimit.configure(app.config['RATE_LIMITS'], app.config['RATE_LIMIT_FILE'],
+                        app.config['MAX_CONCURRENT_WRITES'], app.config['WRITE_QUEUE_TIMEOUT'])
+
+    metrics.init_app(app)
+    app.register_blueprint(bp)
+
+    @app.before_request
+    def ensure_data():
+        init_data(app)
+        jobs.worker.start()  # per process, so after the fork under gunicorn
+
+    return app
 
 # ---------------- SQLite Setup ----------------
-def init_db():
-    # Users DB
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                account_type TEXT NOT NULL DEFAULT 'user',
-                created_at TEXT NOT NULL
-            )
-        ''')
-        conn.commit()
-
-    # Developer Requests DB
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS developer_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                email TEXT NOT NULL,
-                reason TEXT NOT NULL,
-                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-
-init_db()
+_init_lock = threading.Lock()
 
-# ---------------- Helper Functions ----------------
-def load_json(file):
-    if not os.path.exists(file):
-        return []
-    with open(file, 'r') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
+def init_db():
+    # Users & developer requests DB (merges developer_requests.db on first run)
+    accounts.init_accounts()
+
+    # Ideas, votes & reports DB (imports ideas.json / reports.json on first run)
+    storage.init_store()
+
+def init_data(app):
+    """Run init_db() once per process; cheap to call on every request."""
+    if app.extensions.get('sparkhub_initialized'):
+        return
+    with _init_lock:
+        if not app.extensions.get('sparkhub_initialized'):
+            init_db()
+            app.extensions['sparkhub_initialized'] = True
+
+# ---------------- Metrics ----------------
+# Request / phase histograms and GET /metrics come from metrics.init_app()
+def store_metrics():
+    stats = storage.cache_stats()
+    values = [
+        ('sparkhub_idea_cache_hits_total', 'counter', stats['hits']),
+        ('sparkhub_idea_cache_misses_total', 'counter', stats['misses']),
+        ('sparkhub_cached_ideas', 'gauge', stats['cached_ideas']),
+        ('sparkhub_group_commit_batches_total', 'counter', stats['group_commit']['batches']),
+        ('sparkhub_group_commit_operations_total', 'counter', stats['group_commit']['operations']),
+        ('sparkhub_sqlite_connections_opened_total', 'counter', stats['connections']['opened']),
+        ('sparkhub_event_streams', 'gauge', event_hub.subscribers),
+    ]
+    lines = []
+    for name, kind, value in values:
+        lines += [f'# TYPE {name} {kind}', f'{name} {value}']
+    return lines
 
-def save_json(file, data):
-    with open(file, 'w') as f:
-        json.dump(data, f, indent=2)
+metrics.register_collector(store_metrics)
 
-def get_next_id(items):
-    return max((i.get('id', 0) for i in items), default=0) + 1
+# ---------------- Helper Functions ----------------
+IDEA_FIELDS = ('id', 'user_id', 'title', 'description', 'category', 'image_url', 'created_at',
+               'upvotes', 'downvotes', 'upvote_count', 'downvote_count', 'my_vote')
+MAX_PAGE_SIZE = 100
+REPORTED_IDEAS_PAGE_SIZE = 25
+DEVELOPER_REQUESTS_PAGE_SIZE = 50
+
+def encode_cursor(sort_key):
+    return base64.urlsafe_b64encode(json.dumps(sort_key).encode()).decode().rstrip('=')
+
+# Element types of each kind of cursor; it is compared against sort keys of this shape
+NUMBER = (int, float)
+CURSOR_SHAPES = {'newest': (int,), 'popular': (int, int), 'trending': (NUMBER, int)}
+ID_CURSOR = (int,)  # id order, or the rank of a search hit
+
+def decode_cursor(cursor, shape):
+    """Inverse of encode_cursor(); raises ValueError on a malformed cursor.
+
+    `shape` holds the type (or tuple of types) of each element, so a cursor
+    made for another sort order cannot reach the comparisons.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort_key = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if (not isinstance(sort_key, list) or len(sort_key) != len(shape)
+            or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(sort_key, shape))):
+        raise ValueError("Invalid cursor")
+    return tuple(sort_key)
+
+def page_args(shape, default_limit=MAX_PAGE_SIZE):
+    """Read `limit` / `cursor` (see decode_cursor) from the query string; raises ValueError if invalid."""
+    try:
+        limit = min(int(request.args.get('limit', default_limit)), MAX_PAGE_SIZE)
+    except ValueError as e:
+        raise ValueError("Invalid limit") from e
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    after = decode_cursor(request.args['cursor'], shape) if request.args.get('cursor') else None
+    return limit, after
+
+def project_idea(idea, fields=None, vote_counts=False):
+    """Shape an idea for the API: optionally swap voter lists for counts and keep only `fields`."""
+    if vote_counts:
+        user_id = session.get('user_id')
+        out = {k: v for k, v in idea.items() if k not in ('upvotes', 'downvotes')}
+        out['my_vote'] = ('upvote' if user_id in idea['upvotes'] else
+                          'downvote' if user_id in idea['downvotes'] else None)
+    else:
+        out = idea
+    if fields:
+        out = {k: out[k] for k in fields if k in out}
+    return out
+
+# ---------------- Conditional GET ----------------
+def data_etag(*parts):
+    """Weak ETag for a response derived from the idea store.
+
+    Responses can depend on the session (my_vote, user_id=me), so the user
+    id is part of the tag; `parts` adds anything else the body depends on.
+    No Last-Modified is sent: it has whole-second resolution, so a write in
+    the same second as an earlier response would still match it.
+    """
+    version, _ = storage.data_version()
+    return '-'.join(str(p) for p in (f'v{version}', session.get('user_id', 0)) + parts)
+
+def not_modified(etag):
+    """True when the client's copy (If-None-Match) is current."""
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+def validated(response, etag):
+    """Attach the validator; clients must revalidate, which is cheap on a match."""
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+def conditional_json(etag, build):
+    """304 without building the body when current, else jsonify(build()) with the ETag."""
+    if not_modified(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    return validated(response, etag)
+
+# ---------------- Compression ----------------
+def pick_encoding():
+    encodings = request.accept_encodings
+    if brotli is not None and encodings['br']:
+        return 'br'
+    if encodings['gzip']:
+        return 'gzip'
+    return None
+
+@bp.after_app_request
+def compress_response(response):
+    # Only complete, buffered bodies; files and streams pass through untouched
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in current_app.config['COMPRESS_MIMETYPES']):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = pick_encoding()
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    if encoding == 'br':
+        body = brotli.compress(body, quality=current_app.config['COMPRESS_BR_QUALITY'])
+    else:
+        body = gzip.compress(body, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # A strong tag names one exact byte sequence, so it no longer matches
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def gzip_stream(chunks):
+    """Compress a streamed body as it goes; each chunk is flushed so the client sees progress."""
+    compressor = zlib.compressobj(current_app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+# ---------------- Static Assets ----------------
+def asset_url(name):
+    """URL of a bundle ('index.css') or static file ('img/logo.png') under its content hash.
+
+    Files the build does not know about are served from /static as before.
+    In debug mode the bundles are rebuilt once per request, so edits show up on reload.
+    """
+    if current_app.debug and not g.get('assets_checked'):
+        g.assets_checked = True
+        current_app.extensions['asset_manifest'] = assets.build(current_app.static_folder,
+                                                                current_app.config['ASSETS_FOLDER'])
+    filename = current_app.extensions['asset_manifest'].get(name)
+    if filename is None:
+        return url_for('static', filename=name)
+    return url_for('main.built_asset', filename=filename)
+
+@bp.route('/assets/<filename>')
+def built_asset(filename):
+    # Precompressed .br / .gz siblings are sent as they are
+    folder = current_app.config['ASSETS_FOLDER']
+    path, encoding = assets.resolve(folder, filename, request.accept_encodings)
+    if path is None:
+        return jsonify({"error": "Asset not found"}), 404
+    response = send_from_directory(folder, path, mimetype=mimetypes.guess_type(filename)[0],
+                                   etag=path, max_age=ASSET_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# ---------------- Load Shedding ----------------
+BUSY_MESSAGE = "Too many sign-ins right now, please try again in a moment"
+BUSY_TEMPLATES = {'main.login': 'login.html', 'main.signup': 'signup.html'}
+
+@bp.app_errorhandler(passwords.Overloaded)
+def overloaded(error):
+    # Answer at once rather than queue behind the password hashing pool
+    template = BUSY_TEMPLATES.get(request.endpoint)
+    body = render_template(template, error=BUSY_MESSAGE) if template else BUSY_MESSAGE
+    return body, 503, {'Retry-After': str(current_app.config['OVERLOAD_RETRY_AFTER'])}
+
+# Requests charged to a client's bucket, and the endpoints that write to the stores
+RATE_LIMITED_ENDPOINTS = {'main.vote_idea': 'vote', 'main.report_idea': 'report', 'main.chatbot': 'chatbot'}
+WRITE_ENDPOINTS = {'main.ideas_api', 'main.vote_idea', 'main.report_idea', 'main.delete_idea',
+                   'main.edit_idea', 'main.edit_idea_inline', 'main.delete_report',
+                   'main.import_ideas', 'main.delete_account'}
+
+def client_key():
+    """Who a request is charged to: the logged-in user, else the remote address."""
+    user_id = session.get('user_id')
+    return f'user:{user_id}' if user_id is not None else f'ip:{request.remote_addr}'
+
+@bp.before_app_request
+def admit_request():
+    # Before any other work: a client over its limit must not take a write slot
+    rule = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if rule:
+        ratelimit.check(rule, client_key())
+    if request.endpoint in WRITE_ENDPOINTS and request.method not in ('GET', 'HEAD'):
+        g.write_slot = ratelimit.acquire_write()
+
+@bp.teardown_app_request
+def release_write_slot(error=None):
+    held = g.pop('write_slot', None)
+    if held is not None:
+        ratelimit.release_write(held)
+
+@bp.app_errorhandler(ratelimit.RateLimited)
+def rate_limited(error):
+    return jsonify({"error": "Too many requests, please slow down"}), 429, {'Retry-After': str(error.retry_after)}
+
+@bp.app_errorhandler(ratelimit.Overloaded)
+def writes_overloaded(error):
+    return (jsonify({"error": "The server is busy, please try again in a moment"}), 503,
+            {'Retry-After': str(current_app.config['OVERLOAD_RETRY_AFTER'])})
 
 # ---------------- Context Processor ----------------
-@app.context_processor
+@bp.app_context_processor
 def inject_user():
     return {'USER_ID': session.get('user_id'), 'USERNAME': session.get('username')}
 
 # ---------------- Routes ----------------
-@app.route('/')
+@bp.route('/')
 def branding():
     return render_template('branding.html')
 
-@app.route('/index')
+@bp.route('/index')
 def index():
     if 'user_id' not in session:
-        return redirect(url_for('branding'))
+        return redirect(url_for('.branding'))
     return render_template('index.html')
 
 
-@app.route('/delete_idea/<int:idea_id>', methods=['DELETE'])
+@bp.route('/delete_idea/<int:idea_id>', methods=['DELETE'])
 def delete_idea(idea_id):
     if 'user_id' not in session:
         return jsonify({"error": "Login required"}), 401
 
-    ideas = load_json(IDEAS_FILE)
-    idea_exists = any(i for i in ideas if i.get('id') == idea_id)
-    if not idea_exists:
+    # Hidden at once; its votes, reports and image are purged by a background job
+    if not storage.delete_idea(idea_id):
         return jsonify({"error": "Idea not found"}), 404
 
-    # Remove the idea
-    ideas = [i for i in ideas if i.get('id') != idea_id]
-    save_json(IDEAS_FILE, ideas)
-
-    # Optional: remove all reports related to this idea
-    reports = load_json(REPORTS_FILE)
-    reports = [r for r in reports if r.get('idea_id') != idea_id]
-    save_json(REPORTS_FILE, reports)
-
     return jsonify({"success": True, "message": "Idea removed"})
 
 
 
 # ---------------- Signup ----------------
-@app.route('/signup', methods=['GET', 'POST'])
+@bp.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
         name = request.form.get('name', '').strip()
@@ -121,36 +427,29 @@ def signup():
         if password != confirm_password:
             return render_template('signup.html', error="Passwords do not match")
 
-        hashed_pw = generate_password_hash(password)
-        try:
-            with sqlite3.connect(DB_FILE) as conn:
-                c = conn.cursor()
-                c.execute('''
-                    INSERT INTO users (name, email, password, account_type, created_at)
-                    VALUES (?, ?, ?, 'user', ?)
-                ''', (name, email, hashed_pw, datetime.utcnow().isoformat()))
-                conn.commit()
-        except sqlite3.IntegrityError:
+        hashed_pw = passwords.hash_password(password)
+        if accounts.create_user(name, email, hashed_pw, datetime.utcnow().isoformat()) is None:
             return render_template('signup.html', error="Email already registered")
 
         flash("Signup successful! Please login.", "success")
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     return render_template('signup.html')
 
 # ---------------- Login ----------------
-@app.route("/login", methods=["GET", "POST"])
+@bp.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
         email = request.form.get("email", "").strip()  # match form input
         password = request.form.get("password", "").strip()
 
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("SELECT id, name, email, password, account_type, created_at FROM users WHERE email=?", (email,))
-            user = c.fetchone()
+        user = accounts.find_user_by_email(email)
+        matches, new_hash = passwords.verify_password(user[3], password) if user else (False, None)
 
-        if user and check_password_hash(user[3], password):
+        if matches:
+            if new_hash:
+                # Stored with older hash parameters; upgrade it now we know the password
+                accounts.update_password(user[0], new_hash)
             session["user_id"] = user[0]
             session["name"] = user[1]
             session["email"] = user[2]
@@ -158,23 +457,21 @@ def login():
             # Format date_joined to only show date (YYYY-MM-DD)
             session["date_joined"] = user[5].split("T")[0] if "T" in user[5] else user[5]
             flash("Login successful!", "success")
-            return redirect(url_for('index'))
+            return redirect(url_for('.index'))
 
         return render_template("login.html", error="Invalid email or password")
 
     return render_template("login.html")
 
 # ---------------- Logout ----------------
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('branding'))
+    return redirect(url_for('.branding'))
 
 # ---------------- Ideas API ----------------
-@app.route('/api/ideas', methods=['GET', 'POST'])
+@bp.route('/api/ideas', methods=['GET', 'POST'])
 def ideas_api():
-    ideas = load_json(IDEAS_FILE)
-    
     if request.method == 'POST':
         if 'user_id' not in session:
             return jsonify({"error": "Login required"}), 401
@@ -184,54 +481,231 @@ def ideas_api():
         description = data.get('description', '').strip()
         category = data.get('category', '').strip()
         image_file = request.files.get('image')
-        image_url = data.get('image_url', '').strip()
-
-        filename = ''
-        if image_file and image_file.filename:
-            ext = os.path.splitext(image_file.filename)[1]
-            filename = f"idea-{get_next_id(ideas)}{ext}"
-            image_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-        elif image_url:
-            filename = image_url
-
-        new_idea = {
-            "id": get_next_id(ideas),
-            "user_id": int(session['user_id']),
-            "title": title,
-            "description": description,
-            "category": category,
-            "image_url": f"/images/{filename}" if filename and not filename.startswith("http") else filename,
-            "upvotes": [],
-            "downvotes": []
-        }
-        ideas.append(new_idea)
-        save_json(IDEAS_FILE, ideas)
+
+        # Uploads are stored under their content hash; a given URL must name one exactly
+        try:
+            if image_file and image_file.filename:
+                image_url = f"/images/{images.save_upload(image_file, current_app.config['UPLOAD_FOLDER'])}"
+            else:
+                image_url = images.normalize_url(data.get('image_url'))
+        except images.UnsupportedImage as e:
+            return jsonify({"error": str(e)}), 400
+        new_idea = storage.create_idea(int(session['user_id']), title, description, category,
+                                       datetime.utcnow().isoformat(), image_url)
         return jsonify(new_idea), 201
 
     # GET ideas with filtering
-    search = request.args.get('search', '').lower()
+    search = request.args.get('search', '').strip()
     category = request.args.get('category', 'all').lower()
     sort = request.args.get('sort', 'newest').lower()
+    owner = request.args.get('user_id', '').strip()
+    fields = [f for f in request.args.get('fields', '').split(',') if f in IDEA_FIELDS]
+    vote_counts = request.args.get('votes', '').lower() == 'counts'
 
-    filtered = [
-        idea for idea in ideas
-        if (search in idea.get('title', '').lower() or search in idea.get('description', '').lower())
-        and (category == 'all' or idea.get('category', '').lower() == category)
-    ]
-
-    if sort == 'newest':
-        filtered.sort(key=lambda x: x.get('id', 0), reverse=True)
-    elif sort == 'popular':
-        filtered.sort(key=lambda x: len(x.get('upvotes', [])) - len(x.get('downvotes', [])), reverse=True)
-    elif sort == 'trending':
-        filtered.sort(key=lambda x: len(x.get('upvotes', [])), reverse=True)
+    if owner == 'me':
+        if 'user_id' not in session:
+            return jsonify({"error": "Login required"}), 401
+        owner = session['user_id']
+    elif owner:
+        if not owner.isdigit():
+            return jsonify({"error": "Invalid user_id"}), 400
+        owner = int(owner)
+
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    try:
+        limit, after = page_args(CURSOR_SHAPES.get(sort, ID_CURSOR))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Nothing written since the client's copy: answer 304 before searching,
+    # sorting or serializing anything. Trending order also moves with time.
+    etag = data_etag(*(['t', trending_board.generation] if sort == 'trending' else []))
+    if not_modified(etag):
+        return validated(current_app.response_class(status=304), etag)
+
+    # Search hits come from the full-text index, best match first; without a
+    # search the in-process cache already holds every sort order (per
+    # category too), and the trending board keeps the decayed ranking.
+    matches = storage.search_idea_ids(search) if search else None
+    if sort == 'trending':
+        trending_board.sync()
+        sort_key = trending_board.sort_key
+    else:
+        sort_key = storage.SORT_KEYS.get(sort)
+
+    def in_category(ids):
+        # Narrow ranked or matching ids to the category before any idea is looked up
+        nonlocal category
+        if category == 'all':
+            return ids
+        keep, category = storage.cached_category_ids(category), 'all'
+        return [i for i in ids if i in keep]
+
+    if matches is None:
+        if sort == 'trending':
+            # A page is read straight off the board below; only a full list needs every id
+            ideas = None if paginate else storage.cached_ideas_by_ids(in_category(trending_board.ranked_ids()))
+        else:
+            if sort == 'relevance':
+                sort, sort_key = 'newest', storage.SORT_KEYS['newest']
+            if category != 'all':
+                ideas = storage.cached_ideas(sort, category=category)
+                category = 'all'  # already filtered
+            else:
+                ideas = storage.cached_ideas(sort)
+            sort_key = sort_key or storage.ID_ORDER
+    else:
+        matches = in_category(matches)
+        ideas = storage.cached_ideas_by_ids(matches)
+        if sort_key:
+            ideas = sorted(ideas, key=sort_key)
+        else:
+            rank = {idea_id: pos for pos, idea_id in enumerate(matches)}
+            sort_key = lambda i: (rank[i['id']],)
+
+    def wanted(idea):
+        return ((category == 'all' or idea.get('category', '').lower() == category)
+                and (not owner or idea.get('user_id') == owner))
+
+    if not paginate:
+        with metrics.span('filter'):
+            body = [project_idea(i, fields, vote_counts) for i in ideas if wanted(i)]
+        with metrics.span('serialize'):
+            response = jsonify(body)
+        return validated(response, etag)
+
+    # Keyset pagination: resume right after the cursor's sort key and stop
+    # scanning as soon as one idea past the page has been seen.
+    with metrics.span('filter'):
+        page = []
+        if ideas is None:
+            # Trending: bisect to the cursor on the board and look up only the ids
+            # this page needs, taking bigger slices while filters drop some
+            keep = storage.cached_category_ids(category) if category != 'all' else None
+            position, size = after, limit + 1
+            while len(page) <= limit:
+                entries = trending_board.entries_after(position, size)
+                if not entries:
+                    break
+                position, size = entries[-1], size * 2
+                ids = [idea_id for _, idea_id in entries if keep is None or idea_id in keep]
+                page += [i for i in storage.cached_ideas_by_ids(ids) if wanted(i)]
+            del page[limit + 1:]
+        else:
+            start = bisect_right(ideas, after, key=sort_key) if after is not None else 0
+            for idx in range(start, len(ideas)):
+                idea = ideas[idx]
+                if wanted(idea):
+                    page.append(idea)
+                    if len(page) > limit:
+                        break
+
+    next_cursor = encode_cursor(sort_key(page[limit - 1])) if len(page) > limit else None
+    with metrics.span('serialize'):
+        response = jsonify({
+            "ideas": [project_idea(i, fields, vote_counts) for i in page[:limit]],
+            "next_cursor": next_cursor,
+        })
+    return validated(response, etag)
+
+@bp.route('/api/ideas/facets', methods=['GET'])
+def ideas_facets():
+    """Live idea count per category, optionally for the ideas matching ?search=."""
+    search = request.args.get('search', '').strip()
+    etag = data_etag('facets')
+
+    def build():
+        counts = storage.cached_facets(storage.search_idea_ids(search) if search else None)
+        return {"total": sum(counts.values()),
+                "categories": [{"category": c, "count": n} for c, n in sorted(counts.items())]}
+    return conditional_json(etag, build)
+
+@bp.route('/api/ideas/cache', methods=['GET'])
+def ideas_cache_stats():
+    return jsonify(storage.cache_stats())
+
+# ---------------- Live Updates ----------------
+@bp.route('/api/events')
+def events_stream():
+    # EventSource sends Last-Event-ID when it reconnects; ?last_event_id= works too
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    limit = current_app.config['EVENT_STREAM_LIMIT']
+    if limit is not None and event_hub.subscribers >= limit:
+        # The rest of the threads stay free for requests; the page tries again later
+        return ("Too many open event streams", 503,
+                {'Retry-After': str(current_app.config['OVERLOAD_RETRY_AFTER'])})
+    response = current_app.response_class(event_hub.stream(last_id), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
+
+# ---------------- Import / Export ----------------
+EXPORT_CHUNK_LINES = 500
+
+def ndjson_chunks(records, lines_per_chunk=EXPORT_CHUNK_LINES):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, separators=(',', ':')))
+        if len(lines) >= lines_per_chunk:
+            yield ('\n'.join(lines) + '\n').encode()
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode()
+
+@bp.route('/api/ideas/export')
+def export_ideas():
+    # Ideas and votes are public through /api/ideas; reports only for moderators
+    with_reports = session.get('account_type') in ['developer', 'admin']
+    records = (r for r in storage.export_records() if with_reports or r['type'] == 'idea')
+    body = ndjson_chunks(records)
+    headers = {'Content-Disposition': 'attachment; filename="sparkhub-export.ndjson"'}
+    if request.accept_encodings['gzip']:
+        body = gzip_stream(body)
+        headers['Content-Encoding'] = 'gzip'
+    response = current_app.response_class(stream_with_context(body), mimetype='application/x-ndjson',
+                                          headers=headers)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/api/ideas/import', methods=['POST'])
+def import_ideas():
+    # Must be admin
+    if session.get('account_type') != 'admin':
+        return jsonify({"error": "Unauthorized"}), 403
 
-    return jsonify(filtered)
+    # Read the upload line by line while answering with one progress line per batch
+    lines = request.stream
+    if request.content_encoding == 'gzip':
+        lines = gzip.open(lines, 'rb')
+    progress = storage.import_records(lines)
+    return current_app.response_class(stream_with_context(ndjson_chunks(progress, 1)),
+                                      mimetype='application/x-ndjson')
+
+# ---------------- Images ----------------
+@bp.route('/images/<name>')
+def serve_image(name):
+    # <hash>.thumb.webp etc. fall back to the original until the variant exists
+    filename, immutable = images.resolve(current_app.config['UPLOAD_FOLDER'], name)
+    if not filename:
+        return jsonify({"error": "Image not found"}), 404
+
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_from_directory(
+        current_app.config['UPLOAD_FOLDER'], filename, conditional=True,
+        etag=filename if immutable else True,
+        max_age=IMAGE_MAX_AGE if immutable else 0)
+    if immutable:
+        response.cache_control.immutable = True
+    return response
 
 # ---------------- Voting ----------------
 
 
-@app.route("/api/ideas/<int:idea_id>/vote", methods=["POST"])
+@bp.route("/api/ideas/<int:idea_id>/vote", methods=["POST"])
 def vote_idea(idea_id):
     if "user_id" not in session:
         return jsonify({"error": "Not logged in"}), 401
@@ -240,106 +714,89 @@ def vote_idea(idea_id):
     vote_type = data.get("voteType")
     user_id = int(session["user_id"])  # force integer
 
-    ideas = load_json(IDEAS_FILE)
-
-    updated_idea = None
-    for idea in ideas:
-        if int(idea.get("id")) == idea_id:  # ensure ID comparison works
-            up = set(idea.get("upvotes", []))
-            down = set(idea.get("downvotes", []))
-
-            if vote_type == "upvote":
-                if user_id in up:
-                    up.remove(user_id)
-                else:
-                    down.discard(user_id)
-                    up.add(user_id)
-
-            elif vote_type == "downvote":
-                if user_id in down:
-                    down.remove(user_id)
-                else:
-                    up.discard(user_id)
-                    down.add(user_id)
-
-            idea["upvotes"] = list(up)
-            idea["downvotes"] = list(down)
-            updated_idea = idea
-            break
-
+    # Same vote again removes it, the opposite vote switches it
+    updated_idea = storage.toggle_vote(idea_id, user_id, vote_type)
     if not updated_idea:
         return jsonify({"error": f"Idea {idea_id} not found"}), 404
 
-    save_json(IDEAS_FILE, ideas)
     return jsonify(updated_idea)
 
 
 # ---------------- Reporting ----------------
-@app.route('/api/ideas/<int:idea_id>/report', methods=['POST'])
+@bp.route('/api/ideas/<int:idea_id>/report', methods=['POST'])
 def report_idea(idea_id):
     if 'user_id' not in session:
         return jsonify({"error": "Login required"}), 401
 
-    ideas = load_json(IDEAS_FILE)
-    idea = next((i for i in ideas if i.get('id') == idea_id), None)
-    if not idea:
-        return jsonify({"error": "Idea not found"}), 404
-
-    reports = load_json(REPORTS_FILE)
     data = request.get_json() or {}
     report_desc = data.get('description', '').strip()
 
-    new_report = {
-        "id": get_next_id(reports),
-        "idea_id": idea_id,
-        "idea_title": idea.get('title', ''),
-        "user_id": int(session['user_id']),
-        "description": report_desc,
-        "createdAt": datetime.utcnow().isoformat()
-    }
-    reports.append(new_report)
-    save_json(REPORTS_FILE, reports)
+    new_report = storage.create_report(idea_id, int(session['user_id']), report_desc,
+                                       datetime.utcnow().isoformat())
+    if not new_report:
+        return jsonify({"error": "Idea not found"}), 404
     return jsonify(new_report), 201
 
 # ---------------- Get Reports for Idea ----------------
-@app.route('/api/ideas/<int:idea_id>/reports', methods=['GET'])
+@bp.route('/api/ideas/<int:idea_id>/reports', methods=['GET'])
 def get_reports(idea_id):
-    reports = load_json(REPORTS_FILE)
-    idea_reports = [
-        {
+    def summary(r):
+        return {
             "id": r.get("id"),
             "description": r.get("description", ""),
             "createdAt": r.get("createdAt", "")
         }
-        for r in reports if r.get("idea_id") == idea_id
-    ]
-    return jsonify(idea_reports)
+
+    etag = data_etag()
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return conditional_json(etag,
+                                lambda: [summary(r) for r in storage.list_reports(idea_id)])
+
+    # Paged: newest first, keyed on (createdAt, id)
+    try:
+        limit, after = page_args((str, int), default_limit=20)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def build():
+        page = storage.report_page(idea_id, limit + 1, after)
+        next_cursor = None
+        if len(page) > limit:
+            last = page[limit - 1]
+            next_cursor = encode_cursor([last['createdAt'], last['id']])
+        return {"reports": [summary(r) for r in page[:limit]], "next_cursor": next_cursor}
+    return conditional_json(etag, build)
 
 # ---------------- Reports Page ----------------
-@app.route('/reports')
+@bp.route('/reports')
 def reports_page():
     # Must be logged in
     if 'user_id' not in session:
         flash("Please login to access reports.", "error")
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     # Must be developer or admin
     if session.get('account_type') not in ['developer', 'admin']:
         flash("Unauthorized access.", "error")
-        return redirect(url_for('index'))
-
-    # Otherwise: load ideas + reports
-    ideas = load_json(IDEAS_FILE)
-    reports = load_json(REPORTS_FILE)
-    for idea in ideas:
-        idea_reports = [r for r in reports if r.get('idea_id') == idea.get('id')]
-        idea['report_count'] = len(idea_reports)
-        idea['reports'] = sorted(idea_reports, key=lambda x: x.get('createdAt', ''), reverse=True)
-
-    return render_template('reports.html', ideas=ideas, reports=reports)
+        return redirect(url_for('.index'))
+
+    # Otherwise: one page of reported ideas, most reported first. Each idea's
+    # reports are fetched lazily from /api/ideas/<id>/reports.
+    try:
+        after = decode_cursor(request.args['cursor'], (int, int)) if request.args.get('cursor') else None
+    except ValueError as e:
+        return str(e), 400
+    limit = REPORTED_IDEAS_PAGE_SIZE
+    ideas = storage.reported_ideas(limit + 1, after)
+    next_cursor = None
+    if len(ideas) > limit:
+        last = ideas[limit - 1]
+        next_cursor = encode_cursor([last['report_count'], last['id']])
+
+    return render_template('reports.html', ideas=ideas[:limit], next_cursor=next_cursor)
 
 # ---------------- Delete Report ----------------
-@app.route('/delete_report/<int:report_id>', methods=['DELETE'])
+@bp.route('/delete_report/<int:report_id>', methods=['DELETE'])
 def delete_report(report_id):
     if 'user_id' not in session:
         return jsonify({"error": "Login required"}), 401
@@ -348,133 +805,143 @@ def delete_report(report_id):
     if session.get("account_type") not in ["developer", "admin"]:
         return jsonify({"error": "Unauthorized"}), 403
 
-    reports = load_json(REPORTS_FILE)
-    report_exists = any(r for r in reports if r.get('id') == report_id)
-    if not report_exists:
+    if not storage.delete_report(report_id):
         return jsonify({"error": "Report not found"}), 404
 
-    # Remove the report
-    reports = [r for r in reports if r.get('id') != report_id]
-    save_json(REPORTS_FILE, reports)
-
     return jsonify({"success": True, "message": "Report deleted"}), 200
 
 # ---------------- Settings Page ----------------
-@app.route('/settings', methods=['GET', 'POST'])
+@bp.route('/settings', methods=['GET', 'POST'])
 def settings():
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     user_id = session['user_id']
 
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-
-        if request.method == 'POST':
-            name = request.form.get('name', '').strip()
-            email = request.form.get('email', '').strip()
-            password = request.form.get('password', '').strip()
-
-            if password:
-                hashed_pw = generate_password_hash(password)
-                c.execute("""UPDATE users SET name=?, email=?, password=? WHERE id=?""",
-                          (name, email, hashed_pw, user_id))
-            else:
-                c.execute("""UPDATE users SET name=?, email=? WHERE id=?""",
-                          (name, email, user_id))
-
-            conn.commit()
+    if request.method == 'POST':
+        name = request.form.get('name', '').strip()
+        email = request.form.get('email', '').strip()
+        password = request.form.get('password', '').strip()
 
-            session['username'] = name
-            session['email'] = email
-            flash("Settings updated!", "success")
-            return redirect(url_for('settings'))
+        hashed_pw = passwords.hash_password(password) if password else None
+        accounts.update_user(user_id, name, email, hashed_pw)
 
-        c.execute("SELECT id, name, email FROM users WHERE id=?", (user_id,))
-        row = c.fetchone()
+        session['username'] = name
+        session['email'] = email
+        flash("Settings updated!", "success")
+        return redirect(url_for('.settings'))
 
+    row = accounts.get_user(user_id)
     if not row:
-        return redirect(url_for('logout'))
+        return redirect(url_for('.logout'))
 
     user = {"id": row[0], "name": row[1], "email": row[2]}
     return render_template("settings.html", user=user)
 
 # ---------------- Developer Request ----------------
-@app.route("/developer_request", methods=["POST"])
+@bp.route("/developer_request", methods=["POST"])
 def developer_request():
     if "user_id" not in session:
         flash("You must be logged in to send a request.", "error")
-        return redirect(url_for("login"))
+        return redirect(url_for(".login"))
 
     reason = request.form["reason"]
     user_id = session["user_id"]
     email = session.get("email", "")
 
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute("INSERT INTO developer_requests (user_id, email, reason) VALUES (?, ?, ?)",
-                  (user_id, email, reason))
-        conn.commit()
-
-    flash("Your request has been sent successfully!", "success")
-    return redirect(url_for("settings"))
+    if accounts.create_developer_request(user_id, email, reason):
+        flash("Your request has been sent successfully!", "success")
+    else:
+        flash("You already have a pending request.", "info")
+    return redirect(url_for(".settings"))
 
 # ---------------- Admin Routes ----------------
-# ---------------- Admin Routes ----------------
-@app.route("/requests", methods=["GET"])
+@bp.route("/requests", methods=["GET"])
 def requests_page():
     # Must be logged in
     if "user_id" not in session:
         flash("Please login to access requests.", "error")
-        return redirect(url_for("login"))
+        return redirect(url_for(".login"))
 
     # Must be admin
     if session.get("account_type") != "admin":
         flash("Unauthorized access.", "error")
-        return redirect(url_for("index"))
-
-    # Load all developer requests
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, user_id, email, reason, created_at FROM developer_requests")
-        requests_data = c.fetchall()
-
-    return render_template("requests.html", requests=requests_data)
-
+        return redirect(url_for(".index"))
+
+    # One page of pending requests, oldest first
+    try:
+        after = decode_cursor(request.args['cursor'], (str, int)) if request.args.get('cursor') else None
+    except ValueError as e:
+        return str(e), 400
+    limit = DEVELOPER_REQUESTS_PAGE_SIZE
+    requests_data = accounts.list_developer_requests(limit + 1, after)
+    next_cursor = None
+    if len(requests_data) > limit:
+        last = requests_data[limit - 1]
+        next_cursor = encode_cursor([last['created_at'], last['id']])
+
+    return render_template("requests.html", requests=requests_data[:limit], next_cursor=next_cursor,
+                           pending=accounts.count_developer_requests())
+
+@bp.route("/requests/bulk", methods=["POST"])
+def bulk_requests():
+    """Approve or reject many requests at once, in a single transaction.
+
+    Takes the form fields `action` and `request_id` (repeated), or JSON
+    {"action": ..., "ids": [...]}, in which case it answers with JSON.
+    """
+    as_json = request.is_json
+    if session.get("account_type") != "admin":
+        if as_json:
+            return jsonify({"error": "Unauthorized"}), 403
+        flash("Unauthorized action.", "error")
+        return redirect(url_for(".index"))
 
-@app.route("/approve/<int:request_id>", methods=["POST"])
+    if as_json:
+        data = request.get_json(silent=True) or {}
+        action, ids = data.get("action"), data.get("ids")
+    else:
+        action, ids = request.form.get("action"), request.form.getlist("request_id")
+    try:
+        ids = sorted({int(i) for i in ids or []})
+    except (TypeError, ValueError):
+        ids = None
+    error = None
+    if action not in ("approve", "reject"):
+        error = "action must be 'approve' or 'reject'"
+    elif not ids:
+        error = "No requests selected"
+    elif len(ids) > accounts.MAX_BULK_REQUESTS:
+        error = f"At most {accounts.MAX_BULK_REQUESTS} requests at a time"
+    if error:
+        if as_json:
+            return jsonify({"error": error}), 400
+        flash(error, "error")
+        return redirect(url_for(".requests_page"))
+
+    done = (accounts.approve_requests if action == "approve" else accounts.reject_requests)(ids)
+    if as_json:
+        return jsonify({"action": action, "requested": len(ids), "done": done})
+    flash(f"{done} request{'s' if done != 1 else ''} {action}d.", "success" if action == "approve" else "error")
+    return redirect(url_for(".requests_page"))
+
+
+@bp.route("/approve/<int:request_id>", methods=["POST"])
 def approve_request(request_id):
     # Must be admin
     if session.get("account_type") != "admin":
         flash("Unauthorized action.", "error")
-        return redirect(url_for("index"))
-
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute("SELECT user_id FROM developer_requests WHERE id=?", (request_id,))
-        row = c.fetchone()
-
-    if row:
-        user_id = row[0]
-        # Promote user to developer
-        with sqlite3.connect(DB_FILE) as conn:
-            c = conn.cursor()
-            c.execute("UPDATE users SET account_type='developer' WHERE id=?", (user_id,))
-            conn.commit()
-
-        # Remove request from DB
-        with sqlite3.connect(REQUESTS_DB) as conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM developer_requests WHERE id=?", (request_id,))
-            conn.commit()
+        return redirect(url_for(".index"))
 
+    # Promote the user and remove the request in one transaction
+    if accounts.approve_request(request_id):
         flash("Request approved!", "success")
     else:
         flash("Request not found.", "error")
 
-    return redirect(url_for("requests_page"))
+    return redirect(url_for(".requests_page"))
 
-@app.route("/chatbot", methods=["POST"])
+@bp.route("/chatbot", methods=["POST"])
 def chatbot():
     data = request.get_json()
     msg = data.get("message", "")
@@ -484,55 +951,48 @@ def chatbot():
     return jsonify({"reply": reply})
 
 
-@app.route("/reject/<int:request_id>", methods=["POST"])
+@bp.route("/reject/<int:request_id>", methods=["POST"])
 def reject_request(request_id):
     # Must be admin
     if session.get("account_type") != "admin":
         flash("Unauthorized action.", "error")
-        return redirect(url_for("index"))
+        return redirect(url_for(".index"))
 
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM developer_requests WHERE id=?", (request_id,))
-        conn.commit()
+    accounts.reject_request(request_id)
 
     flash("Request rejected.", "error")
-    return redirect(url_for("requests_page"))
+    return redirect(url_for(".requests_page"))
 
 # ---------------- Delete Account ----------------
-@app.route("/delete_account", methods=["POST"])
+@bp.route("/delete_account", methods=["POST"])
 def delete_account():
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return redirect(url_for(".login"))
 
     user_id = session["user_id"]
 
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM users WHERE id=?", (user_id,))
-        conn.commit()
-
-    with sqlite3.connect(REQUESTS_DB) as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM developer_requests WHERE user_id=?", (user_id,))
-        conn.commit()
+    # The user row and their developer requests go together; their ideas are
+    # hidden at once and their ideas, votes and reports purged in the background
+    accounts.delete_account(user_id)
+    storage.delete_user_content(user_id)
 
     session.clear()
     flash("Your account has been deleted permanently.", "success")
-    return redirect(url_for("branding"))
+    return redirect(url_for(".branding"))
 
 # ---------------- Edit Idea ----------------
-@app.route('/edit_idea/<int:idea_id>', methods=['GET', 'POST'])
+@bp.route('/edit_idea/<int:idea_id>', methods=['GET', 'POST'])
 def edit_idea(idea_id):
     if 'user_id' not in session:
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
-    ideas = load_json(IDEAS_FILE)
-    idea = next((i for i in ideas if i['id'] == idea_id and i['user_id'] == session['user_id']), None)
+    idea = storage.get_idea(idea_id)
+    if idea and idea['user_id'] != session['user_id']:
+        idea = None
 
     if not idea:
         flash("Idea not found or you cannot edit it.", "error")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     if request.method == 'POST':
         title = request.form.get('title', '').strip()
@@ -542,28 +1002,28 @@ def edit_idea(idea_id):
         # Handle image upload
         image_file = request.files.get('image')
         image_url = request.form.get('image_url', '').strip()
-        filename = ''
-        if image_file and image_file.filename:
-            ext = os.path.splitext(image_file.filename)[1]
-            filename = f"idea-{idea_id}{ext}"
-            image_file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            idea['image_url'] = f"/images/{filename}"
-        elif image_url:
-            idea['image_url'] = image_url
+        try:
+            if image_file and image_file.filename:
+                idea['image_url'] = f"/images/{images.save_upload(image_file, current_app.config['UPLOAD_FOLDER'])}"
+            elif image_url:
+                idea['image_url'] = images.normalize_url(image_url)
+        except images.UnsupportedImage as e:
+            flash(str(e), "error")
+            return redirect(url_for('.index'))
 
         idea['title'] = title
         idea['description'] = description
         idea['category'] = category
-        save_json(IDEAS_FILE, ideas)
+        storage.update_idea(idea_id, idea)
 
         flash("Idea updated!", "success")
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     return render_template('edit_idea.html', idea=idea)
 
 
 # ---------------- Inline Edit Idea (JSON) ----------------
-@app.route('/edit_idea/<int:idea_id>/inline', methods=['POST'])
+@bp.route('/edit_idea/<int:idea_id>/inline', methods=['POST'])
 def edit_idea_inline(idea_id):
     if 'user_id' not in session:
         return jsonify({"error": "Login required"}), 401
@@ -572,16 +1032,12 @@ def edit_idea_inline(idea_id):
     if not data or 'description' not in data:
         return jsonify({"error": "No description provided"}), 400
 
-    ideas = load_json(IDEAS_FILE)
-    for idea in ideas:
-        if idea['id'] == idea_id and idea['user_id'] == session['user_id']:
-            idea['description'] = data['description']
-            save_json(IDEAS_FILE, ideas)
-            return jsonify({"success": True})
+    if storage.update_idea(idea_id, {'description': data['description']}, user_id=session['user_id']):
+        return jsonify({"success": True})
 
     return jsonify({"error": "Idea not found or permission denied"}), 404
 
 
 # ---------------- Run App ----------------
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,278 @@
+"""Bundle, minify and fingerprint the static CSS/JS (and images) for production.
+
+    python assets.py          # build static/dist/ and its manifest.json
+
+create_app() runs the same build on startup; unchanged bundles are not
+rewritten. Each output is named after a hash of its content and gets .gz
+and (with Brotli installed) .br siblings, so it can be served with an
+immutable cache header and without compressing per request.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_FOLDER = os.path.join(STATIC_FOLDER, 'dist')
+MANIFEST = 'manifest.json'
+
+# One stylesheet and one script per page; navbar.html is shared by several
+# pages, so it keeps bundles of its own that are cached once for all of them.
+BUNDLES = {
+    'branding.css': ['css/ui.css', 'css/branding.css'],
+    'branding.js': ['js/branding.js'],
+    'login.css': ['css/ui.css', 'css/branding.css', 'css/login.css'],
+    'signup.css': ['css/ui.css', 'css/branding.css', 'css/signup.css'],
+    'index.css': ['css/ui.css', 'css/styles.css'],
+    'index.js': ['js/app.js'],
+    'navbar.css': ['css/navbar.css'],
+    'navbar.js': ['js/navbar.js'],
+    'reports.css': ['css/ui.css', 'css/styles.css', 'css/reports.css'],
+    'reports.js': ['js/reports.js'],
+    'requests.css': ['css/ui.css', 'css/styles.css', 'css/requests.css'],
+    'requests.js': ['js/requests.js'],
+    'settings.css': ['css/ui.css', 'css/branding.css', 'css/styles.css', 'css/settings.css'],
+    'settings.js': ['js/settings.js'],
+}
+# Copied as they are, under a content-hashed name
+FINGERPRINT_FOLDERS = ('img',)
+
+COMPRESS_EXTENSIONS = ('.css', '.js', '.svg')
+GZIP_LEVEL = 9
+BR_QUALITY = 11
+# Outputs no longer in the manifest are kept this long for pages rendered before a deploy
+STALE_MAX_AGE = 24 * 3600
+
+# ---------------- Minifying ----------------
+CSS_TOKENS = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|([^"\'/]+|/)', re.S)
+CSS_URL = re.compile(r'url\(\s*([\'"]?)(?![a-z]+:|/|#|data:)([^\'")]+)\1\s*\)', re.I)
+
+def minify_css(text):
+    """Drop comments and collapse whitespace, leaving strings alone."""
+    out = []
+    for string, comment, code in CSS_TOKENS.findall(text):
+        if string:
+            out.append(string)
+        elif code:
+            # No space is needed next to these; ':' is left alone because 'a :hover' differs from 'a:hover'
+            out.append(re.sub(r' ?([{};,>]) ?', r'\1', re.sub(r'\s+', ' ', code)))
+    return ''.join(out).replace(';}', '}').strip()
+
+# A '/' after one of these words starts a regex literal rather than a division
+JS_REGEX_KEYWORDS = frozenset(('return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                               'throw', 'case', 'do', 'else', 'yield', 'await'))
+JS_LINE_BREAK = re.compile(r'[ \t\r]*\n\s*')
+JS_LITERAL = re.compile(r'\0(\d+)\0')
+
+def _regex_allowed(code, after_operand):
+    """Whether a '/' here starts a regex, judging by the code before it."""
+    k = len(code) - 1
+    while k >= 0 and code[k].isspace():
+        k -= 1
+    if k < 0:
+        return not after_operand
+    if code[k] in ')]':
+        return False
+    if code[k].isalnum() or code[k] in '_$':
+        start = k
+        while start > 0 and (code[start - 1].isalnum() or code[start - 1] in '_$'):
+            start -= 1
+        return ''.join(code[start:k + 1]) in JS_REGEX_KEYWORDS
+    return True
+
+def _js_tokens(text):
+    """Split JS source into (is_literal, text) pieces, with comments dropped.
+
+    Literals are strings, regexes and the text parts of template literals
+    (up to and including each `${`); the code of a `${...}` is scanned like
+    any other code, so templates nest.
+    """
+    pieces = []
+    code = []
+    braces = []          # '{' still open inside each ${...} we are in
+    after_operand = False
+    i, n = 0, len(text)
+
+    def literal(end):
+        nonlocal code, after_operand
+        pieces.append((False, ''.join(code)))
+        pieces.append((True, text[i:end]))
+        code = []
+        after_operand = not text.endswith('${', 0, end)
+
+    while i < n:
+        c = text[i]
+        if c == '`' or (c == '}' and braces and braces[-1] == 0):
+            # Template text, from its opening backtick or the end of a ${...}
+            if c == '}':
+                braces.pop()
+            j = i + 1
+            while j < n and text[j] != '`':
+                if text[j] == '\\':
+                    j += 2
+                    continue
+                if text.startswith('${', j):
+                    j += 2
+                    braces.append(0)
+                    break
+                j += 1
+            else:
+                j += 1  # the closing backtick
+            literal(j)
+        elif c in '\'"':
+            j = i + 1
+            while j < n and text[j] not in (c, '\n'):
+                j += 2 if text[j] == '\\' else 1
+            j += 1
+            literal(j)
+        elif text.startswith('//', i):
+            j = text.find('\n', i)
+            j = n if j < 0 else j
+        elif text.startswith('/*', i):
+            j = text.find('*/', i + 2)
+            j = n if j < 0 else j + 2
+            # A comment spanning lines still ends the line, as far as semicolon insertion goes
+            code.append('\n' if '\n' in text[i:j] else ' ')
+        elif c == '/' and _regex_allowed(code, after_operand):
+            j, in_class = i + 1, False
+            while j < n and text[j] != '\n' and (in_class or text[j] != '/'):
+                if text[j] == '\\':
+                    j += 1
+                elif text[j] in '[]':
+                    in_class = text[j] == '['
+                j += 1
+            j += 1
+            literal(j)
+        else:
+            if braces and c in '{}':
+                braces[-1] += 1 if c == '{' else -1
+            code.append(c)
+            j = i + 1
+        i = j
+    pieces.append((False, ''.join(code)))
+    return pieces
+
+def minify_js(text):
+    """Strip indentation, blank lines and comments.
+
+    Deliberately conservative: line breaks are kept (so automatic semicolon
+    insertion behaves the same), and strings, regexes and template literals
+    (see _js_tokens) are copied unchanged, whatever they contain.
+    """
+    code, literals = [], []
+    for is_literal, piece in _js_tokens(text):
+        if is_literal:
+            code.append(f'\0{len(literals)}\0')
+            literals.append(piece)
+        else:
+            code.append(piece)
+    squeezed = JS_LINE_BREAK.sub('\n', ''.join(code)).strip()
+    return JS_LITERAL.sub(lambda m: literals[int(m.group(1))], squeezed) + '\n'
+
+def _absolute_urls(css, source):
+    """Point relative url(...)s at /static/..., since the bundle lives in another folder."""
+    base = os.path.dirname(source)
+    def rewrite(match):
+        path = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, '/')
+        return f'url(/static/{path})'
+    return CSS_URL.sub(rewrite, css)
+
+# ---------------- Building ----------------
+def _write(path, data):
+    """Write atomically, so a worker never serves a half-written file."""
+    if os.path.exists(path):
+        return
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.build-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _emit(dist, name, data):
+    """Write data as <stem>.<hash>.<ext> (plus compressed siblings); returns the file name."""
+    stem, ext = os.path.splitext(name)
+    filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+    path = os.path.join(dist, filename)
+    _write(path, data)
+    if ext in COMPRESS_EXTENSIONS:
+        _write(path + '.gz', gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=BR_QUALITY))
+    return filename
+
+def bundle(sources, static_folder=STATIC_FOLDER):
+    """Concatenate and minify the given static files into one CSS or JS body."""
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+            text = f.read()
+        if source.endswith('.css'):
+            parts.append(minify_css(_absolute_urls(text, source)))
+        else:
+            parts.append(minify_js(text) + ';')  # keeps a file without a trailing semicolon apart
+    return '\n'.join(parts).encode()
+
+def build(static_folder=STATIC_FOLDER, dist=DIST_FOLDER):
+    """Build every bundle and fingerprinted file; writes and returns the manifest.
+
+    The manifest maps a logical name ('index.css', 'img/logo.png') to its
+    file name inside `dist`.
+    """
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        manifest[name] = _emit(dist, name, bundle(sources, static_folder))
+    for folder in FINGERPRINT_FOLDERS:
+        for entry in sorted(os.scandir(os.path.join(static_folder, folder)), key=lambda e: e.name):
+            if entry.is_file():
+                with open(entry.path, 'rb') as f:
+                    manifest[f'{folder}/{entry.name}'] = _emit(dist, f'{folder}-{entry.name}', f.read())
+
+    if load_manifest(dist) != manifest:
+        fd, tmp = tempfile.mkstemp(dir=dist, prefix='.build-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, os.path.join(dist, MANIFEST))
+    _prune(dist, manifest)
+    return manifest
+
+def _prune(dist, manifest):
+    keep = {MANIFEST}
+    for filename in manifest.values():
+        keep.update((filename, filename + '.gz', filename + '.br'))
+    cutoff = time.time() - STALE_MAX_AGE
+    for entry in os.scandir(dist):
+        try:
+            if entry.name not in keep and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+def load_manifest(dist=DIST_FOLDER):
+    try:
+        with open(os.path.join(dist, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+# ---------------- Serving ----------------
+def resolve(dist, filename, accept_encodings):
+    """(file to send, Content-Encoding or None) for a built file, preferring br, then gzip."""
+    if not os.path.isfile(os.path.join(dist, filename)):
+        return None, None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accept_encodings[encoding] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+if __name__ == '__main__':
+    built = build()
+    print(f'{len(built)} assets in {DIST_FOLDER}', file=sys.stderr)
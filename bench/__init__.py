@@ -0,0 +1,5 @@
+"""Synthetic datasets and load tests for SparkHub.
+
+    python -m bench.seed 1k            # writes bench/data/1k/
+    python -m bench.run --size 1k      # drives the routes, compares to bench/baseline.json
+"""
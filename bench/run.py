@@ -0,0 +1,383 @@
+"""Drive SparkHub's routes against a seeded dataset and report latency, throughput and memory.
+
+Two modes:
+  client  the Flask test client, in this process (no network, no server)
+  server  gunicorn with several worker processes, over HTTP with concurrent clients
+
+Each run starts from a fresh copy of the dataset, so ideas.db is rebuilt
+from ideas.json on startup and the numbers are reproducible for a given
+--seed. Results are compared against a stored baseline; a scenario whose
+p95 latency grew, or whose throughput fell, by more than --tolerance is
+flagged as a regression.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import random
+import shutil
+import socket
+import argparse
+import resource
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench import seed as seeding
+from bench.scenarios import SCENARIOS, REQUEST_SHARE
+
+BASELINE_FILE = os.path.join(REPO_DIR, 'bench', 'baseline.json')
+DATASET_FILES = ('ideas.json', 'reports.json', 'users.db')
+SERVER_START_TIMEOUT = 900  # the 1M import takes a while
+# The scenarios vote, report and chat as one user far faster than a person would;
+# they measure the endpoints, not the per-client limits (the write limit stays on)
+BENCH_CONFIG = {'RATE_LIMITS': {}}
+
+# ---------------- Helpers ----------------
+def prepare_workdir(size, data_dir=seeding.DATA_DIR, seed=42):
+    """Copy the seeded dataset (seeding it first if needed) into a fresh temp dir."""
+    folder = os.path.join(data_dir, size)
+    if not all(os.path.exists(os.path.join(folder, f)) for f in DATASET_FILES):
+        seeding.seed(size, seed, data_dir)
+    workdir = tempfile.mkdtemp(prefix=f'sparkhub-bench-{size}-')
+    for name in DATASET_FILES:
+        shutil.copy(os.path.join(folder, name), workdir)
+    with open(os.path.join(folder, 'dataset.json')) as f:
+        info = json.load(f)
+    return workdir, info
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(latencies, errors, wall):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput': round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+def request_plan(name, info, count, seed):
+    rng = random.Random(f'{seed}-{name}')
+    make = SCENARIOS[name]
+    return [make(rng, info) for _ in range(count)]
+
+def scenario_count(name, requests):
+    return max(1, int(requests * REQUEST_SHARE.get(name, 1)))
+
+def is_error(name, status):
+    # A successful login redirects; a failed one re-renders the form with 200
+    return status >= 400 or (name == 'login' and status != 302)
+
+# ---------------- Test Client Mode ----------------
+def run_client(workdir, info, requests, seed):
+    os.chdir(workdir)
+    started = time.perf_counter()
+    import app as appmod
+    app = appmod.create_app(BENCH_CONFIG)
+    appmod.init_data(app)
+    startup = time.perf_counter() - started
+
+    clients = {'anon': app.test_client(), 'user': app.test_client(), 'admin': app.test_client()}
+    with clients['user'].session_transaction() as s:
+        s.update(user_id=3, account_type='user', email='user3@bench.local')
+    with clients['admin'].session_transaction() as s:
+        s.update(user_id=1, account_type='admin', email=seeding.ADMIN_EMAIL)
+
+    results = {}
+    for name in SCENARIOS:
+        plan = request_plan(name, info, scenario_count(name, requests), seed)
+        for role, method, path, body, form in plan[:max(1, len(plan) // 10)]:  # warm-up
+            clients[role].open(path, method=method, json=body, data=form)
+        latencies, errors = [], 0
+        wall_start = time.perf_counter()
+        for role, method, path, body, form in plan:
+            t0 = time.perf_counter()
+            response = clients[role].open(path, method=method, json=body, data=form)
+            response.get_data()
+            latencies.append(time.perf_counter() - t0)
+            errors += is_error(name, response.status_code)
+        results[name] = summarize(latencies, errors, time.perf_counter() - wall_start)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'startup_s': round(startup, 3), 'peak_rss_mb': round(peak_rss / 2**20, 1), 'scenarios': results}
+
+# ---------------- Server Mode ----------------
+class HttpSession:
+    """Keep-alive HTTP connection that carries the Flask session cookie."""
+
+    def __init__(self, port):
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, body=None, form=None):
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            payload = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+        except http.client.RemoteDisconnected:
+            # The server dropped an idle keep-alive connection; reconnect once
+            self.conn.close()
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+        response.read()
+        return response
+
+    def login(self, email):
+        response = self.request('POST', '/login', form={'email': email, 'password': seeding.PASSWORD})
+        cookie = response.getheader('Set-Cookie')
+        if response.status != 302 or not cookie:
+            raise RuntimeError(f'login as {email} failed ({response.status})')
+        self.cookie = cookie.split(';', 1)[0]
+        return self
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def process_tree(pid):
+    """pid plus all its descendants (Linux /proc)."""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo.extend(children.get(p, []))
+    return tree
+
+def _proc_kb(pid, filename, field):
+    try:
+        with open(f'/proc/{pid}/{filename}') as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+def memory_mb(pid):
+    """(peak RSS, current PSS) in MB summed over the server's processes.
+
+    RSS counts pages shared between the preloaded master and its workers
+    once per process; PSS splits them, so it is the real footprint.
+    """
+    tree = process_tree(pid)
+    rss = sum(_proc_kb(p, 'status', 'VmHWM:') for p in tree)
+    pss = sum(_proc_kb(p, 'smaps_rollup', 'Pss:') for p in tree)
+    return round(rss / 1024, 1), round(pss / 1024, 1)
+
+def start_server(workdir, workers, threads):
+    """Start the production setup (gunicorn.conf.py + wsgi.py) on a free port; returns (proc, port, startup)."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR,
+               **{f'SPARKHUB_{key}': json.dumps(value) for key, value in BENCH_CONFIG.items()})
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO_DIR, 'gunicorn.conf.py'),
+         '--workers', str(workers), '--threads', str(threads), '--keep-alive', '60',
+         '--bind', f'127.0.0.1:{port}', '--chdir', workdir, '--log-level', 'warning', 'wsgi:app'],
+        cwd=workdir, env=env)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            HttpSession(port).request('GET', '/')
+            return proc, port, time.perf_counter() - started
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start in time')
+
+def run_server(workdir, info, requests, seed, workers=4, concurrency=16):
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        print('server mode skipped: gunicorn is not installed', file=sys.stderr)
+        return None
+
+    proc, port, startup = start_server(workdir, workers, threads=max(1, concurrency // workers))
+    try:
+        # Every client thread logs in once as a user and once as the admin
+        sessions = []
+        for i in range(concurrency):
+            sessions.append({
+                'anon': HttpSession(port),
+                'user': HttpSession(port).login(f'user{3 + i % (info["users"] - 2)}@bench.local'),
+                'admin': HttpSession(port).login(seeding.ADMIN_EMAIL),
+            })
+
+        results = {}
+        for name in SCENARIOS:
+            plan = request_plan(name, info, scenario_count(name, requests), seed)
+            for role, method, path, body, form in plan[:max(1, len(plan) // 10)]:
+                sessions[0][role].request(method, path, body, form)
+            todo = queue.Queue()
+            for item in plan:
+                todo.put(item)
+            latencies, errors = [], []
+
+            def client(own):
+                errs = 0
+                while True:
+                    try:
+                        role, method, path, body, form = todo.get_nowait()
+                    except queue.Empty:
+                        break
+                    t0 = time.perf_counter()
+                    try:
+                        status = own[role].request(method, path, body, form).status
+                    except (OSError, http.client.HTTPException):
+                        own[role].conn.close()  # reconnects on the next request
+                        status = 599
+                    latencies.append(time.perf_counter() - t0)
+                    errs += is_error(name, status)
+                errors.append(errs)
+
+            wall_start = time.perf_counter()
+            threads = [threading.Thread(target=client, args=(s,)) for s in sessions]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            results[name] = summarize(latencies, sum(errors), time.perf_counter() - wall_start)
+
+        rss, pss = memory_mb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {'startup_s': round(startup, 3), 'peak_rss_mb': rss, 'pss_mb': pss, 'workers': workers,
+            'concurrency': concurrency, 'scenarios': results}
+
+# ---------------- Baseline ----------------
+def flatten(size, runs):
+    """{'<mode>/<size>/<scenario>': stats} for comparison and storage."""
+    flat = {}
+    for mode, run in runs.items():
+        for name, stats in run['scenarios'].items():
+            flat[f'{mode}/{size}/{name}'] = stats
+        flat[f'{mode}/{size}/_process'] = {k: run[k] for k in ('startup_s', 'peak_rss_mb', 'pss_mb') if k in run}
+    return flat
+
+def compare(flat, baseline, tolerance):
+    """Lines describing regressions beyond `tolerance` (0.25 = 25%) against the baseline."""
+    regressions = []
+    for key, stats in sorted(flat.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric, higher_is_worse in (('p95_ms', True), ('throughput', False),
+                                        ('peak_rss_mb', True), ('pss_mb', True), ('startup_s', True)):
+            if metric not in stats or not base.get(metric):
+                continue
+            change = (stats[metric] - base[metric]) / base[metric]
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append(f'{key} {metric}: {base[metric]} -> {stats[metric]} ({change:+.0%})')
+    return regressions
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+def save_baseline(path, flat):
+    baseline = load_baseline(path)
+    baseline.update(flat)
+    with open(path, 'w') as f:
+        json.dump({'results': dict(sorted(baseline.items()))}, f, indent=2)
+        f.write('\n')
+
+def print_report(size, runs):
+    for mode, run in runs.items():
+        memory = f'peak RSS {run["peak_rss_mb"]} MB' + (f', PSS {run["pss_mb"]} MB' if 'pss_mb' in run else '')
+        print(f'\n{mode} / {size}: startup {run["startup_s"]}s, {memory}')
+        print(f'  {"scenario":<14}{"reqs":>6}{"errors":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"req/s":>10}')
+        for name, s in run['scenarios'].items():
+            print(f'  {name:<14}{s["requests"]:>6}{s["errors"]:>8}{s["p50_ms"]:>10}'
+                  f'{s["p95_ms"]:>10}{s["p99_ms"]:>10}{s["throughput"]:>10}')
+
+# ---------------- CLI ----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=sorted(seeding.SIZES), default='1k')
+    parser.add_argument('--mode', choices=['client', 'server', 'all'], default='all')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--out', help='also write the results as JSON here')
+    args = parser.parse_args(argv)
+
+    runs = {}
+    if args.mode in ('server', 'all'):
+        workdir, info = prepare_workdir(args.size, seed=args.seed)
+        try:
+            result = run_server(workdir, info, args.requests, args.seed, args.workers, args.concurrency)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if result:
+            runs['server'] = result
+    if args.mode in ('client', 'all'):
+        # Last: importing the app into this process cannot be undone
+        workdir, info = prepare_workdir(args.size, seed=args.seed)
+        runs['client'] = run_client(workdir, info, args.requests, args.seed)
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(args.size, runs)
+    flat = flatten(args.size, runs)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(flat, f, indent=2)
+
+    regressions = compare(flat, load_baseline(args.baseline), args.tolerance)
+    if regressions:
+        print(f'\nRegressions vs {os.path.relpath(args.baseline)} (tolerance {args.tolerance:.0%}):')
+        for line in regressions:
+            print('  ' + line)
+    else:
+        print('\nNo regressions against the baseline.')
+    if args.save_baseline:
+        save_baseline(args.baseline, flat)
+        print(f'Baseline updated: {os.path.relpath(args.baseline)}')
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
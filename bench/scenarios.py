@@ -0,0 +1,57 @@
+"""The request mix driven by bench.run, shared by the test-client and HTTP drivers.
+
+Each scenario turns (rng, dataset info) into one request:
+(role, method, path, json_body, form_body). `role` picks the session that
+sends it: 'anon', 'user' (a regular seeded user) or 'admin'.
+"""
+from bench.seed import CATEGORIES, PREFIXES, SUFFIXES, WORDS, PASSWORD, REPORT_REASONS
+
+SORTS = ['newest', 'popular', 'trending', 'relevance']
+
+def _ideas_query(rng, info):
+    params = [f"sort={rng.choice(SORTS)}"]
+    if rng.random() < 0.5:
+        params.append(f"category={rng.choice(CATEGORIES)}")
+    if rng.random() < 0.4:
+        params.append(f"search={rng.choice(PREFIXES + WORDS).lower()}")
+    if rng.random() < 0.5:
+        params.append('limit=20&votes=counts')
+    return 'user', 'GET', '/api/ideas?' + '&'.join(params), None, None
+
+def _vote(rng, info):
+    idea_id = rng.randint(1, info['ideas'])
+    return 'user', 'POST', f'/api/ideas/{idea_id}/vote', {'voteType': rng.choice(['upvote', 'downvote'])}, None
+
+def _report(rng, info):
+    idea_id = rng.randint(1, info['ideas'])
+    return 'user', 'POST', f'/api/ideas/{idea_id}/report', {'description': rng.choice(REPORT_REASONS)}, None
+
+def _reports_page(rng, info):
+    return 'admin', 'GET', '/reports', None, None
+
+def _chatbot(rng, info):
+    title = rng.choice(PREFIXES) + rng.choice(SUFFIXES)
+    message = rng.choice([
+        'how do I vote',
+        'how can I submit an idea?',
+        f'tell me about {title}',
+        f'what is {title[:-1]}',   # misspelled, exercises the fuzzy matcher
+        ' '.join(rng.choice(WORDS) for _ in range(6)),
+    ])
+    return 'user', 'POST', '/chatbot', {'message': message}, None
+
+def _login(rng, info):
+    user_id = rng.randint(3, info['users'])
+    return 'anon', 'POST', '/login', None, {'email': f'user{user_id}@bench.local', 'password': PASSWORD}
+
+SCENARIOS = {
+    'ideas': _ideas_query,
+    'vote': _vote,
+    'report': _report,
+    'reports_page': _reports_page,
+    'chatbot': _chatbot,
+    'login': _login,
+}
+
+# Login is a deliberately slow password hash; run fewer of them
+REQUEST_SHARE = {'login': 0.1}
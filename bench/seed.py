@@ -0,0 +1,144 @@
+"""Write a synthetic dataset in the formats app.py reads on first start.
+
+ideas.json / reports.json match the legacy flat files that storage.py imports,
+users.db matches accounts.SCHEMA. Everything is derived from --seed, so the
+same size and seed always produce the same files.
+"""
+import os
+import sys
+import json
+import random
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import accounts
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SIZES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'admin@bench.local'
+DEVELOPER_EMAIL = 'dev@bench.local'
+
+# Same categories as the seed ideas, weighted towards the common ones
+CATEGORIES = ['Environment', 'Education', 'Health', 'Food', 'Robotics', 'Finance', 'Travel', 'Tech']
+CATEGORY_WEIGHTS = [8, 6, 4, 4, 4, 3, 3, 3]
+
+PREFIXES = ['Medi', 'Edu', 'Eco', 'Robo', 'Fin', 'Agri', 'Aqua', 'Solar', 'Smart', 'Green',
+            'Health', 'Food', 'Travel', 'Code', 'Learn', 'Spark', 'Urban', 'Bio', 'Cyber', 'Nano']
+SUFFIXES = ['Link', 'Boost', 'Spark', 'Hub', 'Mate', 'Flow', 'Track', 'Bot', 'Grid', 'Nest',
+            'Wave', 'Pulse', 'Path', 'Lab', 'Kit', 'Sense', 'Loop', 'Share', 'Cart', 'Guard']
+WORDS = ('platform app network tool service system marketplace assistant tracker community '
+         'students doctors farmers patients travellers investors rural urban cities schools '
+         'real-time affordable sustainable gamified automated personalised secure local global '
+         'ai blockchain sensors drones recycling energy water food learning health finance '
+         'connecting helping reducing improving matching monitoring sharing rewarding').split()
+REPORT_REASONS = ['spam', 'duplicate idea', 'offensive', 'misleading', 'off topic', 'copied', 'bad', 'mad']
+
+def users_for(n_ideas):
+    return max(50, n_ideas // 10)
+
+def _timestamp(rng, now, days=365):
+    return (now - timedelta(seconds=rng.random() * days * 86400)).isoformat()
+
+def _voters(rng, n_users, count):
+    count = min(count, n_users)
+    return sorted(rng.sample(range(1, n_users + 1), count)) if count else []
+
+def generate_ideas(n_ideas, rng, now):
+    """Yield ideas with a long-tailed vote distribution (most get a few, some get hundreds)."""
+    n_users = users_for(n_ideas)
+    for idea_id in range(1, n_ideas + 1):
+        votes = min(int(rng.paretovariate(1.2)) - 1, n_users)
+        up = int(votes * rng.betavariate(4, 2))
+        voters = _voters(rng, n_users, votes)
+        rng.shuffle(voters)
+        yield {
+            'id': idea_id,
+            'title': f'{rng.choice(PREFIXES)}{rng.choice(SUFFIXES)}',
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 24))).capitalize() + '.',
+            'category': rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0],
+            'image_url': '',
+            'upvotes': sorted(voters[:up]),
+            'downvotes': sorted(voters[up:]),
+            'user_id': rng.randint(1, n_users),
+            'created_at': _timestamp(rng, now),
+        }
+
+def generate_reports(n_ideas, rng, now, titles):
+    """About 2% of ideas are reported; a few of them many times."""
+    n_users = users_for(n_ideas)
+    report_id = 0
+    for idea_id in sorted(rng.sample(range(1, n_ideas + 1), max(1, n_ideas // 50))):
+        for _ in range(min(int(rng.paretovariate(1.5)), 50)):
+            report_id += 1
+            yield {
+                'id': report_id,
+                'idea_id': idea_id,
+                'idea_title': titles[idea_id],
+                'user_id': rng.randint(1, n_users),
+                'description': rng.choice(REPORT_REASONS),
+                'createdAt': _timestamp(rng, now, days=30),
+            }
+
+def write_json_list(path, items):
+    """Stream a list to disk one item at a time (the 1M set does not fit comfortably in memory twice)."""
+    with open(path, 'w') as f:
+        f.write('[\n')
+        for i, item in enumerate(items):
+            if i:
+                f.write(',\n')
+            json.dump(item, f)
+        f.write('\n]\n')
+
+def write_users(path, n_users, now):
+    if os.path.exists(path):
+        os.remove(path)
+    # One hash for everyone: hashing 100k passwords would dominate seeding
+    password = generate_password_hash(PASSWORD)
+    created = now.isoformat()
+    with sqlite3.connect(path) as conn:
+        conn.executescript(accounts.SCHEMA)
+        conn.executemany(
+            'INSERT INTO users (id, name, email, password, account_type, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+            ((i, f'User {i}', f'user{i}@bench.local', password, 'user', created) for i in range(1, n_users + 1)))
+        conn.execute("UPDATE users SET email=?, account_type='admin' WHERE id=1", (ADMIN_EMAIL,))
+        conn.execute("UPDATE users SET email=?, account_type='developer' WHERE id=2", (DEVELOPER_EMAIL,))
+        # developer_requests.db has already been merged into users.db
+        conn.execute("INSERT INTO meta (key, value) VALUES ('requests_merged', '1')")
+
+def seed(size, seed=42, data_dir=DATA_DIR):
+    """Write ideas.json, reports.json and users.db for `size` into data_dir/<size>/; returns the folder."""
+    n_ideas = SIZES[size]
+    folder = os.path.join(data_dir, size)
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    now = datetime(2025, 9, 1)
+
+    titles = {}
+    def remember(ideas):
+        for idea in ideas:
+            titles[idea['id']] = idea['title']
+            yield idea
+    write_json_list(os.path.join(folder, 'ideas.json'), remember(generate_ideas(n_ideas, rng, now)))
+    write_json_list(os.path.join(folder, 'reports.json'), generate_reports(n_ideas, rng, now, titles))
+    write_users(os.path.join(folder, 'users.db'), users_for(n_ideas), now)
+    with open(os.path.join(folder, 'dataset.json'), 'w') as f:
+        json.dump({'size': size, 'ideas': n_ideas, 'users': users_for(n_ideas), 'seed': seed}, f)
+    return folder
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='+', choices=sorted(SIZES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    args = parser.parse_args(argv)
+    for size in args.sizes:
+        print(f'{size}: {seed(size, args.seed, args.data_dir)}')
+
+if __name__ == '__main__':
+    main()
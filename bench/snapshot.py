@@ -0,0 +1,123 @@
+"""Compare loading ideas from ideas.json (storage.load_json) with mapping a snapshot.
+
+    python -m bench.snapshot --size 100k
+
+Each load runs in a fresh interpreter, so timings and memory are not shared.
+Reported per format: file size, time to load and build the by-id lookup,
+resident memory and private (not shareable between workers) memory after
+loading and after touching every idea once, and the cost of "has this user
+upvoted this idea" checks.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from bench import seed as seeding
+
+CHECKS = 200_000
+
+def _memory_mb():
+    """(RSS, private dirty) of this process in MB."""
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Private_Dirty:'):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values.get('Rss:', 0.0), values.get('Private_Dirty:', 0.0)
+
+# ---------------- Child ----------------
+def measure(kind, path):
+    """Load `path` as `kind` ('json' or 'snapshot') in this process and return the numbers."""
+    import storage
+    import snapshot
+
+    rss0, private0 = _memory_mb()
+    started = time.perf_counter()
+    if kind == 'json':
+        ideas = storage.load_json(path)
+        by_id = {idea['id']: idea for idea in ideas}
+    else:
+        by_id = snapshot.Snapshot(path)
+        ideas = by_id.ideas()
+    load_s = time.perf_counter() - started
+    rss1, private1 = _memory_mb()
+
+    started = time.perf_counter()
+    points = sum(len(idea['upvotes']) - len(idea['downvotes']) for idea in ideas)
+    walk_s = time.perf_counter() - started
+    rss2, private2 = _memory_mb()
+
+    rng = random.Random(1)
+    ids = list(by_id)
+    probes = [(by_id[rng.choice(ids)], rng.randint(1, seeding.users_for(len(ids)))) for _ in range(CHECKS)]
+    voters = [idea['upvotes'] for idea, _ in probes]
+    started = time.perf_counter()
+    hits = sum(user_id in up for up, (_, user_id) in zip(voters, probes))
+    check_s = time.perf_counter() - started
+
+    return {
+        'load_s': round(load_s, 3),
+        'rss_mb': round(rss1 - rss0, 1),
+        'private_mb': round(private1 - private0, 1),
+        'walk_s': round(walk_s, 3),
+        'rss_after_walk_mb': round(rss2 - rss0, 1),
+        'private_after_walk_mb': round(private2 - private0, 1),
+        'check_us': round(check_s / CHECKS * 1e6, 3),
+        'checksum': [points, hits],
+    }
+
+# ---------------- Parent ----------------
+def write_snapshot(ideas_file, path):
+    import storage
+    import snapshot
+    snapshot.write(path, sorted(storage.load_json(ideas_file), key=lambda i: i['id']), orders=storage.SORT_KEYS)
+
+def run(kind, path):
+    out = subprocess.run([sys.executable, '-m', 'bench.snapshot', '--child', kind, path],
+                         cwd=REPO_DIR, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=sorted(seeding.SIZES), default='100k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', nargs=2, metavar=('KIND', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return 0
+
+    folder = os.path.join(seeding.DATA_DIR, args.size)
+    ideas_file = os.path.join(folder, 'ideas.json')
+    if not os.path.exists(ideas_file):
+        seeding.seed(args.size, args.seed)
+    with tempfile.TemporaryDirectory(prefix='sparkhub-snapshot-') as tmp:
+        snap_file = os.path.join(tmp, 'ideas.snap')
+        started = time.perf_counter()
+        write_snapshot(ideas_file, snap_file)
+        write_s = time.perf_counter() - started
+        os.sync()  # freshly written pages count as private until written back
+        results = {'json': run('json', ideas_file), 'snapshot': run('snapshot', snap_file)}
+        results['json']['file_mb'] = round(os.path.getsize(ideas_file) / 2 ** 20, 1)
+        results['snapshot']['file_mb'] = round(os.path.getsize(snap_file) / 2 ** 20, 1)
+    if results['json'].pop('checksum') != results['snapshot'].pop('checksum'):
+        print('warning: the two formats disagree on vote totals', file=sys.stderr)
+
+    print(f'{args.size} ideas (snapshot written in {write_s:.2f}s)')
+    print(f'  {"":<24}{"ideas.json":>12}{"snapshot":>12}')
+    for key in results['json']:
+        print(f'  {key:<24}{results["json"][key]:>12}{results["snapshot"][key]:>12}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,17 +1,16 @@
+import re
 import json
-import os
+import threading
+from array import array
+from collections import Counter, deque
 
-IDEAS_FILE = 'ideas.json'
+import storage
+import metrics
 
 # ---------------- Load ideas ----------------
 def load_ideas():
-    if not os.path.exists(IDEAS_FILE):
-        return []
-    with open(IDEAS_FILE, 'r') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
+    # Shared, read-only list from the storage cache; only reloaded after writes
+    return storage.cached_ideas()
 
 # ---------------- Predefined chatbot rules ----------------
 RULES = [
@@ -49,23 +48,329 @@ RULES = [
      "response": "Goodbye! Feel free to come back anytime for help or to submit ideas."},
 ]
 
+# ---------------- Multi-pattern matcher ----------------
+class AhoCorasick:
+    """Aho-Corasick automaton: finds every registered pattern in one pass over the text.
+
+    Patterns can be added and removed at any time without a rebuild. add()
+    links each new trie node as it is created and repoints the existing
+    nodes whose longest known suffix it now is; remove() only detaches the
+    value from its node. Matches are collected by walking the (short)
+    failure chain of each visited node, so no per-node match lists need
+    updating. Patterns given to the constructor are linked in one pass.
+    """
+
+    def __init__(self, patterns=()):
+        self._goto = [{}]           # node -> {char: child node}
+        self._out = [None]          # node -> set of values of patterns ending here, or None
+        self._fail = array('l', [0])
+        self._parent = array('l', [0])
+        self._depth = array('l', [0])
+        self._char = ['']
+        # node -> nodes whose failure link points at it; the root's are split by char
+        self._fail_from = [{}]
+        for pattern, value in patterns:
+            self._insert(pattern, value, link=False)
+        self._link_all()
+
+    def add(self, pattern, value):
+        self._insert(pattern, value, link=True)
+
+    def remove(self, pattern, value):
+        node = 0
+        for ch in pattern:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return
+        out = self._out[node]
+        if out:
+            out.discard(value)
+            if not out:
+                self._out[node] = None
+
+    def _insert(self, pattern, value, link):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._out.append(None)
+                self._fail.append(0)
+                self._parent.append(node)
+                self._depth.append(self._depth[node] + 1)
+                self._char.append(ch)
+                self._fail_from.append(None)
+                if link:
+                    self._link(nxt)
+            node = nxt
+        if self._out[node] is None:
+            self._out[node] = set()
+        self._out[node].add(value)
+
+    def _fail_target(self, node):
+        """Longest proper suffix of node's string that is in the trie (links of shallower nodes must be right)."""
+        parent, ch = self._parent[node], self._char[node]
+        if not parent:
+            return 0
+        f = self._fail[parent]
+        while f and ch not in self._goto[f]:
+            f = self._fail[f]
+        return self._goto[f].get(ch, 0)
+
+    def _attach(self, node, target):
+        self._fail[node] = target
+        if not target:
+            self._fail_from[0].setdefault(self._char[node], []).append(node)
+        elif self._fail_from[target] is None:
+            self._fail_from[target] = [node]
+        else:
+            self._fail_from[target].append(node)
+
+    def _link(self, node):
+        # Existing nodes that end with this node's string failed to a shorter
+        # suffix while it did not exist. They are the `ch` children of the
+        # nodes ending with the parent's string, i.e. of the parent's subtree
+        # in the failure tree. Entries of _fail_from go stale when a node is
+        # repointed; they are skipped here rather than searched for and removed.
+        goto, fail, fail_from = self._goto, self._fail, self._fail_from
+        parent, ch = self._parent[node], self._char[node]
+        target = self._fail_target(node)
+        if not parent:
+            moved = [other for other in fail_from[0].get(ch, ()) if not fail[other]]
+        else:
+            moved = []
+            stack = [parent]
+            while stack:
+                x = stack.pop()
+                other = goto[x].get(ch)
+                if other is not None and other != node and fail[other] == target:
+                    moved.append(other)
+                if fail_from[x]:
+                    stack.extend(child for child in fail_from[x] if fail[child] == x)
+        for other in moved:
+            self._attach(other, node)
+        self._attach(node, target)
+
+    def _link_all(self):
+        # Breadth-first so every node's fail target is finished before its children's
+        goto, fail, fail_from = self._goto, self._fail, self._fail_from
+        root_from = fail_from[0]
+        queue = deque()
+        for ch, child in goto[0].items():
+            root_from.setdefault(ch, []).append(child)
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = fail[child] = goto[f].get(ch, 0)
+                if not target:
+                    root_from.setdefault(ch, []).append(child)
+                elif fail_from[target] is None:
+                    fail_from[target] = [child]
+                else:
+                    fail_from[target].append(child)
+                queue.append(child)
+
+    def find_all(self, text):
+        """Return the set of values whose pattern occurs anywhere in text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node
+            while hit:
+                if out[hit]:
+                    found.update(out[hit])
+                hit = fail[hit]
+        return found
+
+# ---------------- Fuzzy title index ----------------
+def trigrams(text):
+    """Character trigrams of the words in text, padded like pg_trgm ('  ab', 'abc', 'bc ')."""
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+class TrigramIndex:
+    """Inverted index from character trigrams to idea ids, for typo-tolerant title lookup.
+
+    Similarity is the Dice coefficient of the two trigram sets. Only ideas
+    sharing at least one trigram with the query are ever scored, so a lookup
+    never compares against every title.
+    """
+
+    def __init__(self):
+        self._postings = {}  # trigram -> set of idea ids
+        self._grams = {}     # idea id -> trigram set of its title
+        self._words = {}     # idea id -> words in its title
+        self._word_counts = Counter()  # words in a title -> titles that long
+        self.max_words = 1   # longest title, in words
+
+    def add(self, idea_id, title):
+        if idea_id in self._grams:
+            self.remove(idea_id)
+        grams = trigrams(title)
+        if not grams:
+            return
+        self._grams[idea_id] = grams
+        postings = self._postings
+        for gram in grams:
+            ids = postings.get(gram)
+            if ids is None:
+                postings[gram] = {idea_id}
+            else:
+                ids.add(idea_id)
+        words = self._words[idea_id] = len(title.split())
+        self._word_counts[words] += 1
+        self.max_words = max(self.max_words, words)
+
+    def remove(self, idea_id):
+        for gram in self._grams.pop(idea_id, ()):
+            ids = self._postings[gram]
+            ids.discard(idea_id)
+            if not ids:
+                del self._postings[gram]
+        words = self._words.pop(idea_id, None)
+        if words is not None:
+            self._word_counts[words] -= 1
+            if not self._word_counts[words]:
+                del self._word_counts[words]
+                if words == self.max_words:
+                    # The longest title went away: shorter message spans are enough now
+                    self.max_words = max(self._word_counts, default=1)
+
+    def search(self, text, k=3, threshold=0.5):
+        """Return up to k (similarity, idea id) pairs at or above threshold, best first."""
+        query = trigrams(text)
+        if not query:
+            return []
+        shared = Counter()
+        for gram in query:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for idea_id, common in shared.items():
+            score = 2 * common / (len(query) + len(self._grams[idea_id]))
+            if score >= threshold:
+                scored.append((score, idea_id))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]))
+        return scored[:k]
+
+    def search_message(self, msg, k=3, threshold=0.5, min_length=4):
+        """Fuzzy-match every run of up to max_words words in msg against the titles."""
+        words = re.findall(r'\w+', msg.lower())
+        best = {}
+        for size in range(1, self.max_words + 1):
+            for start in range(len(words) - size + 1):
+                span = ' '.join(words[start:start + size])
+                if len(span) < min_length:
+                    continue
+                for score, idea_id in self.search(span, k, threshold):
+                    best[idea_id] = max(score, best.get(idea_id, 0))
+        ranked = sorted(best.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(score, idea_id) for idea_id, score in ranked[:k]]
+
+# Rule keywords and idea titles share one automaton. Values are
+# ('rule', index in RULES) or ('idea', idea id).
+RULE_PATTERNS = [(keyword, ('rule', index)) for index, rule in enumerate(RULES) for keyword in rule["keywords"]]
+EVENT_BATCH = 1000
+
+# The titles follow the change events the write paths append (storage._emit):
+# a new, renamed or deleted idea is one add/remove and votes cost nothing.
+# Every title is loaded at once only on the first message (wsgi.py does it
+# before forking), after a bulk import, or when the event log has a gap.
+_matcher = AhoCorasick(RULE_PATTERNS)
+_matcher_lock = threading.Lock()
+_fuzzy_titles = TrigramIndex()
+_titles = {}         # idea id -> lowercase title currently in the matcher
+_last_event = None   # id of the last change event applied
+_synced_db = None    # storage.IDEAS_DB the titles came from
+
+def _set_title(idea_id, title):
+    old = _titles.get(idea_id)
+    if old == title:
+        return
+    if old is not None:
+        _matcher.remove(old, ('idea', idea_id))
+        _fuzzy_titles.remove(idea_id)
+        del _titles[idea_id]
+    if title:
+        _matcher.add(title, ('idea', idea_id))
+        _fuzzy_titles.add(idea_id, title)
+        _titles[idea_id] = title
+
+def _load_titles():
+    """Rebuild the matcher and fuzzy index from every cached idea."""
+    global _matcher, _fuzzy_titles, _titles, _last_event, _synced_db
+    _synced_db = storage.IDEAS_DB
+    _last_event = storage.event_bounds()[1]  # before reading, so no later change is missed
+    titles = ((idea['id'], (idea.get('title') or '').lower()) for idea in storage.cached_ideas())
+    _titles = {idea_id: title for idea_id, title in titles if title}
+    _matcher = AhoCorasick(RULE_PATTERNS + [(title, ('idea', idea_id)) for idea_id, title in _titles.items()])
+    _fuzzy_titles = TrigramIndex()
+    for idea_id, title in _titles.items():
+        _fuzzy_titles.add(idea_id, title)
+
+def _sync_titles():
+    """Apply the change events since the last sync; caller holds _matcher_lock."""
+    global _last_event
+    if _last_event is None or _synced_db != storage.IDEAS_DB:
+        _load_titles()
+        return
+    while True:
+        rows = storage.events_after(_last_event, EVENT_BATCH)
+        if not rows:
+            return
+        if rows[0][0] > _last_event + 1:
+            oldest = storage.event_bounds()[0]
+            if oldest is None or _last_event < oldest - 1:
+                _load_titles()  # pruned before we saw them
+                return
+        for event_id, event_type, data in rows:
+            if event_type in ('idea.created', 'idea.updated'):
+                idea = json.loads(data)
+                if 'title' in idea:
+                    _set_title(idea['id'], (idea['title'] or '').lower())
+            elif event_type == 'idea.deleted':
+                _set_title(json.loads(data)['id'], '')
+            elif event_type in ('ideas.imported', 'reset'):
+                _load_titles()
+                return
+            _last_event = event_id
+
+def prime():
+    """Load the titles up front (e.g. in the gunicorn master), not on the first message."""
+    with _matcher_lock:
+        _sync_titles()
+
 # ---------------- Chatbot main function ----------------
 def get_chatbot_reply(message: str) -> str:
     msg = message.lower().strip()
 
-    # 1️⃣ Check predefined rules first
-    for rule in RULES:
-        if any(keyword in msg for keyword in rule["keywords"]):
-            return rule["response"]
+    with _matcher_lock, metrics.span('chatbot_match'):
+        _sync_titles()
+        found = _matcher.find_all(msg)
+        if not found:
+            # No exact keyword or title: fall back to the closest title, to forgive typos
+            found = {('idea', idea_id) for _, idea_id in _fuzzy_titles.search_message(msg, k=1)}
+
+    # 1️⃣ Check predefined rules first (earliest matching rule wins)
+    rule_hits = [index for kind, index in found if kind == 'rule']
+    if rule_hits:
+        return RULES[min(rule_hits)]["response"]
 
-    # 2️⃣ Check for idea name in the message
-    ideas = load_ideas()
-    mentioned_idea = None
-    for idea in ideas:
-        title = idea.get("title", "").lower()
-        if title in msg:
-            mentioned_idea = idea
-            break
+    # 2️⃣ Check for idea name in the message (lowest id wins, as in list order)
+    idea_hits = sorted(idea_id for kind, idea_id in found if kind == 'idea')
+    mentioned_idea = next(iter(storage.cached_ideas_by_ids(idea_hits[:1])), None) if idea_hits else None
 
     if mentioned_idea:
         # Determine what the user is asking
@@ -74,17 +379,17 @@ def get_chatbot_reply(message: str) -> str:
         elif "category" in msg or "type" in msg:
             return f"💡 {mentioned_idea['title']} - Category: {mentioned_idea['category']}"
         elif "upvote" in msg or "like" in msg:
-            return f"💡 {mentioned_idea['title']} - Upvotes: {len(mentioned_idea.get('upvotes', []))}"
+            return f"💡 {mentioned_idea['title']} - Upvotes: {mentioned_idea['upvote_count']}"
         elif "downvote" in msg or "dislike" in msg:
-            return f"💡 {mentioned_idea['title']} - Downvotes: {len(mentioned_idea.get('downvotes', []))}"
+            return f"💡 {mentioned_idea['title']} - Downvotes: {mentioned_idea['downvote_count']}"
         elif "report" in msg or "problem" in msg:
             return f"💡 {mentioned_idea['title']} - Reports: {len(mentioned_idea.get('reports', []))}"
         else:
             # General info
             return (f"💡 {mentioned_idea['title']} - Category: {mentioned_idea['category']}\n"
                     f"Description: {mentioned_idea['description']}\n"
-                    f"Upvotes: {len(mentioned_idea.get('upvotes', []))}, "
-                    f"Downvotes: {len(mentioned_idea.get('downvotes', []))}, "
+                    f"Upvotes: {mentioned_idea['upvote_count']}, "
+                    f"Downvotes: {mentioned_idea['downvote_count']}, "
                     f"Reports: {len(mentioned_idea.get('reports', []))}")
 
     # 3️⃣ Fallback response
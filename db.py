@@ -0,0 +1,99 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Applied once to every new connection. WAL itself is a property of the
+# database file and is switched on by the init_* functions.
+PRAGMAS = (
+    ('synchronous', 'NORMAL'),    # with WAL: durable at checkpoints, safe against corruption
+    ('cache_size', -16000),       # KiB (negative) of page cache per connection
+    ('mmap_size', 64 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+BUSY_TIMEOUT = 10           # seconds to wait for another writer's lock
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+MAX_IDLE = 16               # idle connections kept per pool
+
+def connect(path):
+    """Open a tuned connection to `path` (rows as sqlite3.Row)."""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+# ---------------- Connection Pool ----------------
+class ConnectionPool:
+    """Reusable connections to one database file.
+
+    A thread takes a connection for the length of one `with` block and hands
+    it back afterwards, so requests skip connect() and PRAGMA setup and keep
+    their prepared statements. Connections are only ever used by one thread
+    at a time. Idle connections left over from a parent process are dropped
+    after a fork.
+    """
+
+    def __init__(self, path, max_idle=MAX_IDLE):
+        self.path = path
+        self.max_idle = max_idle
+        self.stats = {'opened': 0, 'reused': 0}
+        self._idle = queue.LifoQueue()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = queue.LifoQueue()
+                self._pid = os.getpid()
+        try:
+            conn = self._idle.get_nowait()
+            self.stats['reused'] += 1
+        except queue.Empty:
+            conn = connect(self.path)
+            self.stats['opened'] += 1
+        return conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._pid == os.getpid() and self._idle.qsize() < self.max_idle:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        except BaseException:
+            try:
+                self._release(conn)  # rolls back whatever the failed block left open
+            except sqlite3.Error:
+                conn.close()
+            raise
+        self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Yield a connection whose statements commit (or roll back) together.
+
+        `immediate` takes the write lock up front, for read-then-write
+        sequences that must not interleave with another writer.
+        """
+        with self.connection() as conn:
+            if immediate:
+                conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                yield conn
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
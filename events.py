@@ -0,0 +1,121 @@
+import json
+import threading
+from collections import deque
+
+import storage
+
+# Recent events kept in memory per process; older resumes are read from the DB
+BUFFER_SIZE = 1024
+# Other worker processes' events are picked up by polling the events table
+POLL_INTERVAL = 0.5
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+
+def format_event(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+
+# ---------------- Event Hub ----------------
+class EventHub:
+    """Fans change events out to every open /api/events stream in this process.
+
+    Events are written to the `events` table by the storage write that caused
+    them, so their ids are global across worker processes and a client can
+    resume anywhere with Last-Event-ID. One pump thread per process moves new
+    rows into a shared ring buffer and wakes all subscribers at once; a
+    subscriber is just a generator holding the last id it sent, with no queue
+    or thread of its own. In the gevent pool (gunicorn.events.conf.py) the
+    pump is a greenlet too, and thousands of idle streams cost one greenlet each.
+    """
+
+    def __init__(self, buffer_size=BUFFER_SIZE, poll_interval=POLL_INTERVAL,
+                 heartbeat_seconds=HEARTBEAT_SECONDS):
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self.heartbeat_seconds = heartbeat_seconds
+        self.subscribers = 0
+        self._cond = threading.Condition()
+        self._buffer = deque(maxlen=buffer_size)  # (id, type, data_json), oldest first
+        self._last_id = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the pump thread once per process (also after a fork)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            with self._cond:
+                if self._last_id is None:
+                    self._last_id = storage.event_bounds()[1]
+            self._thread = threading.Thread(target=self._run, name='event-pump', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Pump right away instead of at the next poll (called after local commits)."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            self.pump()
+
+    def pump(self):
+        rows = storage.events_after(self._last_id, self.buffer_size)
+        if rows:
+            with self._cond:
+                self._buffer.extend(rows)
+                self._last_id = rows[-1][0]
+                self._cond.notify_all()
+
+    def _since(self, last_id):
+        # Caller holds self._cond. None means last_id is older than the buffer.
+        if last_id >= self._last_id:
+            return []
+        if not self._buffer or self._buffer[0][0] > last_id + 1:
+            return None
+        events = []
+        for event in reversed(self._buffer):
+            if event[0] <= last_id:
+                break
+            events.append(event)
+        events.reverse()
+        return events
+
+    def stream(self, last_id=None):
+        """Yield SSE text for every event after last_id (or from now on if None)."""
+        self.start()
+        yield f'retry: {RETRY_MS}\n\n'
+        with self._cond:
+            if last_id is None or last_id > self._last_id:
+                last_id = self._last_id
+            self.subscribers += 1
+        try:
+            while True:
+                with self._cond:
+                    events = self._since(last_id)
+                    if events == []:
+                        self._cond.wait(self.heartbeat_seconds)
+                        events = self._since(last_id)
+                if events is None:
+                    events = self._replay(last_id)
+                if not events:
+                    yield ': ping\n\n'
+                    continue
+                for event_id, event_type, data in events:
+                    yield format_event(event_id, event_type, data)
+                    last_id = event_id
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def _replay(self, last_id):
+        """Events the buffer no longer holds, from the table; a `reset` if pruned there too."""
+        oldest, newest = storage.event_bounds()
+        if oldest is None or last_id < oldest - 1:
+            return [(newest, 'reset', json.dumps({}))]
+        return storage.events_after(last_id, self.buffer_size)
+
+hub = EventHub()
+storage.add_commit_listener(hub.wake)
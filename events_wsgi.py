@@ -0,0 +1,11 @@
+"""Entry point of the live update pool: gunicorn -c gunicorn.events.conf.py events_wsgi:app
+
+Serves the same app as wsgi.py, but is meant to receive only /api/events
+(route it here from the proxy, see README). Nothing is preloaded: gevent's
+worker patches the standard library first, then imports this module, so
+the event hub's locks and pump thread are cooperative and an idle stream
+costs a greenlet instead of a request thread.
+"""
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,24 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Any setting can be overridden on the command line, e.g. --workers 8
+import os
+import multiprocessing
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('THREADS', 4))
+
+# An open /api/events stream holds one of these threads until the page closes.
+# Streams belong on the gevent pool (gunicorn.events.conf.py); any that reach
+# this one may take at most half of a worker's threads, the rest get a 503
+raw_env = [f"SPARKHUB_EVENT_STREAM_LIMIT={os.environ.get('SPARKHUB_EVENT_STREAM_LIMIT', threads // 2)}"]
+
+# Import the app once in the master (see wsgi.py) and fork workers from it
+preload_app = True
+
+# Keep idle browser connections (and SSE reconnects) cheap
+keepalive = 30
+
+# Recycle workers now and then so slow leaks cannot accumulate
+max_requests = 20000
+max_requests_jitter = 2000
@@ -0,0 +1,17 @@
+# gunicorn -c gunicorn.events.conf.py events_wsgi:app
+# Serves /api/events next to the main pool (gunicorn.conf.py); see README, Live updates
+import os
+
+bind = os.environ.get('EVENTS_BIND', '127.0.0.1:8001')
+workers = int(os.environ.get('EVENTS_WORKERS', 2))
+
+# Every open stream is an idle greenlet waiting for the next event,
+# so one worker holds thousands of them (requires gevent)
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('EVENTS_CONNECTIONS', 2000))
+
+# Not preloaded: the app must be imported after gevent has patched threading
+preload_app = False
+
+# Browsers reconnect on the same connection after a dropped stream
+keepalive = 30
@@ -0,0 +1,187 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+from urllib.parse import urlsplit
+
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Card thumbnails are generated at this size (fits the 16:9 grid cards)
+THUMB_SIZE = (480, 270)
+THUMB_QUALITY = 80
+WEBP_QUALITY = 80
+
+# <sha256 prefix>[.thumb].<ext> – names that can never change content
+HASHED_NAME = re.compile(r'^(?P<digest>[0-9a-f]{32})(?P<thumb>\.thumb)?\.(?P<ext>png|jpe?g|gif|webp)$')
+
+# The URL of an uploaded original; the only kind of image_url whose files we manage
+UPLOAD_URL = re.compile(r'^/images/(?P<name>[0-9a-f]{32}\.(?:png|jpe?g|gif|webp))$')
+DIGEST = re.compile(r'[0-9a-f]{32}')
+
+class UnsupportedImage(ValueError):
+    pass
+
+def _pillow():
+    """(Image, ImageOps), or None without Pillow; imported on first upload to keep startup light."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:  # Pillow is optional: without it only the original upload is stored
+        return None
+    return Image, ImageOps
+
+# ---------------- Uploads ----------------
+def save_upload(file_storage, folder):
+    """Stream an uploaded image to `folder` under its content hash; return the file name.
+
+    The upload is copied in chunks while hashing, so memory use does not grow
+    with file size. Identical uploads map to the same name and are stored once.
+    Thumbnail / WebP variants are generated for newly stored files.
+    """
+    ext = os.path.splitext(file_storage.filename or '')[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise UnsupportedImage(f"Unsupported image type '{ext or '?'}'")
+    if ext == '.jpeg':
+        ext = '.jpg'
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        name = digest.hexdigest()[:32] + ext
+        path = os.path.join(folder, name)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+            make_variants(path)
+        return name
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def make_variants(path):
+    """Write <name>.thumb.<ext>, <name>.webp and <name>.thumb.webp next to an original.
+
+    Does nothing when Pillow is not installed or the file cannot be decoded;
+    the /images route then falls back to the original.
+    """
+    pillow = _pillow()
+    if pillow is None:
+        return []
+    Image, ImageOps = pillow
+    stem, ext = os.path.splitext(path)
+    written = []
+    try:
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+            thumb = img.copy()
+            thumb.thumbnail(THUMB_SIZE)
+
+            outputs = [(f'{stem}.webp', img, 'WEBP'), (f'{stem}.thumb.webp', thumb, 'WEBP')]
+            if ext != '.webp':
+                outputs.append((f'{stem}.thumb{ext}', thumb, None))
+            for out_path, image, fmt in outputs:
+                if fmt is None and ext in ('.jpg', '.jpeg') and image.mode == 'RGBA':
+                    image = image.convert('RGB')
+                quality = WEBP_QUALITY if fmt == 'WEBP' else THUMB_QUALITY
+                image.save(out_path, format=fmt, quality=quality)
+                written.append(out_path)
+    except (OSError, ValueError):
+        return written
+    return written
+
+# ---------------- URLs ----------------
+def upload_name(image_url):
+    """The file name of an uploaded original's URL, or None for any other URL."""
+    match = UPLOAD_URL.match(image_url or '')
+    return match['name'] if match else None
+
+def normalize_url(value):
+    """Check a client-supplied image_url: '' (no image), an uploaded original or an http(s) URL.
+
+    Uploads may be given as the bare hashed name or its /images/ URL and come
+    back as the URL. Anything else, e.g. a path that only resolves to an
+    upload, raises UnsupportedImage, so every stored /images/ URL is exact.
+    """
+    value = (value or '').strip()
+    if not value:
+        return ''
+    if upload_name(value) or upload_name(f'/images/{value}'):
+        return value if value.startswith('/images/') else f'/images/{value}'
+    parts = urlsplit(value)
+    if parts.scheme in ('http', 'https') and parts.netloc:
+        return value
+    raise UnsupportedImage("Image URL must be an uploaded image or an http(s) URL")
+
+# ---------------- Cleanup ----------------
+def variant_names(name):
+    """An original's file name plus every variant make_variants() may have written for it."""
+    match = HASHED_NAME.match(name)
+    if not match or match['thumb']:
+        return [name]
+    digest, ext = match['digest'], match['ext']
+    return list(dict.fromkeys([name, f'{digest}.thumb.{ext}', f'{digest}.webp', f'{digest}.thumb.webp']))
+
+def remove_image(folder, name):
+    """Delete an upload and its variants; returns how many files were removed."""
+    removed = 0
+    for variant in variant_names(name):
+        try:
+            os.remove(os.path.join(folder, variant))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def orphaned_files(folder, urls_in_use, min_age):
+    """Yield uploads (and leftover temp files) older than `min_age` seconds that no URL in use covers.
+
+    Only content-hashed names are considered, so files put there by hand stay.
+    A URL covers every digest it mentions, however it spells the path.
+    """
+    digests = {digest for url in urls_in_use for digest in DIGEST.findall(url)}
+    cutoff = time.time() - min_age
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            match = HASHED_NAME.match(entry.name)
+            if not (entry.name.startswith('.upload-') or (match and match['digest'] not in digests)):
+                continue
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    yield entry.name
+            except FileNotFoundError:
+                continue
+
+# ---------------- Serving ----------------
+def resolve(folder, name):
+    """Map a requested /images name to (file name on disk, immutable?).
+
+    Variants that were never generated fall back to their original, but are
+    then not marked immutable, so the browser picks the variant up later.
+    Returns (None, False) for names that do not exist.
+    """
+    if os.path.isfile(os.path.join(folder, name)):
+        return name, bool(HASHED_NAME.match(name))
+
+    # e.g. <digest>.thumb.webp -> <digest>.thumb.jpg -> <digest>.jpg
+    match = HASHED_NAME.match(name)
+    if match:
+        digest = match['digest']
+        candidates = [f'{digest}.thumb.{e}' for e in ('jpg', 'png', 'gif')] if match['thumb'] else []
+        candidates += [f'{digest}.{e}' for e in ('jpg', 'png', 'gif', 'webp')]
+        for candidate in candidates:
+            if os.path.isfile(os.path.join(folder, candidate)):
+                return candidate, False
+    return None, False
@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+import traceback
+
+import storage
+import images
+import metrics
+
+# Jobs live in the `jobs` table of ideas.db (see storage.py), so they survive
+# restarts and are shared by every worker process; each process runs one
+# worker thread that drains whatever is due.
+POLL_INTERVAL = 1.0
+CLAIM_LIMIT = 8
+BATCH_SIZE = 500           # rows deleted per transaction by the purge jobs
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 2            # seconds, doubled after every failed attempt
+SWEEP_INTERVAL = 3600      # how often orphaned uploads are looked for
+UPLOAD_GRACE = 3600        # a fresh upload may not be attached to an idea yet
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
+
+HANDLERS = {}
+
+def configure(upload_folder):
+    global UPLOAD_FOLDER
+    UPLOAD_FOLDER = upload_folder
+
+def handler(kind):
+    """Register fn(payload) for jobs of `kind`; it returns False to be run again for the next batch."""
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+# ---------------- Handlers ----------------
+def _remove_image(image_url):
+    name = images.upload_name(image_url)
+    if name:
+        images.remove_image(UPLOAD_FOLDER, name)
+
+@handler('purge_idea')
+def purge_idea(payload):
+    done, image_url = storage.purge_idea_batch(payload['id'], BATCH_SIZE)
+    if image_url:
+        _remove_image(image_url)
+    return done
+
+@handler('purge_user')
+def purge_user(payload):
+    return storage.purge_user_batch(payload['user_id'], BATCH_SIZE)
+
+@handler('sweep_uploads')
+def sweep_uploads(payload):
+    if not os.path.isdir(UPLOAD_FOLDER):
+        return True
+    for name in list(images.orphaned_files(UPLOAD_FOLDER, storage.image_urls_in_use(), UPLOAD_GRACE)):
+        images.remove_image(UPLOAD_FOLDER, name)
+    return True
+
+# ---------------- Worker ----------------
+class JobWorker:
+    """Background thread that runs due jobs, with retries and exponential backoff.
+
+    Claiming a job pushes its run_after out by storage.JOB_LEASE, so two
+    processes never run the same job and a job whose process died is retried
+    once the lease runs out. A handler that returns False has more batches to
+    go and is queued again at once; one that raises is retried after
+    RETRY_DELAY * 2**(attempt - 1) seconds, and parked as 'failed' after
+    MAX_ATTEMPTS.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL, sweep_interval=SWEEP_INTERVAL):
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self.stats = {'done': 0, 'batches': 0, 'retried': 0, 'failed': 0}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._next_sweep = 0
+
+    def start(self):
+        """Start the worker thread once per process (also after a fork)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='job-worker', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                if time.monotonic() >= self._next_sweep:
+                    # Keyed, so the worker processes queue one sweep between them
+                    storage.enqueue_job('sweep_uploads', {}, key='sweep_uploads', delay=self.sweep_interval)
+                    self._next_sweep = time.monotonic() + self.sweep_interval
+                while self.run_pending():
+                    pass
+            except Exception:
+                traceback.print_exc()  # e.g. database locked; try again next poll
+
+    def run_pending(self):
+        """Run the jobs that are due now; returns how many were run."""
+        if not storage.has_due_jobs():
+            return 0
+        claimed = storage.claim_jobs(CLAIM_LIMIT)
+        for job_id, kind, payload, attempts in claimed:
+            self._execute(job_id, kind, payload, attempts)
+        return len(claimed)
+
+    def _execute(self, job_id, kind, payload, attempts):
+        with metrics.span('job_' + kind):
+            try:
+                done = HANDLERS[kind](payload)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+                if attempts >= MAX_ATTEMPTS or kind not in HANDLERS:
+                    self.stats['failed'] += 1
+                    storage.retry_job(job_id, error)
+                else:
+                    self.stats['retried'] += 1
+                    storage.retry_job(job_id, error, RETRY_DELAY * 2 ** (attempts - 1))
+                return
+        self.stats['batches'] += 1
+        if done:
+            self.stats['done'] += 1
+            storage.finish_job(job_id)
+        else:
+            storage.continue_job(job_id)
+
+worker = JobWorker()
+# Jobs queued by this process's writes start without waiting for the next poll
+storage.add_commit_listener(worker.wake)
+
+def collect_metrics():
+    counts = storage.job_counts()
+    lines = ['# TYPE sparkhub_jobs gauge']
+    lines += [f'sparkhub_jobs{{status="{status}"}} {counts.get(status, 0)}' for status in ('pending', 'failed')]
+    for key in ('done', 'batches', 'retried', 'failed'):
+        lines += [f'# TYPE sparkhub_jobs_{key}_total counter', f'sparkhub_jobs_{key}_total {worker.stats[key]}']
+    return lines
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,231 @@
+import os
+import sys
+import hmac
+import time
+import threading
+import functools
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Sampling profiler (off unless a threshold is configured)
+PROFILE_INTERVAL = 0.005
+PROFILE_MAX_DEPTH = 64
+
+# ---------------- Histograms ----------------
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label tuple."""
+
+    def __init__(self, name, help_text, label_names, buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, seconds):
+        slot = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[slot] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, series in items:
+            base = _labels(self.label_names, labels)
+            running = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                running += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {running}')
+            lines.append(f'{self.name}_sum{{{base}}} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{{{base}}} {running}')
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values):
+    return ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+REQUEST_SECONDS = Histogram('sparkhub_request_duration_seconds', 'Time spent handling a request.',
+                            ('endpoint', 'method'))
+PHASE_SECONDS = Histogram('sparkhub_phase_duration_seconds', 'Time spent in one phase of a request.',
+                          ('endpoint', 'phase'))
+_requests_total = Counter()   # (endpoint, method, status) -> count
+_counter_lock = threading.Lock()
+_collectors = []
+
+# Endpoint of the request the current thread is handling, for span labels
+_local = threading.local()
+
+def current_endpoint():
+    return getattr(_local, 'endpoint', None) or 'background'
+
+@contextmanager
+def span(phase):
+    """Time the enclosed block as `phase` of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASE_SECONDS.observe((current_endpoint(), phase), time.perf_counter() - started)
+
+def timed(phase):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def register_collector(fn):
+    """fn() returns extra exposition lines (e.g. gauges read at scrape time)."""
+    _collectors.append(fn)
+
+def render():
+    lines = REQUEST_SECONDS.render() + PHASE_SECONDS.render()
+    lines += ['# HELP sparkhub_requests_total Requests handled, by response status.',
+              '# TYPE sparkhub_requests_total counter']
+    with _counter_lock:
+        totals = sorted(_requests_total.items())
+    for labels, count in totals:
+        lines.append(f'sparkhub_requests_total{{{_labels(("endpoint", "method", "status"), labels)}}} {count}')
+    for collect in _collectors:
+        lines += collect()
+    return '\n'.join(lines) + '\n'
+
+# ---------------- Sampling Profiler ----------------
+class SlowRequestProfiler:
+    """Samples the stacks of in-flight requests and keeps the ones that end up slow.
+
+    A single thread wakes every `interval` seconds and records the current
+    stack of each thread that is handling a request. When a request finishes
+    above `threshold` seconds its samples are written to `folder` in the
+    folded format ("outer;inner;leaf count") that flamegraph.pl and speedscope
+    read. Requests under the threshold just drop their samples.
+    """
+
+    def __init__(self, threshold, folder, interval=PROFILE_INTERVAL):
+        self.threshold = threshold
+        self.folder = folder
+        self.interval = interval
+        self.written = 0
+        self._active = {}   # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            os.makedirs(self.folder, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name='slow-request-profiler', daemon=True)
+            self._thread.start()
+
+    def begin(self):
+        self.start()
+        with self._lock:
+            self._active[threading.get_ident()] = Counter()
+
+    def end(self, name, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and seconds >= self.threshold:
+            stamp = time.strftime('%Y%m%dT%H%M%S')
+            path = os.path.join(self.folder, f'{stamp}-{os.getpid()}-{name}-{int(seconds * 1000)}ms.folded')
+            with open(path, 'w') as f:
+                for stack, count in samples.most_common():
+                    f.write(f'{stack} {count}\n')
+            self.written += 1
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[_fold(frame)] += 1
+
+def _fold(frame):
+    stack = []
+    while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+# ---------------- Flask Integration ----------------
+def init_app(app):
+    """Time every request and template render, and serve GET /metrics.
+
+    Set app.config['PROFILE_SLOW_REQUESTS'] to a number of seconds to dump
+    stacks of slower requests into app.config['PROFILE_DIR'].
+    """
+    from flask import g, request, session, Response, before_render_template, template_rendered
+
+    profiler = None
+    if app.config.get('PROFILE_SLOW_REQUESTS'):
+        profiler = SlowRequestProfiler(app.config['PROFILE_SLOW_REQUESTS'],
+                                       app.config.get('PROFILE_DIR', 'profiles'))
+
+    @app.before_request
+    def start_timer():
+        _local.endpoint = request.endpoint or 'unknown'
+        g.request_started = time.perf_counter()
+        if profiler:
+            profiler.begin()
+
+    @app.teardown_request
+    def stop_timer(error=None):
+        started = g.pop('request_started', None)
+        endpoint = current_endpoint()
+        _local.endpoint = None
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        REQUEST_SECONDS.observe((endpoint, request.method), elapsed)
+        status = g.pop('response_status', 500 if error else 200)
+        with _counter_lock:
+            _requests_total[(endpoint, request.method, status)] += 1
+        if profiler:
+            profiler.end(endpoint, elapsed)
+
+    @app.after_request
+    def remember_status(response):
+        g.response_status = response.status_code
+        return response
+
+    def render_started(sender, template, context, **extra):
+        g.render_started = time.perf_counter()
+
+    def render_finished(sender, template, context, **extra):
+        started = g.pop('render_started', None)
+        if started is not None:
+            PHASE_SECONDS.observe((current_endpoint(), 'render'), time.perf_counter() - started)
+
+    before_render_template.connect(render_started, app, weak=False)
+    template_rendered.connect(render_finished, app, weak=False)
+
+    @app.route('/metrics')
+    def metrics():
+        # Endpoint names and traffic are not for everyone: admins, or a scraper with the token
+        token = app.config.get('METRICS_TOKEN')
+        sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if session.get('account_type') != 'admin' and not (token and hmac.compare_digest(sent.encode(), str(token).encode())):
+            return Response('Forbidden\n', 403, mimetype='text/plain')
+        return Response(render(), mimetype='text/plain; version=0.0.4')
+
+    return profiler
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug import security
+
+import metrics
+
+# Password hashing is deliberately slow (tens of ms of CPU per call). It runs
+# in a small process pool so a burst of logins cannot occupy every request
+# thread, and requests beyond the queue limit are turned away at once.
+HASH_METHOD = 'scrypt:32768:8:1'  # any werkzeug generate_password_hash method
+POOL_WORKERS = 1                  # hashing processes per app process; 0 hashes inline
+MAX_QUEUE = 16                    # calls allowed to wait for a free hashing process
+TIMEOUT = 10                      # seconds before a queued call gives up
+
+HASH_SECONDS = metrics.Histogram('sparkhub_password_hash_seconds',
+                                 'Time to hash or check a password, including the wait for the pool.',
+                                 ('operation',))
+
+class Overloaded(Exception):
+    """Too many hashes queued; the caller should answer 503."""
+
+# ---------------- Method Strings ----------------
+def normalize_method(method):
+    """Spell out werkzeug's defaults, the way it writes them into the hash."""
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        defaults = ['32768', '8', '1']
+    elif name == 'pbkdf2':
+        defaults = ['sha256', str(security.DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        return method
+    return ':'.join([name] + args + defaults[len(args):])
+
+def needs_rehash(pwhash, method=None):
+    return pwhash.split('$', 1)[0] != normalize_method(method or HASH_METHOD)
+
+# Run in the pool processes; module-level so they can be pickled
+def _hash(password, method):
+    return security.generate_password_hash(password, method)
+
+def _verify(pwhash, password, method):
+    """(matches, new hash if the stored one uses old parameters)"""
+    if not security.check_password_hash(pwhash, password):
+        return False, None
+    return True, (_hash(password, method) if needs_rehash(pwhash, method) else None)
+
+# ---------------- Pool ----------------
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_slots = threading.BoundedSemaphore(POOL_WORKERS + MAX_QUEUE)
+_stats_lock = threading.Lock()
+stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0, 'in_flight': 0}
+
+def _count(key, n=1):
+    with _stats_lock:
+        stats[key] += n
+
+def configure(method=None, workers=None, max_queue=None, timeout=None):
+    """Change the hashing parameters (see create_app); restarts the pool."""
+    global HASH_METHOD, POOL_WORKERS, MAX_QUEUE, TIMEOUT, _slots
+    with _lock:
+        HASH_METHOD = method or HASH_METHOD
+        POOL_WORKERS = POOL_WORKERS if workers is None else workers
+        MAX_QUEUE = MAX_QUEUE if max_queue is None else max_queue
+        TIMEOUT = timeout or TIMEOUT
+        _slots = threading.BoundedSemaphore(max(POOL_WORKERS, 1) + MAX_QUEUE)
+        _shutdown()
+
+def _shutdown():
+    global _pool
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+
+def _executor():
+    """The pool of this process, started on first use (and again after a fork)."""
+    global _pool, _pool_pid
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: request threads may hold locks at fork time
+            _pool = ProcessPoolExecutor(POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _release(slots):
+    _count('in_flight', -1)
+    slots.release()
+
+def _run(operation, fn, *args):
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        _count('rejected')
+        raise Overloaded()
+    _count('in_flight')
+    started = time.perf_counter()
+    future = None
+    try:
+        with metrics.span('password_hash'):
+            if not POOL_WORKERS:
+                return fn(*args)
+            # The slot is held until the pool is done with the call, not until
+            # we stop waiting: a hash that timed out still occupies a process
+            future = _executor().submit(fn, *args)
+            future.add_done_callback(lambda _: _release(slots))
+            try:
+                return future.result(timeout=TIMEOUT)
+            except FutureTimeout:
+                future.cancel()  # frees the slot now if it never started
+                _count('rejected')
+                raise Overloaded()
+            except BrokenProcessPool:
+                # A hashing process died; start a fresh pool for the next call
+                with _lock:
+                    _shutdown()
+                raise Overloaded()
+    finally:
+        HASH_SECONDS.observe((operation,), time.perf_counter() - started)
+        if future is None:
+            _release(slots)
+
+# ---------------- Public API ----------------
+def hash_password(password):
+    _count('hashed')
+    return _run('hash', _hash, password, HASH_METHOD)
+
+def verify_password(pwhash, password):
+    """Check a password; returns (matches, new_hash).
+
+    new_hash is set when the stored hash was made with other parameters than
+    HASH_METHOD, so the caller can save it and the user is upgraded on login.
+    """
+    _count('verified')
+    matches, new_hash = _run('verify', _verify, pwhash, password, HASH_METHOD)
+    if new_hash:
+        _count('rehashed')
+    return matches, new_hash
+
+def shutdown():
+    with _lock:
+        _shutdown()
+
+def collect_metrics():
+    lines = HASH_SECONDS.render()
+    with _stats_lock:
+        values = dict(stats)
+    for key in ('hashed', 'verified', 'rehashed', 'rejected'):
+        lines += [f'# TYPE sparkhub_passwords_{key}_total counter', f'sparkhub_passwords_{key}_total {values[key]}']
+    lines += ['# TYPE sparkhub_password_hashes_in_flight gauge', f'sparkhub_password_hashes_in_flight {values["in_flight"]}']
+    return lines
+
+metrics.register_collector(collect_metrics)
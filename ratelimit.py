@@ -0,0 +1,262 @@
+import os
+import mmap
+import math
+import time
+import fcntl
+import struct
+import hashlib
+import threading
+
+import metrics
+
+# Token buckets per (rule, client): a client may burst up to `capacity`
+# requests, then gets `rate` more per second. Buckets live in this process,
+# or, with a shared file, in a memory-mapped table every worker uses, so
+# the limits hold across gunicorn workers.
+LIMITS = {
+    'vote': (30, 2.0),       # (capacity, tokens per second)
+    'report': (5, 1 / 60),
+    'chatbot': (10, 0.5),
+}
+SHARED_FILE = None           # None keeps the buckets in this process
+MAX_LOCAL_BUCKETS = 100000   # idle buckets are dropped beyond this
+
+# Write requests allowed to run at once (across workers with SHARED_FILE),
+# and how long one waits for a free slot before it is turned away
+MAX_WRITES = 8
+WRITE_TIMEOUT = 0.25         # seconds
+WRITE_POLL = 0.005
+
+SHARED_SLOTS = 65536         # buckets in the shared table; colliding clients share nothing, one is reset
+SHARED_STRIPES = 64          # byte-range locks guarding the table
+SLOT = struct.Struct('<Qdd')  # key hash (0 = empty), tokens, updated (time.time())
+WRITE_LOCK_OFFSET = 1 << 40   # write slots lock bytes here, clear of the stripe locks
+
+class RateLimited(Exception):
+    """A client used up its bucket; the caller should answer 429."""
+    def __init__(self, retry_after):
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+class Overloaded(Exception):
+    """Too many writes in flight; the caller should answer 503."""
+
+# ---------------- Buckets ----------------
+def _refill(tokens, updated, now, capacity, rate):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+def _wait(tokens, rate):
+    """Whole seconds until a bucket holding `tokens` has one to spare."""
+    return max(1, math.ceil((1 - tokens) / rate))
+
+class LocalBuckets:
+    """Buckets of this process only."""
+
+    def __init__(self, max_buckets=MAX_LOCAL_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        """Spend one token; returns 0, or the seconds to wait when the bucket is empty."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], now, capacity, rate)
+            if tokens < 1:
+                return _wait(tokens, rate)
+            if bucket is None and len(self._buckets) >= self.max_buckets:
+                self._prune(now)
+            self._buckets[key] = (tokens - 1, now)
+            return 0
+
+    def refund(self, key, capacity):
+        """Give back the token take() just spent, when the request was turned away after all."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                self._buckets[key] = (min(capacity, bucket[0] + 1), bucket[1])
+
+    def _prune(self, now):
+        # A bucket that has refilled is the same as no bucket; if none has, start over
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if key[0] not in LIMITS or _refill(tokens, updated, now, *LIMITS[key[0]]) >= LIMITS[key[0]][0]]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_buckets:
+            self._buckets.clear()
+
+class SharedBuckets:
+    """Buckets in a memory-mapped file, shared by every process that opens it.
+
+    Each client hashes to one slot; a stripe of slots is guarded by an
+    fcntl byte-range lock (released by the kernel if a worker dies) plus a
+    thread lock, since fcntl locks only exclude other processes.
+    """
+
+    def __init__(self, path, slots=SHARED_SLOTS, stripes=SHARED_STRIPES):
+        self.path = path
+        self.slots = slots
+        self.stripes = stripes
+        size = slots * SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < size:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 0, 0)  # the whole file, while it grows
+            try:
+                if os.fstat(self._fd).st_size < size:
+                    os.ftruncate(self._fd, size)  # zero-filled: every slot empty
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 0, 0)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        digest = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), 'little') | 1
+        slot = digest % self.slots
+        stripe = slot % self.stripes
+        offset = slot * SLOT.size
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                owner, tokens, updated = SLOT.unpack_from(self._map, offset)
+                tokens = _refill(tokens, updated, now, capacity, rate) if owner == digest else capacity
+                if tokens < 1:
+                    return _wait(tokens, rate)
+                SLOT.pack_into(self._map, offset, digest, tokens - 1, now)
+                return 0
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+# ---------------- Write Slots ----------------
+class WriteSlots:
+    """At most `size` writes at a time: per process, or across processes with a lock file fd."""
+
+    def __init__(self, size, fd=None):
+        self.size = size
+        self._fd = fd
+        self._locks = [threading.Lock() for _ in range(size)]
+        self._next = 0
+
+    def try_acquire(self):
+        """Take a free slot and return its number, or None when all are taken."""
+        start = self._next
+        for i in range(self.size):
+            slot = (start + i) % self.size
+            if not self._locks[slot].acquire(blocking=False):
+                continue
+            if self._fd is not None:
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, WRITE_LOCK_OFFSET + slot)
+                except OSError:
+                    self._locks[slot].release()  # another process has it
+                    continue
+            self._next = slot + 1
+            return slot
+        return None
+
+    def release(self, slot):
+        if self._fd is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, WRITE_LOCK_OFFSET + slot)
+        self._locks[slot].release()
+
+# ---------------- State ----------------
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+stats = {'limited': {}, 'shed': 0, 'writes': 0}
+_local = LocalBuckets()
+_shared = None
+_writes = WriteSlots(MAX_WRITES)
+
+def _count_limited(rule):
+    with _stats_lock:
+        stats['limited'][rule] = stats['limited'].get(rule, 0) + 1
+
+def configure(limits=None, shared_file=None, max_writes=None, write_timeout=None):
+    """Change the limits (see create_app); starts with fresh buckets."""
+    global LIMITS, SHARED_FILE, MAX_WRITES, WRITE_TIMEOUT, _local, _shared, _writes
+    with _lock:
+        if limits is not None:
+            LIMITS = {rule: (float(capacity), float(rate)) for rule, (capacity, rate) in limits.items()}
+        MAX_WRITES = MAX_WRITES if max_writes is None else max_writes
+        WRITE_TIMEOUT = WRITE_TIMEOUT if write_timeout is None else write_timeout
+        if _shared is not None:
+            _shared.close()
+        SHARED_FILE = shared_file
+        _shared = SharedBuckets(shared_file) if shared_file else None
+        _local = LocalBuckets()
+        _writes = WriteSlots(MAX_WRITES, _shared._fd if _shared is not None else None)
+
+def _after_fork():
+    # Thread locks held at fork time would never be released in the child
+    global _lock, _stats_lock, _local, _writes
+    _lock, _stats_lock = threading.Lock(), threading.Lock()
+    _local = LocalBuckets(_local.max_buckets)
+    if _shared is not None:
+        _shared._lock = threading.Lock()
+    _writes = WriteSlots(_writes.size, _writes._fd)
+
+os.register_at_fork(after_in_child=_after_fork)
+
+# ---------------- Public API ----------------
+def check(rule, client):
+    """Charge one request of `client` (e.g. 'user:3' or 'ip:10.0.0.1') to `rule`.
+
+    Raises RateLimited when its bucket is empty. The process-local bucket is
+    asked first: it only sees this worker's share of the client's requests,
+    so when it is empty the shared one is too, and a flood is turned away
+    without touching the shared table. When the shared bucket says no, the
+    local token is given back, so a denied request is not charged there.
+    """
+    limit = LIMITS.get(rule)
+    if limit is None:
+        return
+    now = time.time()
+    key = (rule, client)
+    wait = _local.take(key, *limit, now)
+    if not wait and _shared is not None:
+        wait = _shared.take(key, *limit, now)
+        if wait:
+            _local.refund(key, limit[0])
+    if wait:
+        _count_limited(rule)
+        raise RateLimited(wait)
+
+def acquire_write():
+    """Take a write slot, waiting up to WRITE_TIMEOUT, or raise Overloaded.
+
+    Returns a handle to pass to release_write() when the request is done.
+    """
+    writes = _writes
+    slot = writes.try_acquire()
+    if slot is None:
+        deadline = time.monotonic() + WRITE_TIMEOUT
+        while slot is None and time.monotonic() < deadline:
+            time.sleep(WRITE_POLL)
+            slot = writes.try_acquire()
+        if slot is None:
+            with _stats_lock:
+                stats['shed'] += 1
+            raise Overloaded()
+    with _stats_lock:
+        stats['writes'] += 1
+    return writes, slot
+
+def release_write(held):
+    writes, slot = held
+    writes.release(slot)
+    with _stats_lock:
+        stats['writes'] -= 1
+
+def collect_metrics():
+    with _stats_lock:
+        limited, shed, writes = dict(stats['limited']), stats['shed'], stats['writes']
+    lines = ['# TYPE sparkhub_rate_limited_total counter']
+    lines += [f'sparkhub_rate_limited_total{{rule="{rule}"}} {n}' for rule, n in sorted(limited.items())]
+    lines += ['# TYPE sparkhub_writes_shed_total counter', f'sparkhub_writes_shed_total {shed}',
+              '# TYPE sparkhub_writes_in_flight gauge', f'sparkhub_writes_in_flight {writes}']
+    return lines
+
+metrics.register_collector(collect_metrics)
@@ -0,0 +1,419 @@
+"""Compact, memory-mapped snapshot of the live ideas, for the idea cache.
+
+A snapshot is written once per data version and then mmap'ed read-only by
+every worker process, so the pages are shared and nothing is parsed up
+front. Ideas come back as small views that decode a field when it is read.
+
+File layout (little-endian, sections 8-byte aligned):
+
+    header    magic, format version, offset and length of the meta block
+    ids       int64 per idea, ascending (binary-searched by id)
+    slots     int32 record number per id from the lowest to the highest
+              (-1 for gaps), when ids are dense enough, so an id is found
+              by indexing instead of a binary search
+    records   one fixed-width RECORD per idea, in id order
+    positions uint32 record numbers: each category's ideas, and every
+              stored sort order (overall and per category)
+    heap      UTF-8 text and vote sets, referenced as (offset, length)
+    meta      JSON: counts, data version and where the sections start
+
+Vote sets are stored as whichever is smaller: a bitmap starting at the
+lowest voter id (membership is one bit test) or a sorted array of ids
+(binary search). Either way voters come back in ascending id order.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'SPKSNAP\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sIIQQ')  # magic, format version, flags, meta offset, meta length
+
+TEXT_FIELDS = ('title', 'description', 'category', 'image_url', 'created_at')
+VOTE_FIELDS = ('upvotes', 'downvotes')
+# id, user_id, upvote_count, downvote_count, then an (offset, length) heap
+# reference per text field and vote set
+RECORD = struct.Struct('<qqii' + 'II' * (len(TEXT_FIELDS) + len(VOTE_FIELDS)))
+KEYS = ('id', 'user_id') + TEXT_FIELDS + ('upvote_count', 'downvote_count') + VOTE_FIELDS
+# key -> (struct, byte offset in the record), to read one field without the rest
+_INT64, _INT32, _REF = struct.Struct('<q'), struct.Struct('<i'), struct.Struct('<II')
+FIELDS = {'id': (_INT64, 0), 'user_id': (_INT64, 8), 'upvote_count': (_INT32, 16), 'downvote_count': (_INT32, 20)}
+FIELDS.update((key, (_REF, 24 + 8 * i)) for i, key in enumerate(TEXT_FIELDS + VOTE_FIELDS))
+
+NULL_ID = -2 ** 63      # user_id IS NULL
+NULL_LENGTH = 2 ** 32 - 1  # text field IS NULL
+MAX_HEAP = 2 ** 32 - 1  # heap offsets are 32-bit
+
+# Vote sets: an 8-byte header (kind, count), then for a bitmap the int64 id
+# of bit 0 and the bits, for an array the sorted ids (uint32 when they fit)
+VOTES_HEADER = struct.Struct('<BxxxI')
+VOTES_BITMAP, VOTES_ARRAY32, VOTES_ARRAY64 = 0, 1, 2
+
+class SnapshotError(Exception):
+    """Not a snapshot file, or one written by another format version."""
+
+def _pad(n):
+    return -n % 8
+
+def _check_byteorder():
+    # Position and id arrays are read with memoryview.cast, i.e. in host byte order
+    if sys.byteorder != 'little':
+        raise SnapshotError('snapshots are only supported on little-endian hosts')
+
+# ---------------- Vote Sets ----------------
+def encode_votes(user_ids):
+    """Encode voter ids as the smaller of a bitmap and a sorted id array."""
+    ids = sorted(set(user_ids))
+    if not ids:
+        return b''
+    base, span = ids[0], ids[-1] - ids[0] + 1
+    wide = base < 0 or ids[-1] >= 2 ** 32
+    if 8 + (span + 7) // 8 < (8 if wide else 4) * len(ids):
+        bits = bytearray((span + 7) // 8)
+        for user_id in ids:
+            offset = user_id - base
+            bits[offset >> 3] |= 1 << (offset & 7)
+        return VOTES_HEADER.pack(VOTES_BITMAP, len(ids)) + _INT64.pack(base) + bytes(bits)
+    if wide:
+        return VOTES_HEADER.pack(VOTES_ARRAY64, len(ids)) + struct.pack(f'<{len(ids)}q', *ids)
+    return VOTES_HEADER.pack(VOTES_ARRAY32, len(ids)) + struct.pack(f'<{len(ids)}I', *ids)
+
+class VoteSet:
+    """Read-only set of voter ids over a slice of the snapshot.
+
+    `in` is a bit test for a bitmap and a binary search for an id array.
+    """
+    __slots__ = ('_kind', '_count', '_base', '_data')
+
+    def __init__(self, buf=b''):
+        self._base = 0
+        if not buf:
+            self._kind, self._count, self._data = VOTES_ARRAY32, 0, ()
+            return
+        self._kind, self._count = VOTES_HEADER.unpack_from(buf)
+        data = buf[VOTES_HEADER.size:]
+        if self._kind == VOTES_BITMAP:
+            self._base = _INT64.unpack_from(data)[0]
+            self._data = data[8:]
+        else:
+            self._data = data.cast('I' if self._kind == VOTES_ARRAY32 else 'q')
+
+    def __contains__(self, user_id):
+        if not isinstance(user_id, int) or not self._count:
+            return False
+        if self._kind == VOTES_BITMAP:
+            offset = user_id - self._base
+            return 0 <= offset < len(self._data) * 8 and bool(self._data[offset >> 3] >> (offset & 7) & 1)
+        pos = bisect_left(self._data, user_id)
+        return pos < self._count and self._data[pos] == user_id
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        if self._kind != VOTES_BITMAP:
+            return iter(self._data)
+        return (self._base + (i << 3) + bit
+                for i, byte in enumerate(self._data) if byte
+                for bit in range(8) if byte >> bit & 1)
+
+    def __eq__(self, other):
+        return list(self) == list(other) if isinstance(other, (VoteSet, list)) else NotImplemented
+
+    def tolist(self):
+        return list(self) if self._kind == VOTES_BITMAP else list(self._data)
+
+    def __repr__(self):
+        return f'VoteSet({list(self)!r})'
+
+# ---------------- Views ----------------
+class IdeaView(Mapping):
+    """One idea of a snapshot, read like the idea dicts (and read-only, like them)."""
+    __slots__ = ('_snap', '_pos')
+
+    def __init__(self, snap, pos):
+        self._snap, self._pos = snap, pos
+
+    def __getitem__(self, key):
+        try:
+            field, offset = FIELDS[key]
+        except (KeyError, TypeError):
+            raise KeyError(key) from None
+        snap = self._snap
+        values = field.unpack_from(snap._records, self._pos * RECORD.size + offset)
+        if field is not _REF:
+            return None if values[0] == NULL_ID else values[0]
+        if key in VOTE_FIELDS:
+            return snap._votes(*values)
+        return snap._text(*values)
+
+    def __iter__(self):
+        return iter(KEYS)
+
+    def __len__(self):
+        return len(KEYS)
+
+    def to_dict(self):
+        """All fields at once, with voters as lists; what the API serializes."""
+        snap = self._snap
+        text, votes = snap._text, snap._votes
+        v = RECORD.unpack_from(snap._records, self._pos * RECORD.size)
+        return {
+            'id': v[0], 'user_id': None if v[1] == NULL_ID else v[1],
+            'title': text(v[4], v[5]), 'description': text(v[6], v[7]), 'category': text(v[8], v[9]),
+            'image_url': text(v[10], v[11]), 'created_at': text(v[12], v[13]),
+            'upvote_count': v[2], 'downvote_count': v[3],
+            'upvotes': votes(v[14], v[15]).tolist(), 'downvotes': votes(v[16], v[17]).tolist(),
+        }
+
+    def items(self):
+        return self.to_dict().items()
+
+    def values(self):
+        return self.to_dict().values()
+
+    def __repr__(self):
+        return f'IdeaView({self.to_dict()!r})'
+
+class IdeaList(Sequence):
+    """A sequence of IdeaViews over record numbers (all ideas, or a stored position array)."""
+    __slots__ = ('_snap', '_positions')
+
+    def __init__(self, snap, positions):
+        self._snap, self._positions = snap, positions
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return IdeaList(self._snap, self._positions[index])
+        return IdeaView(self._snap, self._positions[index])
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        snap = self._snap
+        return (IdeaView(snap, pos) for pos in self._positions)
+
+# ---------------- Reading ----------------
+class Snapshot(Mapping):
+    """A snapshot file mapped into memory: a read-only mapping of idea id -> IdeaView.
+
+    The mapping stays open for as long as any view of it is referenced.
+    """
+    __slots__ = ('path', 'data_version', '_map', '_meta', '_ids', '_slots', '_first_id', '_records',
+                 '_heap', '_heap_start')
+
+    def __init__(self, path):
+        _check_byteorder()
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self._map)
+        if len(buf) < HEADER.size:
+            raise SnapshotError(f'{path}: file too short')
+        magic, version, _, meta_offset, meta_length = HEADER.unpack_from(buf)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f'{path}: not a version {FORMAT_VERSION} snapshot')
+        self._meta = meta = json.loads(bytes(buf[meta_offset:meta_offset + meta_length]))
+        self.path = path
+        self.data_version = (meta['data_version'], meta['modified'])
+        count = meta['count']
+        self._ids = buf[meta['ids']:meta['ids'] + 8 * count].cast('q')
+        self._records = buf[meta['records']:meta['records'] + RECORD.size * count]
+        self._heap = buf[meta['heap']:meta['heap'] + meta['heap_length']]
+        self._heap_start = meta['heap']
+        if meta.get('slots'):
+            offset, length, self._first_id = meta['slots']
+            self._slots = buf[offset:offset + 4 * length].cast('i')
+        else:
+            self._slots, self._first_id = None, 0
+
+    def _text(self, offset, length):
+        if length == NULL_LENGTH:
+            return None
+        start = self._heap_start + offset
+        return self._map[start:start + length].decode()
+
+    def _votes(self, offset, length):
+        return VoteSet(self._heap[offset:offset + length] if length else b'')
+
+    def _positions(self, ref):
+        offset, count = ref
+        return memoryview(self._map)[offset:offset + 4 * count].cast('I')
+
+    def _find(self, idea_id):
+        if not isinstance(idea_id, int):
+            return None
+        if self._slots is not None:
+            slot = idea_id - self._first_id
+            pos = self._slots[slot] if 0 <= slot < len(self._slots) else -1
+            return pos if pos >= 0 else None
+        pos = bisect_left(self._ids, idea_id)
+        return pos if pos < len(self._ids) and self._ids[pos] == idea_id else None
+
+    # Mapping: idea id -> IdeaView
+    def __getitem__(self, idea_id):
+        pos = self._find(idea_id)
+        if pos is None:
+            raise KeyError(idea_id)
+        return IdeaView(self, pos)
+
+    def __contains__(self, idea_id):
+        return self._find(idea_id) is not None
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def select(self, ids):
+        """The ideas with these ids, in the given order; unknown ids are skipped."""
+        if self._slots is None:
+            positions = [pos for pos in map(self._find, ids) if pos is not None]
+        else:
+            slots, first, end = self._slots, self._first_id, self._first_id + len(self._slots)
+            positions = [pos for pos in (slots[i - first] if first <= i < end else -1 for i in ids) if pos >= 0]
+        return IdeaList(self, positions)
+
+    def ideas(self):
+        """Every idea, in id order."""
+        return IdeaList(self, range(len(self._ids)))
+
+    def categories(self):
+        """Lower-cased category names."""
+        return list(self._meta['categories'])
+
+    def category(self, name):
+        """The ideas of one lower-cased category, in id order."""
+        ref = self._meta['categories'].get(name)
+        return IdeaList(self, self._positions(ref) if ref else range(0))
+
+    def ordered(self, sort, category=None):
+        """Ideas in a sort order stored at write time (see write()); None if not stored."""
+        orders = self._meta['orders'].get(sort)
+        if orders is None:
+            return None
+        ref = orders['all'] if category is None else orders['categories'].get(category)
+        return IdeaList(self, self._positions(ref) if ref else range(0))
+
+# ---------------- Writing ----------------
+def write(path, ideas, data_version=(0, None), orders=None):
+    """Write `ideas` (idea dicts in ascending id order) as a snapshot at `path`.
+
+    `orders` maps sort names to key functions (like storage.SORT_KEYS);
+    each order is stored overall and per category. The file is written
+    under a temporary name and renamed, so readers never see half of it.
+    """
+    _check_byteorder()
+    orders = orders or {}
+    folder = os.path.dirname(os.path.abspath(path))
+    ids, records = array('q'), bytearray()
+    categories, sort_keys = {}, {name: [] for name in orders}
+    interned = {}
+    with tempfile.TemporaryFile(dir=folder) as heap:
+        heap_length = 0
+
+        def put(data, align=False):
+            nonlocal heap_length
+            if align:  # vote arrays are read with memoryview.cast
+                heap.write(b'\0' * _pad(heap_length))
+                heap_length += _pad(heap_length)
+            offset = heap_length
+            heap.write(data)
+            heap_length += len(data)
+            if heap_length > MAX_HEAP:
+                raise ValueError('snapshot text and votes exceed 4 GB')
+            return offset, len(data)
+
+        def put_text(value, intern=False):
+            if value is None:
+                return 0, NULL_LENGTH
+            if not value:
+                return 0, 0
+            if intern:
+                if value not in interned:
+                    interned[value] = put(value.encode())
+                return interned[value]
+            return put(value.encode())
+
+        for pos, idea in enumerate(ideas):
+            if ids and idea['id'] <= ids[-1]:
+                raise ValueError('ideas must be in ascending id order')
+            upvotes, downvotes = idea.get('upvotes') or [], idea.get('downvotes') or []
+            if 'upvote_count' not in idea:  # legacy ideas.json entries only have the voter lists
+                idea = dict(idea, upvote_count=len(upvotes), downvote_count=len(downvotes))
+            refs = []
+            for field in TEXT_FIELDS:
+                refs += put_text(idea.get(field), intern=field in ('category', 'image_url'))
+            for voters in (upvotes, downvotes):
+                blob = encode_votes(voters)
+                refs += put(blob, align=True) if blob else (0, 0)
+            user_id = idea.get('user_id')
+            records += RECORD.pack(idea['id'], NULL_ID if user_id is None else user_id,
+                                   idea['upvote_count'], idea['downvote_count'], *refs)
+            ids.append(idea['id'])
+            categories.setdefault((idea.get('category') or '').lower(), array('I')).append(pos)
+            for name, key in orders.items():
+                sort_keys[name].append((key(idea), pos))
+
+        # Sort orders, overall and split by category
+        category_of = {}
+        for name, positions in categories.items():
+            for pos in positions:
+                category_of[pos] = name
+        order_positions = {}
+        for name, keyed in sort_keys.items():
+            keyed.sort()
+            overall = array('I', (pos for _, pos in keyed))
+            split = {}
+            for pos in overall:
+                split.setdefault(category_of[pos], array('I')).append(pos)
+            order_positions[name] = (overall, split)
+        del sort_keys, category_of
+
+        fd, tmp = tempfile.mkstemp(dir=folder, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                out.write(b'\0' * HEADER.size)
+                meta = {'count': len(ids), 'data_version': data_version[0], 'modified': data_version[1]}
+
+                def section(data):
+                    offset = out.tell()
+                    out.write(data)
+                    out.write(b'\0' * _pad(out.tell()))
+                    return offset
+
+                meta['ids'] = section(ids.tobytes())
+                if ids and ids[-1] - ids[0] < 4 * len(ids):
+                    slots = array('i', [-1]) * (ids[-1] - ids[0] + 1)
+                    for pos, idea_id in enumerate(ids):
+                        slots[idea_id - ids[0]] = pos
+                    meta['slots'] = [section(slots.tobytes()), len(slots), ids[0]]
+                    del slots
+                meta['records'] = section(records)
+                del records
+                meta['categories'] = {name: [section(p.tobytes()), len(p)] for name, p in sorted(categories.items())}
+                meta['orders'] = {
+                    sort: {'all': [section(overall.tobytes()), len(overall)],
+                           'categories': {name: [section(p.tobytes()), len(p)] for name, p in sorted(split.items())}}
+                    for sort, (overall, split) in order_positions.items()}
+                meta['heap'], meta['heap_length'] = out.tell(), heap_length
+                heap.seek(0)
+                while chunk := heap.read(1 << 20):
+                    out.write(chunk)
+                meta_bytes = json.dumps(meta).encode()
+                meta_offset = out.tell()
+                out.write(meta_bytes)
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, meta_offset, len(meta_bytes)))
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return path
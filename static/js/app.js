@@ -1,6 +1,28 @@
 // Helper: truncate text
 const truncate = (str, n=160) => (str.length > n ? str.slice(0, n-1) + "…" : str);
+// Helper: content-hashed uploads (/images/<hash>.<ext>) have pre-sized WebP variants
+const HASHED_IMAGE = /^\/images\/([0-9a-f]{32})\.\w+$/;
+const thumbUrl = url => {
+  const m = HASHED_IMAGE.exec(url || '');
+  return m ? `/images/${m[1]}.thumb.webp` : url;
+};
+const webpUrl = url => {
+  const m = HASHED_IMAGE.exec(url || '');
+  return m ? `/images/${m[1]}.webp` : url;
+};
 const currentUserId = "{{ session.get('user_id', '') }}";
+const myUserId = Number(currentUserId) || null;  // voter ids are numbers
+// The list is fetched with ?votes=counts: counts and my_vote instead of voter lists
+const upCount = idea => idea.upvote_count ?? (idea.upvotes?.length || 0);
+const downCount = idea => idea.downvote_count ?? (idea.downvotes?.length || 0);
+// Same shape for a full idea (vote and create responses, idea.created events)
+const withCounts = ({ upvotes = [], downvotes = [], ...idea }) => ({
+  ...idea,
+  upvote_count: idea.upvote_count ?? upvotes.length,
+  downvote_count: idea.downvote_count ?? downvotes.length,
+  my_vote: idea.my_vote !== undefined ? idea.my_vote
+    : upvotes.includes(myUserId) ? 'upvote' : downvotes.includes(myUserId) ? 'downvote' : null
+});
 // Elements
 const ideasGrid = document.getElementById('ideasGrid');
 const searchInput = document.getElementById('searchInput');
@@ -42,50 +64,112 @@ const viewDownvotes = document.getElementById('viewDownvotes');
 
 let currentIdeaId = null;
 
-// Load initial ideas
-async function loadIdeas() {
-  const params = new URLSearchParams({
-    search: searchInput.value.trim(),
-    category: categoryFilter.value,
-    sort: sortSelect.value
-  });
+// Load ideas a page at a time; the next page is fetched when the end of the grid scrolls into view
+const PAGE_SIZE = 24;
+let nextCursor = null;
+let loading = null;   // the page request in flight
+let listVersion = 0;  // bumped when the filters change, so a stale page is dropped
+let facets = null;    // idea count per category, for the hero stats
+
+const listParams = () => new URLSearchParams({
+  search: searchInput.value.trim(),
+  category: categoryFilter.value,
+  sort: sortSelect.value
+});
+
+const fetchFacets = () =>
+  fetch(`/api/ideas/facets?${new URLSearchParams({ search: searchInput.value.trim() })}`).then(r => r.json());
+
+async function fetchPage(cursor) {
+  const params = listParams();
+  params.set('votes', 'counts');
+  params.set('limit', PAGE_SIZE);
+  if (cursor) params.set('cursor', cursor);
   const res = await fetch(`/api/ideas?${params.toString()}`);
-  const data = await res.json();
-  currentIdeas = data.map(i => {
-    i.upvotes = i.upvotes || [];
-    i.downvotes = i.downvotes || [];
-    return i;
-  });
+  return res.json();
+}
 
+// First page for the current filters
+async function loadIdeas() {
+  const version = ++listVersion;
+  loading = null;
+  const [page, counts] = await Promise.all([fetchPage(null), fetchFacets()]);
+  if (version !== listVersion) return;
+  currentIdeas = page.ideas || [];
+  nextCursor = page.next_cursor;
+  facets = counts;
   renderIdeas();
-  updateStats();
+  watchEnd();
+}
+
+async function loadMore() {
+  if (!nextCursor || loading) return;
+  const version = listVersion;
+  loading = fetchPage(nextCursor);
+  try {
+    const page = await loading;
+    if (version !== listVersion) return;
+    const loaded = new Set(currentIdeas.map(i => i.id));
+    currentIdeas = [...currentIdeas, ...(page.ideas || []).filter(i => !loaded.has(i.id))];
+    nextCursor = page.next_cursor;
+    renderIdeas();
+  } finally {
+    if (version === listVersion) loading = null;
+  }
+  watchEnd();
+}
+
+const listEnd = document.createElement('div');
+listEnd.className = 'list-end';
+ideasGrid.after(listEnd);
+const endObserver = window.IntersectionObserver
+  ? new IntersectionObserver(entries => { if (entries.some(e => e.isIntersecting)) loadMore(); }, { rootMargin: '600px' })
+  : null;
+function watchEnd() {
+  // Observing again reports the current position, so a short page still fills the screen
+  if (!endObserver) return;
+  endObserver.unobserve(listEnd);
+  if (nextCursor) endObserver.observe(listEnd);
+}
+if (!endObserver) {
+  window.addEventListener('scroll', debounce(() => {
+    if (listEnd.getBoundingClientRect().top < window.innerHeight + 600) loadMore();
+  }, 100), { passive: true });
 }
 
 function updateStats() {
-  statIdeas.textContent = currentIdeas.length;
+  // Ideas and categories for the whole filter come from the facets; votes for what is loaded
+  const category = categoryFilter.value.toLowerCase();
+  const nonEmpty = (facets?.categories || []).filter(c => c.count > 0);
+  if (facets) {
+    statIdeas.textContent = category === 'all'
+      ? facets.total
+      : (nonEmpty.find(c => c.category === category)?.count || 0);
+    statCategories.textContent = category === 'all' ? nonEmpty.length : (nonEmpty.some(c => c.category === category) ? 1 : 0);
+  } else {
+    statIdeas.textContent = currentIdeas.length;
+    statCategories.textContent = new Set(currentIdeas.map(i => i.category)).size;
+  }
 
   const totalVotes = currentIdeas.reduce((sum, idea) => {
-    return sum + (idea.upvotes?.length || 0) + (idea.downvotes?.length || 0);
+    return sum + upCount(idea) + downCount(idea);
   }, 0);
 
   statVotes.textContent = totalVotes;
-
-  const cats = new Set(currentIdeas.map(i => i.category));
-  statCategories.textContent = cats.size;
 }
 
 function updateModalVotes(idea) {
   if (viewUpvote && viewDownvote) {
-    viewUpvote.textContent = `⬆️ ${idea.upvotes?.length || 0}`;
-    viewDownvote.textContent = `⬇️ ${idea.downvotes?.length || 0}`;
+    viewUpvote.textContent = `⬆️ ${upCount(idea)}`;
+    viewDownvote.textContent = `⬇️ ${downCount(idea)}`;
 
-    if (idea.upvotes?.includes(currentUserId)) {
+    if (idea.my_vote === 'upvote') {
       viewUpvote.classList.add('active');
     } else {
       viewUpvote.classList.remove('active');
     }
 
-    if (idea.downvotes?.includes(currentUserId)) {
+    if (idea.my_vote === 'downvote') {
       viewDownvote.classList.add('active');
     } else {
       viewDownvote.classList.remove('active');
@@ -106,14 +190,15 @@ async function voteIdea(id, type) {
 
     if (res.ok) {
       // Update local copy
+      const idea = withCounts(data);
       const idx = currentIdeas.findIndex(i => i.id === id);
       if (idx !== -1) {
-        currentIdeas[idx] = data;
+        currentIdeas[idx] = idea;
       }
 
       // Update modal if it’s the one open
       if (currentIdeaId === id) {
-        updateModalVotes(data);
+        updateModalVotes(idea);
       }
 
       // Re-render cards (so votes & highlights update)
@@ -134,25 +219,25 @@ function renderIdeas(ideas = currentIdeas) {
   ideasGrid.innerHTML = '';
 
   ideas.forEach(idea => {
-    const upCount = idea.upvotes?.length || 0;
-    const downCount = idea.downvotes?.length || 0;
-    const userUp = idea.upvotes?.includes(currentUserId);
-    const userDown = idea.downvotes?.includes(currentUserId);
+    const ups = upCount(idea);
+    const downs = downCount(idea);
+    const userUp = idea.my_vote === 'upvote';
+    const userDown = idea.my_vote === 'downvote';
     
     const card = document.createElement('div');
     card.className = 'card';
     card.dataset.id = idea.id;
 
     card.innerHTML = `
-      <img src="${idea.image_url || '/uploads/default.png'}" class="thumb" alt="${idea.title}" />
+      <img src="${thumbUrl(idea.image_url) || '/uploads/default.png'}" class="thumb" alt="${idea.title}" loading="lazy" decoding="async" />
       <div class="card-content">
         <h3>${idea.title}</h3>
         <p class="desc">${truncate(idea.description, 180)}</p>
         <div class="meta">
           <span class="chip">${idea.category}</span>
           <span class="votes">
-            <span class="upvote ${userUp ? 'active' : ''}">⬆ ${upCount}</span>
-            <span class="downvote ${userDown ? 'active' : ''}">⬇ ${downCount}</span>
+            <span class="upvote ${userUp ? 'active' : ''}">⬆ ${ups}</span>
+            <span class="downvote ${userDown ? 'active' : ''}">⬇ ${downs}</span>
           </span>
         </div>
       </div>
@@ -197,13 +282,13 @@ ideaForm.addEventListener('submit', async (e) => {
     alert('Failed to submit idea. Please check your inputs.');
     return;
   }
-  const newIdea = await res.json();
+  const newIdea = withCounts(await res.json());
   ideaDialog.close();
   ideaForm.reset();
   // Prepend and re-render
   currentIdeas = [newIdea, ...currentIdeas];
   renderIdeas();
-  updateStats();
+  refreshFacets();
   celebrate();
   // Highlight first card
   const first = ideasGrid.querySelector('.card');
@@ -232,7 +317,7 @@ function openView(idea) {
   currentIdeaId = idea.id;
 
   // Set modal content
-  viewImg.src = idea.image_url || `https://picsum.photos/seed/${idea.id}/800/450`;
+  viewImg.src = webpUrl(idea.image_url) || `https://picsum.photos/seed/${idea.id}/800/450`;
   viewTitle.textContent = idea.title;
   viewDesc.textContent = idea.description;
   viewCategory.textContent = idea.category;
@@ -298,6 +383,90 @@ document.head.appendChild(style);
 // Initial load
 loadIdeas();
 
+// Live updates: the server pushes small deltas instead of us re-fetching the list
+const reloadIdeas = debounce(loadIdeas, 500);
+const refreshFacets = debounce(async () => {
+  const version = listVersion;
+  const counts = await fetchFacets();
+  if (version !== listVersion) return;
+  facets = counts;
+  updateStats();
+}, 500);
+const defaultView = () => !searchInput.value.trim() && categoryFilter.value === 'all' && sortSelect.value === 'newest';
+
+// The server's vote-based orders, so a vote event can re-sort the loaded list in place
+const GRAVITY = 1.8;  // as in trending.py
+const timestamp = s => Date.parse(/Z|[+-]\d\d:\d\d$/.test(s || '') ? s : `${s}Z`) || 0;  // naive means UTC
+const hotScore = i => (upCount(i) - downCount(i)) / ((Math.max(Date.now() - timestamp(i.created_at), 0) / 3600000 + 2) ** GRAVITY);
+const VOTE_ORDERS = {
+  popular: (a, b) => (downCount(a) - upCount(a)) - (downCount(b) - upCount(b)) || a.id - b.id,
+  trending: (a, b) => hotScore(b) - hotScore(a) || a.id - b.id
+};
+
+function patchIdea(id, changes) {
+  const idea = currentIdeas.find(i => i.id === id);
+  if (!idea) return;
+  Object.assign(idea, changes);
+  renderIdeas();
+  if (currentIdeaId === id) updateModalVotes(idea);
+}
+
+// The browser retries a dropped stream by itself, but gives up on an error status
+// (e.g. a 503 from a server with no thread to spare), so open a new one later
+const STREAM_RETRY_MS = 30000;
+let lastEventId = '';
+
+function listen() {
+  const events = new EventSource(lastEventId ? `/api/events?last_event_id=${lastEventId}` : '/api/events');
+  const on = (type, handler) => events.addEventListener(type, e => {
+    lastEventId = e.lastEventId || lastEventId;
+    handler(e);
+  });
+
+  on('vote', e => {
+    // Only the voter who changed is sent, with the new counts
+    const { id, user_id, vote, upvote_count, downvote_count } = JSON.parse(e.data);
+    const idea = currentIdeas.find(i => i.id === id);
+    if (!idea) return;  // not in the list we show
+    Object.assign(idea, { upvote_count, downvote_count });
+    if (user_id === myUserId) idea.my_vote = vote;  // our vote from another tab
+    // Re-sort locally instead of every open page refetching the list on every vote
+    const order = VOTE_ORDERS[sortSelect.value];
+    if (order) currentIdeas.sort(order);
+    renderIdeas();
+    if (currentIdeaId === id) updateModalVotes(idea);
+  });
+  on('idea.updated', e => {
+    const data = JSON.parse(e.data);
+    if (defaultView()) patchIdea(data.id, data);
+    else reloadIdeas();  // the edit may move it in or out of the current filter
+  });
+  on('idea.deleted', e => {
+    const { id } = JSON.parse(e.data);
+    currentIdeas = currentIdeas.filter(i => i.id !== id);
+    renderIdeas();
+    refreshFacets();
+  });
+  on('idea.created', e => {
+    const idea = withCounts(JSON.parse(e.data));
+    if (currentIdeas.some(i => i.id === idea.id)) return;  // our own submission
+    if (defaultView()) {
+      currentIdeas = [idea, ...currentIdeas];
+      renderIdeas();
+      refreshFacets();
+    } else {
+      reloadIdeas();
+    }
+  });
+  on('reset', reloadIdeas);  // missed too much while offline
+  on('ideas.imported', reloadIdeas);
+  events.onerror = () => {
+    if (events.readyState === EventSource.CLOSED) setTimeout(listen, STREAM_RETRY_MS);
+  };
+}
+
+if (window.EventSource) listen();  // resumes with Last-Event-ID on reconnect
+
 async function reportIdea(id) {
   const reason = prompt("Please provide a reason for reporting this idea:");
   if (!reason || !reason.trim()) return; // Cancel if no reason provided
@@ -387,7 +556,7 @@ async function sendMessage() {
 
     // Replace loading with real reply
     loading.remove();
-    chatBox.innerHTML += `<div class="chatbot-msg bot-msg">🤖 ${data.reply}</div>`;
+    chatBox.innerHTML += `<div class="chatbot-msg bot-msg">${res.ok ? '🤖 ' + data.reply : '⚠️ ' + data.error}</div>`;
   } catch (err) {
     loading.remove();
     chatBox.innerHTML += `<div class="chatbot-msg bot-msg">⚠️ Error: ${err.message}</div>`;
@@ -44,10 +44,13 @@ openUploadsBtn.addEventListener('click', async () => {
   ideaDetails.style.display = 'none';
   userIdeasList.innerHTML = '<li>Loading...</li>';
   try {
-    const res = await fetch('/api/ideas');
-    const allIdeas = await res.json();
-    const userId = "{{ session.get('user_id') }}";
-    const userIdeas = allIdeas.filter(i => i.user_id == userId);
+    // Let the server filter to the current user's ideas and send only what the list needs
+    const params = new URLSearchParams({
+      user_id: 'me',
+      fields: 'id,title,description,image_url,created_at'
+    });
+    const res = await fetch(`/api/ideas?${params.toString()}`);
+    const userIdeas = await res.json();
 
     if (userIdeas.length === 0) {
       userIdeasList.innerHTML = '<li>No ideas uploaded yet.</li>';
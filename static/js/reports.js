@@ -1,8 +1,47 @@
-const reports = JSON.parse(document.getElementById("reportsData").textContent);
+// ---------------- Lazy-load Reports ----------------
+const REPORTS_PAGE_SIZE = 20;
+
+function formatDate(createdAt) {
+  return createdAt ? createdAt.slice(0, 19).replace("T", " ") : "";
+}
+
+async function loadReports(item) {
+  const list = item.querySelector(".idea-reports");
+  const moreBtn = item.querySelector(".load-more-reports-btn");
+  const params = new URLSearchParams({ limit: REPORTS_PAGE_SIZE });
+  if (item.dataset.nextCursor) params.set("cursor", item.dataset.nextCursor);
+
+  try {
+    const res = await fetch(`/api/ideas/${item.dataset.ideaId}/reports?${params.toString()}`);
+    if (!res.ok) throw new Error(`HTTP ${res.status}`);
+    const data = await res.json();
+
+    data.reports.forEach((report) => {
+      const li = document.createElement("li");
+      li.dataset.reportId = report.id;
+      const span = document.createElement("span");
+      const em = document.createElement("em");
+      em.textContent = formatDate(report.createdAt);
+      span.append(em, " ", report.description);
+      const delBtn = document.createElement("button");
+      delBtn.className = "delete-report-btn";
+      delBtn.textContent = "Delete";
+      li.append(span, delBtn);
+      list.appendChild(li);
+    });
+
+    item.dataset.loaded = "true";
+    item.dataset.nextCursor = data.next_cursor || "";
+    moreBtn.style.display = data.next_cursor ? "inline-block" : "none";
+  } catch (err) {
+    console.error(err);
+    alert("Failed to load reports.");
+  }
+}
 
 // ---------------- Toggle Reports View ----------------
 document.querySelectorAll(".view-reports-btn").forEach((btn) => {
-  btn.addEventListener("click", () => {
+  btn.addEventListener("click", async () => {
     const parent = btn.closest(".report-item");
     const reportsList = parent.querySelector(".idea-reports");
 
@@ -10,36 +49,44 @@ document.querySelectorAll(".view-reports-btn").forEach((btn) => {
       reportsList.style.display = "none";
       btn.textContent = "View Reports";
     } else {
+      if (!parent.dataset.loaded) await loadReports(parent);
       reportsList.style.display = "block";
       btn.textContent = "Hide Reports";
     }
   });
 });
 
+document.querySelectorAll(".load-more-reports-btn").forEach((btn) => {
+  btn.addEventListener("click", () => loadReports(btn.closest(".report-item")));
+});
+
 // ---------------- Delete Report Functionality ----------------
-document.querySelectorAll(".delete-report-btn").forEach((delBtn) => {
-  delBtn.addEventListener("click", async () => {
-    const reportLi = delBtn.closest("li");
-    const reportId = reportLi.getAttribute("data-report-id");
-
-    if (!confirm("Are you sure you want to delete this report?")) return;
-
-    try {
-      const res = await fetch(`/delete_report/${reportId}`, {
-        method: "DELETE",
-        headers: { "Content-Type": "application/json" },
-      });
-
-      if (res.ok) {
-        reportLi.remove(); // Remove from DOM
-      } else {
-        alert("Failed to delete report.");
-      }
-    } catch (err) {
-      console.error(err);
-      alert("Error deleting report.");
+document.querySelector(".reports-list").addEventListener("click", async (e) => {
+  const delBtn = e.target.closest(".delete-report-btn");
+  if (!delBtn) return;
+
+  const reportLi = delBtn.closest("li");
+  const reportId = reportLi.getAttribute("data-report-id");
+
+  if (!confirm("Are you sure you want to delete this report?")) return;
+
+  try {
+    const res = await fetch(`/delete_report/${reportId}`, {
+      method: "DELETE",
+      headers: { "Content-Type": "application/json" },
+    });
+
+    if (res.ok) {
+      const count = reportLi.closest(".report-item").querySelector(".report-count");
+      if (count) count.textContent = Math.max(parseInt(count.textContent, 10) - 1, 0);
+      reportLi.remove(); // Remove from DOM
+    } else {
+      alert("Failed to delete report.");
     }
-  });
+  } catch (err) {
+    console.error(err);
+    alert("Error deleting report.");
+  }
 });
 
 // ---------------- Delete Ideas Modal ----------------
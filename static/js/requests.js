@@ -26,8 +26,16 @@ async function handleAction(requestId, action) {
   }
 }
 
+// ---------------- Bulk Selection ----------------
+const selectAll = document.getElementById("select-all");
+if (selectAll) {
+  selectAll.addEventListener("change", () => {
+    document.querySelectorAll(".select-request").forEach(box => { box.checked = selectAll.checked; });
+  });
+}
+
 // ---------------- Bind Buttons ----------------
-document.querySelectorAll(".approve").forEach(btn => {
+document.querySelectorAll(".card .approve").forEach(btn => {
   btn.addEventListener("click", e => {
     e.preventDefault();
     const requestId = btn.closest(".card").dataset.id;
@@ -35,7 +43,7 @@ document.querySelectorAll(".approve").forEach(btn => {
   });
 });
 
-document.querySelectorAll(".reject").forEach(btn => {
+document.querySelectorAll(".card .reject").forEach(btn => {
   btn.addEventListener("click", e => {
     e.preventDefault();
     const requestId = btn.closest(".card").dataset.id;
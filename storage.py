@@ -0,0 +1,1132 @@
+import os
+import re
+import json
+import time
+import queue
+import threading
+import functools
+import itertools
+from concurrent.futures import Future
+
+import db
+import images
+import metrics
+import snapshot
+
+IDEAS_DB = 'ideas.db'
+
+# Group commit: writes arriving within this window share one transaction
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX_BATCH = 256
+
+# Change events for /api/events; older rows are pruned as new ones arrive
+EVENT_RETENTION = 10000
+
+# Optional: back the idea cache with memory-mapped snapshots (snapshot.py)
+# in this folder instead of per-process dicts. None keeps the dicts.
+SNAPSHOT_FOLDER = None
+SNAPSHOT_KEEP = 60  # seconds an outdated snapshot file is left for other workers
+
+# Legacy flat files, only read once by migrate_from_json()
+IDEAS_FILE = 'ideas.json'
+REPORTS_FILE = 'reports.json'
+
+IDEA_COLUMNS = ('id', 'user_id', 'title', 'description', 'category', 'image_url', 'created_at',
+                'upvote_count', 'downvote_count')
+EDITABLE_FIELDS = ('title', 'description', 'category', 'image_url')
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS ideas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        title TEXT NOT NULL DEFAULT '',
+        description TEXT NOT NULL DEFAULT '',
+        category TEXT NOT NULL DEFAULT '',
+        image_url TEXT NOT NULL DEFAULT '',
+        created_at TEXT,
+        upvote_count INTEGER NOT NULL DEFAULT 0,
+        downvote_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_ideas_user_id ON ideas (user_id);
+    CREATE INDEX IF NOT EXISTS idx_ideas_category ON ideas (category COLLATE NOCASE);
+
+    CREATE TABLE IF NOT EXISTS votes (
+        idea_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        vote_type TEXT NOT NULL CHECK (vote_type IN ('upvote', 'downvote')),
+        created_at TEXT,
+        PRIMARY KEY (idea_id, user_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_votes_user_id ON votes (user_id);
+
+    CREATE TABLE IF NOT EXISTS reports (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        idea_id INTEGER NOT NULL,
+        idea_title TEXT NOT NULL DEFAULT '',
+        user_id INTEGER,
+        description TEXT NOT NULL DEFAULT '',
+        created_at TEXT NOT NULL
+    );
+    DROP INDEX IF EXISTS idx_reports_idea_id;
+    CREATE INDEX IF NOT EXISTS idx_reports_idea_created ON reports (idea_id, created_at, id);
+    CREATE INDEX IF NOT EXISTS idx_reports_user_id ON reports (user_id);
+
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        type TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+
+    -- Background work (see jobs.py). A claimed job's run_after is pushed out
+    -- by the lease, so a job whose worker died is picked up again later.
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL DEFAULT '{}',
+        key TEXT UNIQUE,
+        status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'failed')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after REAL NOT NULL,
+        last_error TEXT,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (run_after) WHERE status = 'pending';
+'''
+
+# Stored in PRAGMA user_version once setup is complete; bump it whenever
+# SCHEMA, COLUMN_UPGRADES, TOMBSTONE_SCHEMA, COUNTER_SCHEMA, FACET_SCHEMA or FTS_SCHEMA change
+SCHEMA_VERSION = 3
+
+# Columns added after the first release, applied to older databases on startup
+COLUMN_UPGRADES = (
+    ('ideas', 'upvote_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('ideas', 'downvote_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('votes', 'created_at', 'TEXT'),
+    ('ideas', 'report_count', 'INTEGER NOT NULL DEFAULT 0'),
+    ('ideas', 'deleted_at', 'TEXT'),
+)
+
+# Deleted ideas are tombstoned (deleted_at set) and hidden from every read at
+# once; a purge_idea job removes the row, its votes and reports afterwards.
+TOMBSTONE_SCHEMA = '''
+    CREATE INDEX IF NOT EXISTS idx_ideas_deleted ON ideas (id) WHERE deleted_at IS NOT NULL;
+'''
+# Reports stay hidden while their idea waits to be purged
+LIVE_REPORTS = 'idea_id NOT IN (SELECT id FROM ideas WHERE deleted_at IS NOT NULL)'
+
+# Same format as datetime.utcnow().isoformat(), for timestamps set inside SQL
+SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+
+# Keep ideas.upvote_count / downvote_count / report_count equal to the rows in
+# votes and reports, inside the same transaction as the change. Note REPLACE
+# conflicts do not fire the delete trigger, so votes must be changed with
+# UPDATE, not INSERT OR REPLACE.
+COUNTER_SCHEMA = '''
+    CREATE TRIGGER IF NOT EXISTS votes_count_insert AFTER INSERT ON votes BEGIN
+        UPDATE ideas SET upvote_count = upvote_count + (new.vote_type = 'upvote'),
+                         downvote_count = downvote_count + (new.vote_type = 'downvote')
+        WHERE id = new.idea_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS votes_count_delete AFTER DELETE ON votes BEGIN
+        UPDATE ideas SET upvote_count = upvote_count - (old.vote_type = 'upvote'),
+                         downvote_count = downvote_count - (old.vote_type = 'downvote')
+        WHERE id = old.idea_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS votes_count_update AFTER UPDATE OF vote_type ON votes BEGIN
+        UPDATE ideas SET upvote_count = upvote_count - (old.vote_type = 'upvote') + (new.vote_type = 'upvote'),
+                         downvote_count = downvote_count - (old.vote_type = 'downvote') + (new.vote_type = 'downvote')
+        WHERE id = new.idea_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS reports_count_insert AFTER INSERT ON reports BEGIN
+        UPDATE ideas SET report_count = report_count + 1 WHERE id = new.idea_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS reports_count_delete AFTER DELETE ON reports BEGIN
+        UPDATE ideas SET report_count = report_count - 1 WHERE id = old.idea_id;
+    END;
+
+    -- Moderation summary: reported ideas only, most reported first
+    CREATE INDEX IF NOT EXISTS idx_ideas_reported ON ideas (report_count DESC, id) WHERE report_count > 0;
+'''
+
+# Live ideas per category (lower-cased, the way GET /api/ideas matches it),
+# kept by triggers so inserts, imports, edits and tombstones all count.
+# Tombstoned rows were already taken off when deleted_at was set, so the
+# purge that removes them later changes nothing.
+FACET_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS category_counts (
+        category TEXT PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TRIGGER IF NOT EXISTS ideas_facet_insert AFTER INSERT ON ideas WHEN new.deleted_at IS NULL BEGIN
+        INSERT INTO category_counts (category, count) VALUES (lower(new.category), 1)
+        ON CONFLICT (category) DO UPDATE SET count = count + 1;
+    END;
+    CREATE TRIGGER IF NOT EXISTS ideas_facet_delete AFTER DELETE ON ideas WHEN old.deleted_at IS NULL BEGIN
+        UPDATE category_counts SET count = count - 1 WHERE category = lower(old.category);
+    END;
+    CREATE TRIGGER IF NOT EXISTS ideas_facet_update AFTER UPDATE OF category, deleted_at ON ideas
+    WHEN lower(old.category) IS NOT lower(new.category) OR old.deleted_at IS NOT new.deleted_at BEGIN
+        UPDATE category_counts SET count = count - 1
+        WHERE category = lower(old.category) AND old.deleted_at IS NULL;
+        INSERT INTO category_counts (category, count)
+        SELECT lower(new.category), 1 WHERE new.deleted_at IS NULL
+        ON CONFLICT (category) DO UPDATE SET count = count + 1;
+    END;
+'''
+
+# Full-text index over ideas, kept in sync row by row by the triggers below.
+# The prefix indexes make short type-ahead prefixes cheap to expand.
+FTS_SCHEMA = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS ideas_fts USING fts5 (
+        title, description, category,
+        content='ideas', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_insert AFTER INSERT ON ideas BEGIN
+        INSERT INTO ideas_fts (rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END;
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_delete AFTER DELETE ON ideas BEGIN
+        INSERT INTO ideas_fts (ideas_fts, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+    END;
+    CREATE TRIGGER IF NOT EXISTS ideas_fts_update AFTER UPDATE OF title, description, category ON ideas BEGIN
+        INSERT INTO ideas_fts (ideas_fts, rowid, title, description, category)
+        VALUES ('delete', old.id, old.title, old.description, old.category);
+        INSERT INTO ideas_fts (rowid, title, description, category)
+        VALUES (new.id, new.title, new.description, new.category);
+    END;
+'''
+
+# bm25() column weights: a hit in the title counts most, then category
+FTS_WEIGHTS = (10.0, 1.0, 4.0)
+
+# Sort orders precomputed for GET /api/ideas ('trending' lives in trending.py).
+# Each key is an ascending,
+# unique tuple (ties broken by id) so it doubles as a keyset cursor.
+SORT_KEYS = {
+    'newest': lambda i: (-i['id'],),
+    'popular': lambda i: (i['downvote_count'] - i['upvote_count'], i['id']),
+}
+ID_ORDER = lambda i: (i['id'],)
+
+# ---------------- Connections ----------------
+_pool = db.ConnectionPool(IDEAS_DB)
+
+def connect():
+    """A dedicated connection (for the writer thread and the one-off migration)."""
+    return db.connect(IDEAS_DB)
+
+def transaction(immediate=False):
+    """Yield a pooled connection whose statements commit (or roll back) together."""
+    return _pool.transaction(immediate)
+
+# ---------------- Group Commit ----------------
+class GroupCommitter:
+    """Single writer thread that commits concurrent write operations in batches.
+
+    Request threads hand an operation to run(), which blocks until the batch
+    containing it has committed. The writer takes the first queued operation,
+    gathers whatever else arrives within `window` seconds (up to `max_batch`),
+    and runs them all in one BEGIN IMMEDIATE transaction. So N concurrent votes
+    cost one commit instead of N. Each operation runs inside its own SAVEPOINT,
+    so one that raises is rolled back and reported to its caller alone.
+    SQLite's file lock keeps batches from different worker processes apart.
+    """
+
+    def __init__(self, window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {'batches': 0, 'operations': 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn(conn, *args, **kwargs) in the next group commit and return its result."""
+        self._start()
+        future = Future()
+        with metrics.span('sqlite_write'):  # includes waiting for the batch to commit
+            self._queue.put((fn, args, kwargs, future))
+            return future.result()
+
+    def _start(self):
+        # Started lazily, and again in a forked worker where the thread is gone
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        conn = connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, kwargs, future in batch:
+                conn.execute('SAVEPOINT op')
+                try:
+                    result = fn(conn, *args, **kwargs)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    results.append((future, None, e))
+                else:
+                    conn.execute('RELEASE op')
+                    results.append((future, result, None))
+            _touch_data_version(conn)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            for _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.stats['batches'] += 1
+        self.stats['operations'] += len(batch)
+        bump_version()
+        for listener in _commit_listeners:
+            listener()
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+_writer = GroupCommitter()
+_commit_listeners = []
+
+def add_commit_listener(fn):
+    """Call fn() (on the writer thread) after each batch this process commits."""
+    _commit_listeners.append(fn)
+
+def group_commit(fn):
+    """Turn fn(conn, ...) into fn(...) that runs through the shared group committer."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return _writer.run(fn, *args, **kwargs)
+    return wrapper
+
+# ---------------- Idea Cache ----------------
+# Parsed idea list plus derived sort orders, shared by every request in this
+# process. It is keyed on a local version counter (bumped by every write made
+# here) and on the database files' mtimes, which change when another worker
+# process writes. by_category lists each category's ideas (in id order) so a
+# category filter only walks the ideas it can match.
+#
+# With SNAPSHOT_FOLDER set, the same structures are views over a snapshot
+# file instead: written once per data version by whichever worker gets
+# there first, then mapped by all of them, so the pages are shared.
+_cache_lock = threading.Lock()
+_cache = {'key': None, 'ideas': [], 'orders': {}, 'by_id': {}, 'by_category': {}, 'category_ids': {},
+          'facets': {}, 'data_version': (0, None), 'snapshot': None}
+_cache_stats = {'hits': 0, 'misses': 0}
+_version = 0
+_versions = itertools.count(1)
+
+def bump_version():
+    # Lock-free (next() on a count is atomic), so a write never waits behind a cache reload
+    global _version
+    _version = next(_versions)
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _cache_key():
+    return _version, _file_stamp(IDEAS_DB), _file_stamp(IDEAS_DB + '-wal')
+
+def _reload_cache():
+    """Refresh the cache if the data changed; call with _cache_lock held."""
+    key = _cache_key()
+    if _cache['key'] == key:
+        _cache_stats['hits'] += 1
+        return
+    _cache_stats['misses'] += 1
+    # Stamp with the key (and data version) taken before reading so a
+    # concurrent write can only cause an extra reload, never a stale hit.
+    with metrics.span('cache_reload'):
+        data_version = read_data_version()
+        facets = category_counts()
+        if SNAPSHOT_FOLDER:
+            snap = _open_snapshot(data_version)
+            _cache.update(key=key, ideas=snap.ideas(), orders={}, by_id=snap,
+                          by_category={name: snap.category(name) for name in snap.categories()},
+                          category_ids={}, facets=facets, data_version=data_version, snapshot=snap)
+            return
+        ideas = list_ideas()
+    by_category = {}
+    for idea in ideas:
+        by_category.setdefault(idea['category'].lower(), []).append(idea)
+    _cache.update(key=key, ideas=ideas, orders={}, by_id={i['id']: i for i in ideas},
+                  by_category=by_category, category_ids={}, facets=facets, data_version=data_version,
+                  snapshot=None)
+
+def cached_ideas(sort=None, category=None):
+    """Return the cached idea list, ordered by one of SORT_KEYS if given.
+
+    With a (lower-case) category only that category's ideas are returned.
+    The dicts are shared between requests and must be treated as read-only.
+    """
+    with _cache_lock:
+        _reload_cache()
+        ideas = _cache['ideas'] if category is None else _cache['by_category'].get(category, [])
+        if sort not in SORT_KEYS:
+            return ideas
+        ordered = _cache['orders'].get((sort, category))
+        if ordered is None:
+            snap = _cache['snapshot']
+            ordered = snap.ordered(sort, category) if snap is not None else None
+            if ordered is None:
+                ordered = sorted(ideas, key=SORT_KEYS[sort])
+            _cache['orders'][sort, category] = ordered
+        return ordered
+
+def cached_ideas_by_ids(ids):
+    """Look up cached ideas for the given ids, keeping their order."""
+    cached_ideas()
+    by_id = _cache['by_id']
+    if isinstance(by_id, snapshot.Snapshot):
+        return by_id.select(ids)
+    return [by_id[i] for i in ids if i in by_id]
+
+def cached_category_ids(category):
+    """The set of cached idea ids in one (lower-case) category, for filtering id lists."""
+    with _cache_lock:
+        _reload_cache()
+        ids = _cache['category_ids'].get(category)
+        if ids is None:
+            ids = _cache['category_ids'][category] = frozenset(
+                i['id'] for i in _cache['by_category'].get(category, ()))
+        return ids
+
+def cached_facets(ids=None):
+    """{category: live idea count}, from category_counts, or counted over the given ids."""
+    cached_ideas()
+    if ids is None:
+        return dict(_cache['facets'])
+    by_id, counts = _cache['by_id'], {}
+    for idea_id in ids:
+        idea = by_id.get(idea_id)
+        if idea is not None:
+            category = idea['category'].lower()
+            counts[category] = counts.get(category, 0) + 1
+    return counts
+
+def data_version():
+    """(version, modified) of the idea/vote/report data, shared by all worker processes.
+
+    The version goes up with every committed write batch; `modified` is the
+    commit time as an ISO-8601 UTC string. Served from the idea cache.
+    """
+    cached_ideas()
+    return _cache['data_version']
+
+def cache_stats():
+    with _cache_lock:
+        snap = _cache['snapshot']
+        return {**_cache_stats, 'version': _version, 'cached_ideas': len(_cache['ideas']),
+                'cached_categories': len(_cache['by_category']),
+                'snapshot': os.path.basename(snap.path) if snap is not None else None,
+                'group_commit': dict(_writer.stats), 'connections': dict(_pool.stats)}
+
+# ---------------- Snapshots ----------------
+def _snapshot_path(version):
+    return os.path.join(SNAPSHOT_FOLDER, f'ideas-{version}.snap')
+
+def _open_snapshot(data_version):
+    """Map the snapshot of this data version, writing it first if no worker has yet."""
+    path = _snapshot_path(data_version[0])
+    try:
+        snap = snapshot.Snapshot(path)
+        if snap.data_version == data_version:
+            return snap
+    except (FileNotFoundError, snapshot.SnapshotError):
+        pass
+    with metrics.span('snapshot_write'):
+        path = write_snapshot()
+    _prune_snapshots(keep=path)
+    return snapshot.Snapshot(path)
+
+def write_snapshot(folder=None):
+    """Write a snapshot of the live ideas into `folder` (default SNAPSHOT_FOLDER); returns its path.
+
+    Reads in one transaction, so the snapshot matches the data version it is named after.
+    """
+    folder = folder or SNAPSHOT_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    with transaction() as conn:
+        conn.execute('BEGIN')  # one read snapshot for the version and the rows
+        rows = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('data_version', 'data_modified')"))
+        data_version = int(rows.get('data_version', 0)), rows.get('data_modified')
+        path = os.path.join(folder, f'ideas-{data_version[0]}.snap')
+        snapshot.write(path, _idea_rows(conn), data_version, SORT_KEYS)
+    return path
+
+def _prune_snapshots(keep):
+    cutoff = time.time() - SNAPSHOT_KEEP
+    for entry in os.scandir(os.path.dirname(keep)):
+        if entry.name.endswith('.snap') and entry.path != keep:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)  # workers still mapping it keep their pages
+            except FileNotFoundError:
+                pass
+
+# ---------------- Data Version ----------------
+def _touch_data_version(conn):
+    """Record a committed change; call inside the writing transaction."""
+    conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key='data_version'")
+    conn.execute(f"UPDATE meta SET value = {SQL_NOW} WHERE key='data_modified'")
+
+def read_data_version():
+    with transaction() as conn:
+        rows = dict(conn.execute("SELECT key, value FROM meta WHERE key IN ('data_version', 'data_modified')"))
+    return int(rows.get('data_version', 0)), rows.get('data_modified')
+
+# ---------------- Change Events ----------------
+def _emit(conn, event_type, data):
+    """Append a change event inside the writing transaction, so it commits (or not) with the change."""
+    cur = conn.execute(f'INSERT INTO events (type, data, created_at) VALUES (?, ?, {SQL_NOW})',
+                       (event_type, json.dumps(data)))
+    if cur.lastrowid % 256 == 0:
+        conn.execute('DELETE FROM events WHERE id <= ?', (cur.lastrowid - EVENT_RETENTION,))
+
+def events_after(after_id, limit=1000):
+    """(id, type, data_json) of events newer than after_id, oldest first."""
+    with transaction() as conn:
+        return [tuple(row) for row in conn.execute(
+            'SELECT id, type, data FROM events WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))]
+
+def event_bounds():
+    """(oldest retained id, newest id); (None, last id) if the log is empty."""
+    with transaction() as conn:
+        oldest, newest = conn.execute('SELECT min(id), max(id) FROM events').fetchone()
+        if newest is None:
+            seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='events'").fetchone()
+            newest = seq[0] if seq else 0
+    return oldest, newest
+
+# ---------------- Setup & Migration ----------------
+def configure(ideas_db, ideas_file, reports_file, snapshot_folder=None):
+    """Use other data files (see create_app); drops pooled connections and the cache."""
+    global IDEAS_DB, IDEAS_FILE, REPORTS_FILE, SNAPSHOT_FOLDER, _pool, _writer
+    if ideas_db != IDEAS_DB:
+        _pool.close_all()
+        _pool = db.ConnectionPool(ideas_db)
+        _writer = GroupCommitter()
+    IDEAS_DB, IDEAS_FILE, REPORTS_FILE = ideas_db, ideas_file, reports_file
+    SNAPSHOT_FOLDER = snapshot_folder
+    with _cache_lock:
+        _cache['key'] = None
+
+def close_connections():
+    """Close idle pooled connections, e.g. in a preloading master before it forks."""
+    _pool.close_all()
+
+def init_store():
+    """Create or upgrade the schema and import the legacy JSON files.
+
+    A database already at SCHEMA_VERSION costs a single PRAGMA read, so
+    every worker can call this on startup.
+    """
+    with transaction() as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', '0')")
+        conn.execute(f"INSERT OR IGNORE INTO meta (key, value) VALUES ('data_modified', {SQL_NOW})")
+        added = _add_missing_columns(conn)
+        if 'ideas.upvote_count' in added or 'ideas.report_count' in added:
+            _recount(conn)
+        conn.executescript(TOMBSTONE_SCHEMA)
+        conn.executescript(COUNTER_SCHEMA)
+        has_facets = conn.execute("SELECT 1 FROM sqlite_master WHERE name='category_counts'").fetchone()
+        conn.executescript(FACET_SCHEMA)
+        if not has_facets:
+            _recount_categories(conn)
+        has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name='ideas_fts'").fetchone()
+        conn.executescript(FTS_SCHEMA)
+        if not has_fts:
+            # Index rows that existed before the search index was added
+            conn.execute("INSERT INTO ideas_fts (ideas_fts) VALUES ('rebuild')")
+    migrate_from_json()
+    with transaction() as conn:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def load_json(file):
+    """Read a legacy JSON list; a missing file is empty, a corrupt one is an error.
+
+    Treating a truncated file as [] would mark the import done with no data.
+    """
+    if not os.path.exists(file):
+        return []
+    with open(file, 'r') as f:
+        try:
+            return json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{file} is not valid JSON ({e}); fix or remove it before starting") from e
+
+def migrate_from_json(ideas_file=None, reports_file=None):
+    """Copy ideas.json / reports.json into the database exactly once.
+
+    The JSON files are left on disk untouched so they can serve as a backup.
+    Returns True if a migration ran.
+    """
+    ideas_file = ideas_file or IDEAS_FILE
+    reports_file = reports_file or REPORTS_FILE
+    conn = connect()
+    try:
+        # IMMEDIATE takes the write lock up front so two workers starting
+        # together cannot both import the files.
+        conn.execute('BEGIN IMMEDIATE')
+        done = conn.execute("SELECT 1 FROM meta WHERE key='json_migrated'").fetchone()
+        if done:
+            conn.rollback()
+            return False
+
+        for idea in load_json(ideas_file):
+            conn.execute(
+                'INSERT OR REPLACE INTO ideas (id, user_id, title, description, category, image_url, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (idea.get('id'), idea.get('user_id'), idea.get('title', ''), idea.get('description', ''),
+                 idea.get('category', ''), idea.get('image_url', ''), idea.get('created_at')))
+            for vote_type in ('upvote', 'downvote'):
+                conn.executemany(
+                    'INSERT OR REPLACE INTO votes (idea_id, user_id, vote_type) VALUES (?, ?, ?)',
+                    [(idea.get('id'), int(uid), vote_type) for uid in idea.get(vote_type + 's', [])])
+
+        for report in load_json(reports_file):
+            conn.execute(
+                'INSERT OR REPLACE INTO reports (id, idea_id, idea_title, user_id, description, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (report.get('id'), report.get('idea_id'), report.get('idea_title', ''), report.get('user_id'),
+                 report.get('description', ''), report.get('createdAt', '')))
+
+        _recount(conn)
+        _touch_data_version(conn)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', '1')")
+        conn.commit()
+        bump_version()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def _add_missing_columns(conn):
+    """Apply COLUMN_UPGRADES to an older database; returns the 'table.column' names added."""
+    added = []
+    for table, name, decl in COLUMN_UPGRADES:
+        existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+            added.append(f'{table}.{name}')
+    return added
+
+def _recount(conn):
+    """Recompute every idea's vote and report counters from the votes and reports tables."""
+    conn.execute('''
+        UPDATE ideas SET
+            upvote_count = (SELECT COUNT(*) FROM votes WHERE idea_id = ideas.id AND vote_type = 'upvote'),
+            downvote_count = (SELECT COUNT(*) FROM votes WHERE idea_id = ideas.id AND vote_type = 'downvote'),
+            report_count = (SELECT COUNT(*) FROM reports WHERE idea_id = ideas.id)
+    ''')
+
+def _recount_categories(conn):
+    """Rebuild category_counts from the live ideas."""
+    conn.execute('DELETE FROM category_counts')
+    conn.execute('INSERT INTO category_counts (category, count) '
+                 'SELECT lower(category), COUNT(*) FROM ideas WHERE deleted_at IS NULL GROUP BY lower(category)')
+
+# ---------------- Row Helpers ----------------
+def _idea_dict(row, upvotes, downvotes):
+    idea = {col: row[col] for col in IDEA_COLUMNS}
+    idea['upvotes'] = upvotes
+    idea['downvotes'] = downvotes
+    return idea
+
+def _report_dict(row):
+    return {
+        "id": row['id'],
+        "idea_id": row['idea_id'],
+        "idea_title": row['idea_title'],
+        "user_id": row['user_id'],
+        "description": row['description'],
+        "createdAt": row['created_at'],
+    }
+
+def _fetch_idea(conn, idea_id):
+    row = conn.execute('SELECT * FROM ideas WHERE id=? AND deleted_at IS NULL', (idea_id,)).fetchone()
+    if not row:
+        return None
+    up, down = [], []
+    for vote in conn.execute('SELECT user_id, vote_type FROM votes WHERE idea_id=? ORDER BY rowid', (idea_id,)):
+        (up if vote['vote_type'] == 'upvote' else down).append(vote['user_id'])
+    return _idea_dict(row, up, down)
+
+def _idea_rows(conn):
+    """Stream every live idea as a dict with its voters, in id order."""
+    votes = conn.execute('SELECT idea_id, user_id, vote_type FROM votes ORDER BY idea_id')
+    vote = votes.fetchone()
+    for row in conn.execute('SELECT * FROM ideas WHERE deleted_at IS NULL ORDER BY id'):
+        while vote is not None and vote['idea_id'] < row['id']:
+            vote = votes.fetchone()  # votes of ideas that no longer exist
+        up, down = [], []
+        while vote is not None and vote['idea_id'] == row['id']:
+            (up if vote['vote_type'] == 'upvote' else down).append(vote['user_id'])
+            vote = votes.fetchone()
+        yield _idea_dict(row, up, down)
+
+# ---------------- Ideas ----------------
+def list_ideas():
+    with transaction() as conn:
+        rows = conn.execute('SELECT * FROM ideas WHERE deleted_at IS NULL ORDER BY id').fetchall()
+        votes = {}
+        for vote in conn.execute('SELECT idea_id, user_id, vote_type FROM votes ORDER BY rowid'):
+            up, down = votes.setdefault(vote['idea_id'], ([], []))
+            (up if vote['vote_type'] == 'upvote' else down).append(vote['user_id'])
+    return [_idea_dict(row, *votes.get(row['id'], ([], []))) for row in rows]
+
+def category_counts():
+    with transaction() as conn:
+        return {row[0]: row[1] for row in conn.execute(
+            'SELECT category, count FROM category_counts WHERE count > 0 ORDER BY category')}
+
+@metrics.timed('sqlite_read')
+def get_idea(idea_id):
+    with transaction() as conn:
+        return _fetch_idea(conn, idea_id)
+
+@group_commit
+def create_idea(conn, user_id, title, description, category, created_at, image_url=''):
+    cur = conn.execute(
+        'INSERT INTO ideas (user_id, title, description, category, image_url, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (user_id, title, description, category, image_url, created_at))
+    idea = _fetch_idea(conn, cur.lastrowid)
+    _emit(conn, 'idea.created', idea)
+    return idea
+
+@group_commit
+def update_idea(conn, idea_id, fields, user_id=None):
+    """Update the given editable fields; returns False if no row matched.
+
+    When user_id is passed the update only applies to ideas owned by that user.
+    """
+    fields = {k: v for k, v in fields.items() if k in EDITABLE_FIELDS}
+    if not fields:
+        return conn.execute('SELECT 1 FROM ideas WHERE id=? AND deleted_at IS NULL', (idea_id,)).fetchone() is not None
+    sql = 'UPDATE ideas SET ' + ', '.join(f'{k}=?' for k in fields) + ' WHERE id=? AND deleted_at IS NULL'
+    params = [*fields.values(), idea_id]
+    if user_id is not None:
+        sql += ' AND user_id=?'
+        params.append(user_id)
+    if conn.execute(sql, params).rowcount == 0:
+        return False
+    _emit(conn, 'idea.updated', {'id': idea_id, **fields})
+    return True
+
+@group_commit
+def delete_idea(conn, idea_id):
+    """Tombstone an idea and queue the purge of its votes, reports and image.
+
+    Two single-row writes, however many votes and reports the idea has.
+    """
+    if conn.execute(f'UPDATE ideas SET deleted_at={SQL_NOW} WHERE id=? AND deleted_at IS NULL',
+                    (idea_id,)).rowcount == 0:
+        return False
+    _enqueue(conn, 'purge_idea', {'id': idea_id})
+    _emit(conn, 'idea.deleted', {'id': idea_id})
+    return True
+
+@group_commit
+def delete_user_content(conn, user_id):
+    """Tombstone a deleted account's ideas, drop their votes and queue the purge of the rest.
+
+    The votes go in this transaction, so no voter list or count shows the
+    account after it is gone; that is one indexed delete of a row per idea
+    they voted on. Their reports and tombstoned ideas are left to the jobs.
+    """
+    idea_ids = [row[0] for row in conn.execute(
+        f'UPDATE ideas SET deleted_at={SQL_NOW} WHERE user_id=? AND deleted_at IS NULL RETURNING id', (user_id,))]
+    for idea_id in idea_ids:
+        _enqueue(conn, 'purge_idea', {'id': idea_id})
+        _emit(conn, 'idea.deleted', {'id': idea_id})
+    voted = [row[0] for row in conn.execute('DELETE FROM votes WHERE user_id=? RETURNING idea_id', (user_id,))]
+    # The counters followed through the triggers; open pages get the same delta as for an unvote
+    for row in conn.execute('SELECT id, upvote_count, downvote_count FROM ideas '
+                            'WHERE deleted_at IS NULL AND id IN (SELECT value FROM json_each(?))',
+                            (json.dumps(voted),)):
+        _emit(conn, 'vote', {'id': row['id'], 'user_id': user_id, 'vote': None,
+                             'upvote_count': row['upvote_count'], 'downvote_count': row['downvote_count']})
+    _enqueue(conn, 'purge_user', {'user_id': user_id})
+    return len(idea_ids)
+
+# ---------------- Search ----------------
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{w}"*' for w in words)
+
+@metrics.timed('search')
+def search_idea_ids(text, limit=None):
+    """Return ids of ideas matching every word of text, best match first.
+
+    Words match on prefix ("edu" finds "EduBoost"), so this also serves
+    type-ahead. Returns None when text contains no searchable words.
+    """
+    query = _fts_query(text)
+    if not query:
+        return None
+    sql = ('SELECT rowid FROM ideas_fts WHERE ideas_fts MATCH ? '
+           'AND rowid NOT IN (SELECT id FROM ideas WHERE deleted_at IS NOT NULL) '
+           'ORDER BY bm25(ideas_fts, ?, ?, ?)')
+    params = [query, *FTS_WEIGHTS]
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    with transaction() as conn:
+        return [row[0] for row in conn.execute(sql, params)]
+
+# ---------------- Votes ----------------
+@group_commit
+def toggle_vote(conn, idea_id, user_id, vote_type):
+    """Apply the up/down toggle for one user and return the updated idea.
+
+    Voting the same way twice removes the vote; voting the other way switches it.
+    Each case is a single primary-key write on votes; the idea's counters
+    follow through the votes_count_* triggers. Returns None if the idea does
+    not exist.
+    """
+    if not conn.execute('SELECT 1 FROM ideas WHERE id=? AND deleted_at IS NULL', (idea_id,)).fetchone():
+        return None
+    if vote_type not in ('upvote', 'downvote'):
+        return _fetch_idea(conn, idea_id)
+
+    current = conn.execute('SELECT vote_type FROM votes WHERE idea_id=? AND user_id=?',
+                           (idea_id, user_id)).fetchone()
+    if current is None:
+        conn.execute(f'INSERT INTO votes (idea_id, user_id, vote_type, created_at) '
+                     f'VALUES (?, ?, ?, {SQL_NOW})',
+                     (idea_id, user_id, vote_type))
+    elif current['vote_type'] == vote_type:
+        conn.execute('DELETE FROM votes WHERE idea_id=? AND user_id=?', (idea_id, user_id))
+        vote_type = None
+    else:
+        conn.execute(f'UPDATE votes SET vote_type=?, created_at={SQL_NOW} WHERE idea_id=? AND user_id=?',
+                     (vote_type, idea_id, user_id))
+    idea = _fetch_idea(conn, idea_id)
+    # Only what changed: the voter lists can be long and every open stream gets this
+    _emit(conn, 'vote', {'id': idea_id, 'user_id': user_id, 'vote': vote_type,
+                         'upvote_count': idea['upvote_count'], 'downvote_count': idea['downvote_count']})
+    return idea
+
+# ---------------- Reports ----------------
+@group_commit
+def create_report(conn, idea_id, user_id, description, created_at):
+    """Insert a report for an existing idea; returns None if the idea is missing."""
+    idea = conn.execute('SELECT title FROM ideas WHERE id=? AND deleted_at IS NULL', (idea_id,)).fetchone()
+    if not idea:
+        return None
+    cur = conn.execute(
+        'INSERT INTO reports (idea_id, idea_title, user_id, description, created_at) VALUES (?, ?, ?, ?, ?)',
+        (idea_id, idea['title'], user_id, description, created_at))
+    row = conn.execute('SELECT * FROM reports WHERE id=?', (cur.lastrowid,)).fetchone()
+    count = conn.execute('SELECT report_count FROM ideas WHERE id=?', (idea_id,)).fetchone()[0]
+    _emit(conn, 'idea.reported', {'id': idea_id, 'report_count': count})
+    return _report_dict(row)
+
+@metrics.timed('sqlite_read')
+def list_reports(idea_id=None):
+    with transaction() as conn:
+        if idea_id is None:
+            rows = conn.execute(f'SELECT * FROM reports WHERE {LIVE_REPORTS} ORDER BY id').fetchall()
+        else:
+            rows = conn.execute(f'SELECT * FROM reports WHERE idea_id=? AND {LIVE_REPORTS} ORDER BY id',
+                                (idea_id,)).fetchall()
+    return [_report_dict(row) for row in rows]
+
+@metrics.timed('sqlite_read')
+def report_page(idea_id, limit, after=None):
+    """One page of an idea's reports, newest first.
+
+    `after` is the (created_at, id) of the last report on the previous page.
+    """
+    sql = f'SELECT * FROM reports WHERE idea_id=? AND {LIVE_REPORTS}'
+    params = [idea_id]
+    if after:
+        sql += ' AND (created_at < ? OR (created_at = ? AND id < ?))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY created_at DESC, id DESC LIMIT ?'
+    params.append(limit)
+    with transaction() as conn:
+        return [_report_dict(row) for row in conn.execute(sql, params)]
+
+@metrics.timed('sqlite_read')
+def reported_ideas(limit, after=None):
+    """One page of ideas that have reports, most reported first.
+
+    Reads the maintained report_count through idx_ideas_reported; `after` is
+    the (report_count, id) of the last idea on the previous page.
+    """
+    sql = ('SELECT id, title, category, created_at, report_count FROM ideas '
+           'WHERE report_count > 0 AND deleted_at IS NULL')
+    params = []
+    if after:
+        sql += ' AND (report_count < ? OR (report_count = ? AND id > ?))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY report_count DESC, id LIMIT ?'
+    params.append(limit)
+    with transaction() as conn:
+        return [dict(row) for row in conn.execute(sql, params)]
+
+@group_commit
+def delete_report(conn, report_id):
+    return conn.execute('DELETE FROM reports WHERE id=?', (report_id,)).rowcount > 0
+
+# ---------------- Import / Export ----------------
+# One JSON object per line: {"type": "idea", ...} with the idea's voters
+# inline, as in ideas.json, or {"type": "report", ...} as in reports.json.
+IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 100  # reported back in full; later ones are only counted
+
+def export_records():
+    """Yield every idea (with its votes), then every report, as export records.
+
+    Runs in one read transaction, so the export is a consistent snapshot,
+    and walks the tables with cursors, so memory use does not grow with
+    the data set. Votes are merged in from a second cursor in idea order.
+    """
+    with transaction() as conn:
+        conn.execute('BEGIN')  # hold one snapshot for the whole walk
+        for idea in _idea_rows(conn):
+            record = {'type': 'idea'}
+            record.update((k, v) for k, v in idea.items() if not k.endswith('_count'))
+            yield record
+        for row in conn.execute(f'SELECT * FROM reports WHERE {LIVE_REPORTS} ORDER BY id'):
+            yield {'type': 'report', **_report_dict(row)}
+
+def _check(record, key, kind, required=False):
+    value = record.get(key)
+    if value is None:
+        if required:
+            raise ValueError(f'{key} is required')
+        return None
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ValueError(f'{key} must be {"an integer" if kind is int else "a string"}')
+    return value
+
+def parse_record(record):
+    """Validate one export record; returns ('idea' | 'report', row tuple) or raises ValueError."""
+    if not isinstance(record, dict):
+        raise ValueError('expected a JSON object')
+    kind = record.get('type')
+    if kind == 'idea':
+        idea_id = _check(record, 'id', int, required=True)
+        row = (idea_id, _check(record, 'user_id', int),
+               *(_check(record, key, str) or '' for key in EDITABLE_FIELDS),
+               _check(record, 'created_at', str))
+        voters = []
+        for vote_type in ('upvote', 'downvote'):
+            users = record.get(vote_type + 's') or []
+            if not isinstance(users, list) or not all(isinstance(u, int) and not isinstance(u, bool) for u in users):
+                raise ValueError(f'{vote_type}s must be a list of user ids')
+            voters += [(idea_id, u, vote_type) for u in users]
+        return 'idea', (row, voters)
+    if kind == 'report':
+        return 'report', (_check(record, 'id', int, required=True), _check(record, 'idea_id', int, required=True),
+                          _check(record, 'idea_title', str) or '', _check(record, 'user_id', int),
+                          _check(record, 'description', str) or '', _check(record, 'createdAt', str) or '')
+    raise ValueError("type must be 'idea' or 'report'")
+
+@group_commit
+def import_batch(conn, ideas, reports, final=False):
+    """Upsert one batch of parsed records in a single transaction.
+
+    Keyed on the exported ids, so importing the same file again leaves the
+    database as it was: ideas are overwritten, votes set, and existing
+    reports kept. Reports of ideas that do not exist are skipped.
+    Returns the number of reports actually inserted.
+    """
+    conn.executemany(
+        'INSERT INTO ideas (id, user_id, title, description, category, image_url, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET '
+        'user_id=excluded.user_id, title=excluded.title, description=excluded.description, '
+        'category=excluded.category, image_url=excluded.image_url, created_at=excluded.created_at '
+        # Unchanged rows are left alone, so a re-import does not churn the search index
+        'WHERE (user_id, title, description, category, image_url, created_at) IS NOT '
+        '(excluded.user_id, excluded.title, excluded.description, excluded.category, '
+        'excluded.image_url, excluded.created_at)',
+        [row for row, _ in ideas])
+    # The vote counters follow through the votes_count_* triggers
+    conn.executemany(
+        'INSERT INTO votes (idea_id, user_id, vote_type) VALUES (?, ?, ?) '
+        'ON CONFLICT (idea_id, user_id) DO UPDATE SET vote_type=excluded.vote_type '
+        'WHERE vote_type != excluded.vote_type',
+        [vote for _, voters in ideas for vote in voters])
+    idea_ids = {r[1] for r in reports}
+    found = {row[0] for row in conn.execute(
+        f'SELECT id FROM ideas WHERE deleted_at IS NULL AND id IN ({",".join("?" * len(idea_ids))})',
+        list(idea_ids))} if idea_ids else set()
+    kept = [r for r in reports if r[1] in found]
+    # rowcount only counts the rows written, not the ones ON CONFLICT passed over
+    inserted = conn.executemany(
+        'INSERT INTO reports (id, idea_id, idea_title, user_id, description, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO NOTHING',
+        kept).rowcount if kept else 0
+    if final:
+        # One event for the whole import; open pages reload their list
+        _emit(conn, 'ideas.imported', {})
+    return inserted
+
+def import_records(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Import NDJSON lines (str or bytes), yielding a progress dict after each batch.
+
+    Bad lines are skipped and reported with their line number; the last
+    dict has "done": true and the totals.
+    """
+    totals = {'ideas': 0, 'reports': 0, 'skipped': 0, 'errors': 0}
+    ideas, reports, errors, batch = [], [], [], 0
+
+    def flush(final=False):
+        nonlocal ideas, reports, errors, batch
+        inserted = import_batch(ideas, reports, final=final)
+        batch += 1
+        totals['ideas'] += len(ideas)
+        totals['reports'] += inserted
+        totals['skipped'] += len(reports) - inserted
+        progress = {'batch': batch, **totals, 'error_lines': errors}
+        ideas, reports, errors = [], [], []
+        return progress
+
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            kind, parsed = parse_record(json.loads(line))
+        except ValueError as e:  # json.JSONDecodeError is a ValueError too
+            totals['errors'] += 1
+            if totals['errors'] <= MAX_IMPORT_ERRORS:
+                errors.append({'line': number, 'error': str(e)})
+            continue
+        (ideas if kind == 'idea' else reports).append(parsed)
+        if len(ideas) + len(reports) >= batch_size:
+            yield flush()
+    yield {**flush(final=True), 'done': True}
+
+# ---------------- Jobs ----------------
+# The queue itself; jobs.py runs the handlers. Bookkeeping goes straight to a
+# pooled connection, not through the group committer, so claiming and
+# finishing jobs does not bump data_version (and with it every ETag).
+JOB_LEASE = 300  # seconds a claimed job stays hidden from other workers
+
+def _enqueue(conn, kind, payload, key=None, delay=0):
+    """Queue a job inside the caller's transaction; a job with the same key already queued wins."""
+    conn.execute(f'INSERT INTO jobs (kind, payload, key, run_after, created_at) VALUES (?, ?, ?, ?, {SQL_NOW}) '
+                 'ON CONFLICT (key) DO NOTHING',
+                 (kind, json.dumps(payload), key, time.time() + delay))
+
+def enqueue_job(kind, payload, key=None, delay=0):
+    with transaction() as conn:
+        _enqueue(conn, kind, payload, key, delay)
+
+def has_due_jobs():
+    with transaction() as conn:
+        return conn.execute("SELECT 1 FROM jobs WHERE status='pending' AND run_after <= ? LIMIT 1",
+                            (time.time(),)).fetchone() is not None
+
+def claim_jobs(limit, lease=JOB_LEASE):
+    """Take up to `limit` due jobs: [(id, kind, payload dict, attempts)]."""
+    now = time.time()
+    with transaction(immediate=True) as conn:
+        rows = conn.execute(
+            'UPDATE jobs SET attempts = attempts + 1, run_after = ? WHERE id IN ('
+            "SELECT id FROM jobs WHERE status='pending' AND run_after <= ? ORDER BY run_after, id LIMIT ?) "
+            'RETURNING id, kind, payload, attempts', (now + lease, now, limit)).fetchall()
+    return [(row['id'], row['kind'], json.loads(row['payload']), row['attempts']) for row in rows]
+
+def finish_job(job_id):
+    with transaction() as conn:
+        conn.execute('DELETE FROM jobs WHERE id=?', (job_id,))
+
+def continue_job(job_id):
+    """Run a job again right away (it did one batch of several); does not count as a failed attempt."""
+    with transaction() as conn:
+        conn.execute('UPDATE jobs SET attempts = 0, run_after = ? WHERE id=?', (time.time(), job_id))
+
+def retry_job(job_id, error, delay=None):
+    """Schedule another attempt after `delay` seconds, or park the job as failed when delay is None."""
+    with transaction() as conn:
+        if delay is None:
+            conn.execute("UPDATE jobs SET status='failed', key=NULL, last_error=? WHERE id=?", (error, job_id))
+        else:
+            conn.execute('UPDATE jobs SET run_after=?, last_error=? WHERE id=?',
+                         (time.time() + delay, error, job_id))
+
+def job_counts():
+    with transaction() as conn:
+        return dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+# ---------------- Purging ----------------
+@group_commit
+def purge_idea_batch(conn, idea_id, limit):
+    """Delete up to `limit` of a tombstoned idea's votes and reports, then the idea itself.
+
+    Returns (done, image_url); image_url is set once the row is gone, when
+    it is exactly an upload's URL and no other idea's image_url mentions the
+    same digest in any form, so its files can be removed.
+    """
+    deleted = conn.execute('DELETE FROM votes WHERE rowid IN (SELECT rowid FROM votes WHERE idea_id=? LIMIT ?)',
+                           (idea_id, limit)).rowcount
+    deleted += conn.execute('DELETE FROM reports WHERE id IN (SELECT id FROM reports WHERE idea_id=? LIMIT ?)',
+                            (idea_id, limit - deleted)).rowcount
+    if deleted >= limit:
+        return False, None
+    row = conn.execute('DELETE FROM ideas WHERE id=? AND deleted_at IS NOT NULL RETURNING image_url',
+                       (idea_id,)).fetchone()
+    name = images.upload_name(row['image_url']) if row else None
+    if not name or conn.execute('SELECT 1 FROM ideas WHERE instr(image_url, ?) LIMIT 1',
+                                (name[:32],)).fetchone():
+        return True, ''
+    return True, row['image_url']
+
+@group_commit
+def purge_user_batch(conn, user_id, limit):
+    """Delete up to `limit` of a deleted user's votes and reports; True when none are left.
+
+    Their votes normally went with the account (see delete_user_content);
+    any left over, e.g. from an older version's queue, go here, and the vote
+    counters of those ideas follow through the triggers.
+    """
+    deleted = conn.execute('DELETE FROM votes WHERE rowid IN (SELECT rowid FROM votes WHERE user_id=? LIMIT ?)',
+                           (user_id, limit)).rowcount
+    deleted += conn.execute('DELETE FROM reports WHERE id IN (SELECT id FROM reports WHERE user_id=? LIMIT ?)',
+                            (user_id, limit - deleted)).rowcount
+    return deleted < limit
+
+def image_urls_in_use():
+    """Every image_url still referenced by an idea, tombstoned ones included."""
+    with transaction() as conn:
+        return {row[0] for row in conn.execute("SELECT DISTINCT image_url FROM ideas WHERE image_url != ''")}
@@ -0,0 +1,184 @@
+import json
+import time
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+
+import storage
+
+# Hacker News style decay: score = points / (age_hours + 2) ** GRAVITY
+GRAVITY = 1.8
+REDECAY_SECONDS = 60
+EVENT_BATCH = 1000
+
+def parse_timestamp(value):
+    """ISO-8601 string (naive means UTC, trailing 'Z' allowed) to epoch seconds; 0 if unknown."""
+    if not value:
+        return 0.0
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return 0.0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def hot_score(points, created_ts, now, gravity=GRAVITY):
+    age_hours = max(now - created_ts, 0) / 3600
+    return points / (age_hours + 2) ** gravity
+
+# ---------------- Trending Board ----------------
+class TrendingBoard:
+    """Ideas ordered by time-decayed score, kept sorted as votes arrive.
+
+    Entries are (-score, id) tuples in an ascending list, so the hottest idea
+    comes first, a page is a bisect plus a slice and one vote is a remove +
+    insort. Every score is computed against the same `now` anchor so entries
+    stay comparable; a background thread moves the anchor forward and
+    re-sorts every `redecay_seconds`.
+    """
+
+    def __init__(self, gravity=GRAVITY, redecay_seconds=REDECAY_SECONDS):
+        self.gravity = gravity
+        self.redecay_seconds = redecay_seconds
+        self._lock = threading.Lock()
+        self._entries = []   # sorted (-score, id)
+        self._keys = {}      # id -> its entry in _entries
+        self._inputs = {}    # id -> (points, created_ts)
+        self._now = time.time()
+        self._synced = None  # (ideas db, id of the last change event applied)
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self.generation = 0  # bumped by every redecay(), e.g. for ETags
+
+    def _set(self, idea_id, points, created_ts):
+        # Caller holds self._lock
+        old = self._keys.get(idea_id)
+        if old is not None:
+            del self._entries[bisect_left(self._entries, old)]
+        key = (-hot_score(points, created_ts, self._now, self.gravity), idea_id)
+        self._keys[idea_id] = key
+        self._inputs[idea_id] = (points, created_ts)
+        insort(self._entries, key)
+
+    def _remove(self, idea_id):
+        # Caller holds self._lock
+        old = self._keys.pop(idea_id, None)
+        if old is not None:
+            del self._entries[bisect_left(self._entries, old)]
+            del self._inputs[idea_id]
+
+    @staticmethod
+    def _inputs_of(idea):
+        return idea['upvote_count'] - idea['downvote_count'], parse_timestamp(idea.get('created_at'))
+
+    def update(self, idea):
+        """Re-rank one idea after it was created or voted on."""
+        with self._lock:
+            self._set(idea['id'], *self._inputs_of(idea))
+
+    def remove(self, idea_id):
+        with self._lock:
+            self._remove(idea_id)
+
+    def load(self, ideas):
+        """Rank a full idea list from scratch (on first use, or after a bulk import)."""
+        with self._lock:
+            self._inputs = {idea['id']: self._inputs_of(idea) for idea in ideas}
+            self._keys = {
+                idea_id: (-hot_score(points, created_ts, self._now, self.gravity), idea_id)
+                for idea_id, (points, created_ts) in self._inputs.items()
+            }
+            self._entries = sorted(self._keys.values())
+
+    def _load_all(self):
+        self._synced = (storage.IDEAS_DB, storage.event_bounds()[1])  # before reading, so no later change is missed
+        self.load(storage.cached_ideas())
+
+    def sync(self):
+        """Apply the change events written since the last sync (by any worker).
+
+        A vote or a new idea re-ranks that one idea and a delete drops it, so
+        keeping up costs the size of the changes, not of the board. The board
+        is rebuilt from the idea cache the first time, after a bulk import and
+        when the event log has moved past the events we saw.
+        """
+        self.start()
+        with self._sync_lock:
+            if self._synced is None or self._synced[0] != storage.IDEAS_DB:
+                self._load_all()
+                return
+            while True:
+                last_event = self._synced[1]
+                rows = storage.events_after(last_event, EVENT_BATCH)
+                if not rows:
+                    return
+                if rows[0][0] > last_event + 1:
+                    oldest = storage.event_bounds()[0]
+                    if oldest is None or last_event < oldest - 1:
+                        self._load_all()  # pruned before we saw them
+                        return
+                reload = False
+                with self._lock:
+                    for event_id, event_type, data in rows:
+                        if event_type in ('ideas.imported', 'reset'):
+                            reload = True
+                            break
+                        if event_type == 'idea.created':
+                            idea = json.loads(data)
+                            self._set(idea['id'], *self._inputs_of(idea))
+                        elif event_type == 'vote':
+                            vote = json.loads(data)
+                            inputs = self._inputs.get(vote['id'])
+                            if inputs is not None:
+                                self._set(vote['id'], vote['upvote_count'] - vote['downvote_count'], inputs[1])
+                        elif event_type == 'idea.deleted':
+                            self._remove(json.loads(data)['id'])
+                        last_event = event_id
+                if reload:
+                    self._load_all()
+                    return
+                self._synced = (self._synced[0], last_event)
+
+    def redecay(self):
+        """Recompute every score against the current time."""
+        with self._lock:
+            self._now = time.time()
+            self._keys = {
+                idea_id: (-hot_score(points, created_ts, self._now, self.gravity), idea_id)
+                for idea_id, (points, created_ts) in self._inputs.items()
+            }
+            self._entries = sorted(self._keys.values())
+            self.generation += 1
+
+    def sort_key(self, idea):
+        """Ascending sort/cursor key for an idea; unknown ideas sort as score 0."""
+        return self._keys.get(idea['id']) or (0.0, idea['id'])
+
+    def entries_after(self, after, n):
+        """Up to n (-score, id) entries ranked after the sort key `after` (None for the top).
+
+        A bisect and a slice, so a page costs its own size, wherever it starts.
+        """
+        with self._lock:
+            start = bisect_right(self._entries, tuple(after)) if after is not None else 0
+            return self._entries[start:start + n]
+
+    def ranked_ids(self):
+        with self._lock:
+            return [idea_id for _, idea_id in self._entries]
+
+    def start(self):
+        """Start the re-decay thread once per process (also after a fork)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='trending-redecay', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.redecay_seconds)
+            self.redecay()
+
+board = TrendingBoard()
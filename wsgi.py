@@ -0,0 +1,25 @@
+"""Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+With preload_app (see gunicorn.conf.py) this module is imported once, in the
+gunicorn master. The schema check / one-time imports and the first idea
+cache load (and the chatbot's title matcher) happen there, and every forked
+worker starts with them done.
+"""
+import gc
+
+import storage
+import accounts
+import chatbot_logic
+from app import create_app, init_data
+
+app = create_app()
+init_data(app)
+storage.cached_ideas()
+chatbot_logic.prime()
+
+# Connections must not cross a fork; workers open their own on demand
+storage.close_connections()
+accounts.close_connections()
+
+# Keep the collector from touching (and so copying) the preloaded objects in every worker
+gc.freeze()